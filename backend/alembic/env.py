@@ -25,8 +25,8 @@ if not database_url:
     database_url = (
         f"postgresql://{os.getenv('DB_USER', 'postgres')}:"
         f"{os.getenv('DB_PASSWORD', 'postgres')}@"
-        f"{os.getenv('DB_HOST', 'localhost')}:"
-        f"{os.getenv('DB_PORT', '5432')}/"
+        f"{os.getenv('DB_DIRECT_HOST') or os.getenv('DB_HOST', 'localhost')}:"
+        f"{os.getenv('DB_DIRECT_PORT') or os.getenv('DB_PORT', '5432')}/"
         f"{os.getenv('DB_NAME', 'postgres')}"
     )
 
@@ -0,0 +1,48 @@
+"""add jobs queue
+
+Revision ID: 0b9e2f4c6a31
+Revises: f1a7d3e96b58
+Create Date: 2026-10-19 18:22:09.845512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b9e2f4c6a31'
+down_revision: Union[str, None] = 'f1a7d3e96b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # Durable background work. Finished jobs are deleted; jobs that run out of
+    # attempts stay behind as 'failed' for inspection.
+    op.execute(
+        """
+        create table if not exists jobs (
+            id bigserial primary key,
+            kind text not null,
+            payload jsonb not null default '{}',
+            status text not null default 'queued' check (status in ('queued', 'running', 'failed')),
+            attempts integer not null default 0,
+            max_attempts integer not null default 5,
+            run_at timestamptz not null default now(),
+            locked_at timestamptz,
+            locked_by text,
+            last_error text,
+            created_at timestamptz not null default now()
+        );
+        """
+    )
+    # Workers only ever scan the ready queue and the running set; keep both indexes partial.
+    op.execute("create index if not exists idx_jobs_ready on jobs(run_at) where status = 'queued';")
+    op.execute("create index if not exists idx_jobs_running on jobs(locked_at) where status = 'running';")
+
+
+def downgrade() -> None:
+    op.execute("drop index if exists idx_jobs_running;")
+    op.execute("drop index if exists idx_jobs_ready;")
+    op.execute("drop table if exists jobs;")
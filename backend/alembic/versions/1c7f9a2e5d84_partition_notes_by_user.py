@@ -0,0 +1,229 @@
+"""partition notes by user
+
+Revision ID: 1c7f9a2e5d84
+Revises: 0b9e2f4c6a31
+Create Date: 2026-10-20 09:31:47.162088
+
+Converts notes into a table hash-partitioned on user_id, without taking the
+table offline for the copy:
+
+  1. create notes_partitioned with NOTES_PARTITIONS hash partitions (default 16);
+  2. mirror every write on notes into it with a trigger;
+  3. copy existing rows across in NOTES_MIGRATION_BATCH_SIZE id ranges, each
+     batch in its own short transaction;
+  4. in one brief transaction, lock notes, swap the tables, and re-point the
+     foreign keys from note_revisions / note_attachments (validated afterwards,
+     without blocking writes).
+
+Steps 1-3 are committed as they go, so a failure in step 4 (a lock timeout,
+say) leaves notes_partitioned and the mirror trigger in place; running the
+upgrade again reuses them and resumes the copy.
+
+ids keep coming from the existing notes_id_seq. The primary key becomes
+(id, user_id) because a partitioned table's unique keys must include the
+partition key; every notes_repo query filters on user_id, so each one prunes
+to a single partition.
+"""
+import os
+import time
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c7f9a2e5d84'
+down_revision: Union[str, None] = '0b9e2f4c6a31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NOTE_COLUMNS = "id, title, content, user_id, created_at, updated_at, tags, content_html, content_html_hash"
+
+def _create_indexes(table: str, prefix: str) -> None:
+    op.execute(f"create index if not exists {prefix}_user on {table}(user_id);")
+    op.execute(f"create index if not exists {prefix}_user_tags on {table} using gin (user_id, tags);")
+    op.execute(f"create index if not exists {prefix}_user_title_trgm on {table} using gin (user_id, title gin_trgm_ops);")
+
+def _rename_indexes(old_prefix: str, new_prefix: str) -> None:
+    for suffix in ("user", "user_tags", "user_title_trgm"):
+        op.execute(f"alter index if exists {old_prefix}_{suffix} rename to {new_prefix}_{suffix};")
+
+def _create_stats_trigger() -> None:
+    op.execute("drop trigger if exists notes_track_user_stats on notes;")
+    op.execute(
+        """
+        create trigger notes_track_user_stats
+        after insert or update of content or delete on notes
+        for each row execute function track_user_note_stats();
+        """
+    )
+
+def _is_partitioned(bind) -> bool:
+    return bind.execute(sa.text("select relkind = 'p' from pg_class where oid = 'notes'::regclass")).scalar()
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not context.is_offline_mode() and _is_partitioned(bind):
+        return
+
+    partitions = int(os.getenv("NOTES_PARTITIONS", "16"))
+    batch_size = int(os.getenv("NOTES_MIGRATION_BATCH_SIZE", "20000"))
+    batch_pause = float(os.getenv("NOTES_MIGRATION_BATCH_PAUSE", "0.05"))
+
+    # 1. The new table, same column order as notes, drawing ids from the same sequence.
+    op.execute(
+        """
+        create table if not exists notes_partitioned (
+            id bigint not null default nextval('notes_id_seq'),
+            title text not null,
+            content text not null,
+            user_id uuid not null references users(id) on delete cascade,
+            created_at timestamptz not null default now(),
+            updated_at timestamptz not null default now(),
+            tags text[] not null default '{}',
+            content_html text,
+            content_html_hash text,
+            primary key (id, user_id)
+        ) partition by hash (user_id);
+        """
+    )
+    for remainder in range(partitions):
+        op.execute(
+            f"""
+            create table if not exists notes_p{remainder}
+            partition of notes_partitioned
+            for values with (modulus {partitions}, remainder {remainder});
+            """
+        )
+    _create_indexes("notes_partitioned", "idx_notes_partitioned")
+
+    # 2. Keep it in step with live writes while the backfill runs.
+    op.execute(
+        f"""
+        create or replace function mirror_notes_to_partitioned() returns trigger as $$
+        begin
+            if tg_op = 'DELETE' then
+                delete from notes_partitioned where id = old.id and user_id = old.user_id;
+                return old;
+            end if;
+            insert into notes_partitioned ({NOTE_COLUMNS})
+            values (new.id, new.title, new.content, new.user_id, new.created_at, new.updated_at,
+                    new.tags, new.content_html, new.content_html_hash)
+            on conflict (id, user_id) do update
+            set title = excluded.title, content = excluded.content, updated_at = excluded.updated_at,
+                tags = excluded.tags, content_html = excluded.content_html,
+                content_html_hash = excluded.content_html_hash;
+            return new;
+        end;
+        $$ language plpgsql;
+        """
+    )
+    op.execute("drop trigger if exists notes_mirror_to_partitioned on notes;")
+    op.execute(
+        """
+        create trigger notes_mirror_to_partitioned
+        after insert or update or delete on notes
+        for each row execute function mirror_notes_to_partitioned();
+        """
+    )
+
+    # 3. Backfill in small committed batches. FOR SHARE makes a concurrent delete of a
+    #    row wait for its batch, so the mirror trigger can't miss it.
+    copy_batch = f"""
+        insert into notes_partitioned ({NOTE_COLUMNS})
+        select {NOTE_COLUMNS} from notes
+        where id > :lo and id <= :hi
+        for share
+        on conflict (id, user_id) do nothing
+    """
+    if context.is_offline_mode():
+        op.execute(sa.text(copy_batch).bindparams(lo=0, hi=2**63 - 1))
+    else:
+        with op.get_context().autocommit_block():
+            max_id = bind.execute(sa.text("select coalesce(max(id), 0) from notes")).scalar()
+            lo = 0
+            while lo < max_id:
+                bind.execute(sa.text(copy_batch), {"lo": lo, "hi": lo + batch_size})
+                lo += batch_size
+                if batch_pause:
+                    time.sleep(batch_pause)
+
+    # 4. The swap: one short exclusive lock, no data movement.
+    op.execute("set local lock_timeout = '10s';")
+    op.execute("lock table notes in access exclusive mode;")
+    op.execute("alter table note_revisions drop constraint if exists note_revisions_note_id_fkey;")
+    op.execute("alter table note_attachments drop constraint if exists note_attachments_note_id_fkey;")
+    # notes.id owns the sequence and notes_partitioned.id's default depends on it, so
+    # notes can't be dropped until it lets go.
+    op.execute("alter sequence notes_id_seq owned by none;")
+    op.execute("drop table notes;")
+    op.execute("drop function if exists mirror_notes_to_partitioned();")
+    op.execute("alter table notes_partitioned rename to notes;")
+    op.execute("alter table notes rename constraint notes_partitioned_pkey to notes_pkey;")
+    op.execute("alter table notes rename constraint notes_partitioned_user_id_fkey to notes_user_id_fkey;")
+    _rename_indexes("idx_notes_partitioned", "idx_notes")
+    op.execute("alter sequence notes_id_seq owned by notes.id;")
+    _create_stats_trigger()
+    op.execute(
+        """
+        alter table note_revisions add constraint note_revisions_note_id_fkey
+        foreign key (note_id, user_id) references notes(id, user_id) on delete cascade not valid;
+        """
+    )
+    op.execute(
+        """
+        alter table note_attachments add constraint note_attachments_note_id_fkey
+        foreign key (note_id, user_id) references notes(id, user_id) on delete cascade not valid;
+        """
+    )
+
+    # Validation scans the child tables but only takes SHARE UPDATE EXCLUSIVE, so writes carry on.
+    if not context.is_offline_mode():
+        with op.get_context().autocommit_block():
+            op.execute("alter table note_revisions validate constraint note_revisions_note_id_fkey;")
+            op.execute("alter table note_attachments validate constraint note_attachments_note_id_fkey;")
+
+
+def downgrade() -> None:
+    # Back to a single heap table. This copies everything under one lock; it is
+    # meant for development, not for running against a large production table.
+    op.execute("lock table notes in access exclusive mode;")
+    op.execute(
+        """
+        create table notes_unpartitioned (
+            id bigint primary key default nextval('notes_id_seq'),
+            title text not null,
+            content text not null,
+            user_id uuid not null references users(id) on delete cascade,
+            created_at timestamptz not null default now(),
+            updated_at timestamptz not null default now(),
+            tags text[] not null default '{}',
+            content_html text,
+            content_html_hash text
+        );
+        """
+    )
+    op.execute(f"insert into notes_unpartitioned ({NOTE_COLUMNS}) select {NOTE_COLUMNS} from notes;")
+    op.execute("alter table note_revisions drop constraint if exists note_revisions_note_id_fkey;")
+    op.execute("alter table note_attachments drop constraint if exists note_attachments_note_id_fkey;")
+    op.execute("alter sequence notes_id_seq owned by none;")
+    op.execute("drop table notes;")
+    op.execute("alter table notes_unpartitioned rename to notes;")
+    op.execute("alter table notes rename constraint notes_unpartitioned_pkey to notes_pkey;")
+    op.execute("alter table notes rename constraint notes_unpartitioned_user_id_fkey to notes_user_id_fkey;")
+    op.execute("alter sequence notes_id_seq owned by notes.id;")
+    _create_indexes("notes", "idx_notes")
+    _create_stats_trigger()
+    op.execute(
+        """
+        alter table note_revisions add constraint note_revisions_note_id_fkey
+        foreign key (note_id) references notes(id) on delete cascade;
+        """
+    )
+    op.execute(
+        """
+        alter table note_attachments add constraint note_attachments_note_id_fkey
+        foreign key (note_id) references notes(id) on delete cascade;
+        """
+    )
@@ -0,0 +1,41 @@
+"""add pinned notes and sort indexes
+
+Revision ID: 2d8e4b6f1a97
+Revises: 1c7f9a2e5d84
+Create Date: 2026-10-20 14:05:12.530914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d8e4b6f1a97'
+down_revision: Union[str, None] = '1c7f9a2e5d84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # A constant default is a catalog-only change, no table rewrite.
+    op.execute("alter table notes add column if not exists pinned boolean not null default false;")
+
+    # One index per list ordering. list_notes_by_user reads the pinned and unpinned
+    # runs separately, each as a forward or backward walk of one of these, so any
+    # sort direction with pinned-first stops after `limit` rows instead of sorting
+    # the whole notebook. id breaks ties so paging is stable.
+    op.execute("create index if not exists idx_notes_user_pinned_updated on notes (user_id, pinned, updated_at, id);")
+    op.execute("create index if not exists idx_notes_user_pinned_created on notes (user_id, pinned, created_at, id);")
+    op.execute("create index if not exists idx_notes_user_pinned_title on notes (user_id, pinned, title, id);")
+
+    # Every lookup by user_id alone (including the users cascade) can use any of the above.
+    op.execute("drop index if exists idx_notes_user;")
+
+
+def downgrade() -> None:
+    op.execute("create index if not exists idx_notes_user on notes(user_id);")
+    op.execute("drop index if exists idx_notes_user_pinned_title;")
+    op.execute("drop index if exists idx_notes_user_pinned_created;")
+    op.execute("drop index if exists idx_notes_user_pinned_updated;")
+    op.execute("alter table notes drop column if exists pinned;")
@@ -0,0 +1,46 @@
+"""add account deletions
+
+Revision ID: 3e5a7c9b2d40
+Revises: 2d8e4b6f1a97
+Create Date: 2026-10-20 17:48:33.071642
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e5a7c9b2d40'
+down_revision: Union[str, None] = '2d8e4b6f1a97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # A disabled user keeps their row (scrubbed) until the background purge has
+    # removed their notes, then the row itself goes.
+    op.execute("alter table users add column if not exists disabled_at timestamptz;")
+
+    # Outlives the user row on purpose (no foreign key): it's where progress is
+    # read from, and where workers learn which tokens to reject after a restart.
+    # The id is random so it can double as the unauthenticated status URL.
+    op.execute(
+        """
+        create table if not exists account_deletions (
+            id uuid primary key default gen_random_uuid(),
+            user_id uuid not null,
+            status text not null default 'pending' check (status in ('pending', 'running', 'done')),
+            notes_total bigint not null default 0,
+            notes_deleted bigint not null default 0,
+            requested_at timestamptz not null default now(),
+            finished_at timestamptz
+        );
+        """
+    )
+    op.execute("create index if not exists idx_account_deletions_requested on account_deletions(requested_at);")
+
+
+def downgrade() -> None:
+    op.execute("drop table if exists account_deletions;")
+    op.execute("alter table users drop column if exists disabled_at;")
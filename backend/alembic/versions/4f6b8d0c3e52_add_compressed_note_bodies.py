@@ -0,0 +1,112 @@
+"""add compressed note bodies
+
+Revision ID: 4f6b8d0c3e52
+Revises: 3e5a7c9b2d40
+Create Date: 2026-10-20 21:12:47.208315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f6b8d0c3e52'
+down_revision: Union[str, None] = '3e5a7c9b2d40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def _stats_function(size_of) -> str:
+    return f"""
+        create or replace function track_user_note_stats() returns trigger as $$
+        begin
+            if tg_op = 'INSERT' then
+                insert into user_note_stats (user_id, note_count, content_bytes)
+                values (new.user_id, 1, {size_of('new')})
+                on conflict (user_id) do update
+                set note_count = user_note_stats.note_count + 1,
+                    content_bytes = user_note_stats.content_bytes + excluded.content_bytes;
+                return new;
+            elsif tg_op = 'UPDATE' then
+                if {size_of('new')} <> {size_of('old')} then
+                    update user_note_stats
+                    set content_bytes = content_bytes + {size_of('new')} - {size_of('old')}
+                    where user_id = new.user_id;
+                end if;
+                return new;
+            else
+                update user_note_stats
+                set note_count = note_count - 1,
+                    content_bytes = content_bytes - {size_of('old')}
+                where user_id = old.user_id;
+                return old;
+            end if;
+        end;
+        $$ language plpgsql;
+    """
+
+def _recreate_stats_trigger(columns: str) -> None:
+    op.execute("drop trigger if exists notes_track_user_stats on notes;")
+    op.execute(
+        f"""
+        create trigger notes_track_user_stats
+        after insert or update of {columns} or delete on notes
+        for each row execute function track_user_note_stats();
+        """
+    )
+
+def upgrade() -> None:
+    # Shared zstd dictionaries for mid-sized bodies. Never deleted while a note
+    # still refers to one: the frames can't be decoded without it.
+    op.execute(
+        """
+        create table if not exists note_dictionaries (
+            id serial primary key,
+            data bytea not null,
+            sample_count integer not null,
+            created_at timestamptz not null default now()
+        );
+        """
+    )
+
+    # All nullable with no default: catalog-only, no rewrite. Existing notes stay
+    # plain text until `python -m app.maintenance compress-notes` gets to them.
+    op.execute("alter table notes add column if not exists content_zstd bytea;")
+    op.execute("alter table notes add column if not exists content_dict_id integer references note_dictionaries(id);")
+    op.execute("alter table notes add column if not exists content_size integer;")
+    # The frames are already compressed; don't let TOAST spend time trying again.
+    op.execute("alter table notes alter column content_zstd set storage external;")
+    op.execute("alter table notes alter column content drop not null;")
+    # Exactly one of the two bodies, and a size to go with the compressed one.
+    op.execute(
+        """
+        alter table notes add constraint notes_one_body check (
+            case when content is null
+                 then content_zstd is not null and content_size is not null
+                 else content_zstd is null
+            end
+        ) not valid;
+        """
+    )
+    op.execute("alter table notes validate constraint notes_one_body;")
+
+    # Quotas and totals count the text a user wrote, however it's stored.
+    op.execute(_stats_function(lambda row: f"coalesce(octet_length({row}.content), {row}.content_size)"))
+    _recreate_stats_trigger("content, content_size")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.execute(sa.text("select exists (select 1 from notes where content_zstd is not null)")).scalar():
+        raise RuntimeError(
+            "Some notes are stored compressed; run `python -m app.maintenance decompress-notes` first."
+        )
+    _recreate_stats_trigger("content")
+    op.execute(_stats_function(lambda row: f"octet_length({row}.content)"))
+    op.execute("alter table notes drop constraint if exists notes_one_body;")
+    op.execute("alter table notes alter column content set not null;")
+    op.execute("alter table notes drop column if exists content_size;")
+    op.execute("alter table notes drop column if exists content_dict_id;")
+    op.execute("alter table notes drop column if exists content_zstd;")
+    op.execute("drop table if exists note_dictionaries;")
@@ -0,0 +1,89 @@
+"""add user tag counts
+
+Revision ID: 5a7c9e1d4f63
+Revises: 4f6b8d0c3e52
+Create Date: 2026-10-21 10:42:18.305117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7c9e1d4f63'
+down_revision: Union[str, None] = '4f6b8d0c3e52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # Per-user tag counts, so the tag list reads one row per tag instead of
+    # unnesting every note the user owns.
+    op.execute(
+        """
+        create table if not exists user_tag_counts (
+            user_id uuid not null references users(id) on delete cascade,
+            tag text not null,
+            note_count bigint not null,
+            primary key (user_id, tag)
+        );
+        """
+    )
+
+    # Kept in step with every write to notes, like user_note_stats. Increments and
+    # decrements go in one statement in tag order, so two writers for the same
+    # user always lock the rows in the same order and can't deadlock.
+    op.execute(
+        """
+        create or replace function track_user_tag_counts() returns trigger as $$
+        declare
+            owner uuid := case when tg_op = 'DELETE' then old.user_id else new.user_id end;
+            added text[] := case when tg_op = 'DELETE' then '{}' else new.tags end;
+            removed text[] := case when tg_op = 'INSERT' then '{}' else old.tags end;
+        begin
+            insert into user_tag_counts (user_id, tag, note_count)
+            select owner, tag, sum(delta)
+            from (
+                select distinct tag, 1 as delta from unnest(added) as tag
+                union all
+                select distinct tag, -1 from unnest(removed) as tag
+            ) changes
+            group by tag
+            having sum(delta) <> 0
+            order by tag
+            on conflict (user_id, tag) do update
+            set note_count = user_tag_counts.note_count + excluded.note_count;
+            delete from user_tag_counts
+            where user_id = owner and tag = any(removed) and note_count <= 0;
+            return null;
+        end;
+        $$ language plpgsql;
+        """
+    )
+    op.execute("drop trigger if exists notes_track_user_tags on notes;")
+    op.execute(
+        """
+        create trigger notes_track_user_tags
+        after insert or update of tags or delete on notes
+        for each row execute function track_user_tag_counts();
+        """
+    )
+
+    # Backfill. Creating the trigger above holds off writes to notes until this
+    # commits, so no note is counted twice or missed.
+    op.execute(
+        """
+        insert into user_tag_counts (user_id, tag, note_count)
+        select n.user_id, t.tag, count(*)
+        from notes n, lateral (select distinct unnest(n.tags) as tag) t
+        group by n.user_id, t.tag
+        on conflict (user_id, tag) do nothing;
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("drop trigger if exists notes_track_user_tags on notes;")
+    op.execute("drop function if exists track_user_tag_counts();")
+    op.execute("drop table if exists user_tag_counts;")
@@ -0,0 +1,45 @@
+"""add failed deletion status
+
+Revision ID: 6c8e0a2f4b75
+Revises: 5a7c9e1d4f63
+Create Date: 2026-10-22 11:06:52.418830
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c8e0a2f4b75'
+down_revision: Union[str, None] = '5a7c9e1d4f63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # A purge whose job ran out of attempts is reported as failed until the
+    # resume-deletions sweep queues it again.
+    op.execute("alter table account_deletions drop constraint if exists account_deletions_status_check;")
+    op.execute(
+        """
+        alter table account_deletions add constraint account_deletions_status_check
+        check (status in ('pending', 'running', 'failed', 'done'));
+        """
+    )
+    # The sweep only ever looks at unfinished deletions; finished ones pile up forever.
+    op.execute(
+        "create index if not exists idx_account_deletions_unfinished on account_deletions(requested_at) where status <> 'done';"
+    )
+
+
+def downgrade() -> None:
+    op.execute("drop index if exists idx_account_deletions_unfinished;")
+    op.execute("update account_deletions set status = 'running' where status = 'failed';")
+    op.execute("alter table account_deletions drop constraint if exists account_deletions_status_check;")
+    op.execute(
+        """
+        alter table account_deletions add constraint account_deletions_status_check
+        check (status in ('pending', 'running', 'done'));
+        """
+    )
@@ -0,0 +1,33 @@
+"""add note tags
+
+Revision ID: a3c91f2d7b40
+Revises: 5e75fd378f5a
+Create Date: 2026-10-19 09:12:41.208311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c91f2d7b40'
+down_revision: Union[str, None] = '5e75fd378f5a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # btree_gin lets uuid columns live in a GIN index alongside the tag array,
+    # so "this user's notes with these tags" is a single index lookup.
+    op.execute('create extension if not exists "btree_gin";')
+
+    op.execute("alter table notes add column if not exists tags text[] not null default '{}';")
+
+    op.execute("create index if not exists idx_notes_user_tags on notes using gin (user_id, tags);")
+
+
+def downgrade() -> None:
+    op.execute("drop index if exists idx_notes_user_tags;")
+    op.execute("alter table notes drop column if exists tags;")
+    op.execute('drop extension if exists "btree_gin";')
@@ -0,0 +1,109 @@
+"""add user note stats
+
+Revision ID: b71e4c0a9d15
+Revises: a3c91f2d7b40
+Create Date: 2026-10-19 10:03:17.554920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e4c0a9d15'
+down_revision: Union[str, None] = 'a3c91f2d7b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # One row per user with running totals, so pagination counts and quota
+    # checks never have to scan the notes table.
+    op.execute(
+        """
+        create table if not exists user_note_stats (
+            user_id uuid primary key references users(id) on delete cascade,
+            note_count bigint not null default 0,
+            content_bytes bigint not null default 0
+        );
+        """
+    )
+
+    # Every user gets a stats row up front so writers can lock it with FOR UPDATE.
+    op.execute(
+        """
+        create or replace function create_user_note_stats() returns trigger as $$
+        begin
+            insert into user_note_stats (user_id) values (new.id)
+            on conflict (user_id) do nothing;
+            return new;
+        end;
+        $$ language plpgsql;
+        """
+    )
+    op.execute(
+        """
+        create trigger users_create_note_stats
+        after insert on users
+        for each row execute function create_user_note_stats();
+        """
+    )
+
+    # Keep the counters in step with every write to notes, whichever code path makes it.
+    op.execute(
+        """
+        create or replace function track_user_note_stats() returns trigger as $$
+        begin
+            if tg_op = 'INSERT' then
+                insert into user_note_stats (user_id, note_count, content_bytes)
+                values (new.user_id, 1, octet_length(new.content))
+                on conflict (user_id) do update
+                set note_count = user_note_stats.note_count + 1,
+                    content_bytes = user_note_stats.content_bytes + excluded.content_bytes;
+                return new;
+            elsif tg_op = 'UPDATE' then
+                if octet_length(new.content) <> octet_length(old.content) then
+                    update user_note_stats
+                    set content_bytes = content_bytes + octet_length(new.content) - octet_length(old.content)
+                    where user_id = new.user_id;
+                end if;
+                return new;
+            else
+                update user_note_stats
+                set note_count = note_count - 1,
+                    content_bytes = content_bytes - octet_length(old.content)
+                where user_id = old.user_id;
+                return old;
+            end if;
+        end;
+        $$ language plpgsql;
+        """
+    )
+    op.execute(
+        """
+        create trigger notes_track_user_stats
+        after insert or update of content or delete on notes
+        for each row execute function track_user_note_stats();
+        """
+    )
+
+    # Backfill existing users.
+    op.execute(
+        """
+        insert into user_note_stats (user_id, note_count, content_bytes)
+        select u.id, count(n.id), coalesce(sum(octet_length(n.content)), 0)
+        from users u
+        left join notes n on n.user_id = u.id
+        group by u.id
+        on conflict (user_id) do nothing;
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("drop trigger if exists notes_track_user_stats on notes;")
+    op.execute("drop function if exists track_user_note_stats();")
+    op.execute("drop trigger if exists users_create_note_stats on users;")
+    op.execute("drop function if exists create_user_note_stats();")
+    op.execute("drop table if exists user_note_stats;")
@@ -0,0 +1,32 @@
+"""add note title trigram index
+
+Revision ID: c45d8e1f3a62
+Revises: b71e4c0a9d15
+Create Date: 2026-10-19 11:26:52.031477
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c45d8e1f3a62'
+down_revision: Union[str, None] = 'b71e4c0a9d15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.execute('create extension if not exists "pg_trgm";')
+
+    # user_id rides along via btree_gin (see a3c91f2d7b40) so title lookups
+    # never touch other users' entries.
+    op.execute(
+        "create index if not exists idx_notes_user_title_trgm on notes using gin (user_id, title gin_trgm_ops);"
+    )
+
+
+def downgrade() -> None:
+    op.execute("drop index if exists idx_notes_user_title_trgm;")
+    op.execute('drop extension if exists "pg_trgm";')
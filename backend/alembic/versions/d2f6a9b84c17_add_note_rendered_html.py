@@ -0,0 +1,29 @@
+"""add note rendered html
+
+Revision ID: d2f6a9b84c17
+Revises: c45d8e1f3a62
+Create Date: 2026-10-19 13:48:05.771203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f6a9b84c17'
+down_revision: Union[str, None] = 'c45d8e1f3a62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # Rendered Markdown is stored alongside the hash of the content it was
+    # rendered from; a mismatch means the note was edited and needs re-rendering.
+    op.execute("alter table notes add column if not exists content_html text;")
+    op.execute("alter table notes add column if not exists content_html_hash text;")
+
+
+def downgrade() -> None:
+    op.execute("alter table notes drop column if exists content_html_hash;")
+    op.execute("alter table notes drop column if exists content_html;")
@@ -0,0 +1,45 @@
+"""add note revisions
+
+Revision ID: e8b3c5d1f209
+Revises: d2f6a9b84c17
+Create Date: 2026-10-19 15:07:33.690145
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3c5d1f209'
+down_revision: Union[str, None] = 'd2f6a9b84c17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # Saved versions of each note: periodic zlib-compressed snapshots with
+    # line-level deltas in between (see app/core/revisions.py).
+    op.execute(
+        """
+        create table if not exists note_revisions (
+            id bigserial primary key,
+            note_id bigint not null references notes(id) on delete cascade,
+            user_id uuid not null,
+            rev integer not null,
+            kind text not null check (kind in ('snapshot', 'delta')),
+            title text not null,
+            body bytea not null,
+            content_bytes integer not null,
+            note_updated_at timestamptz not null,
+            created_at timestamptz not null default now(),
+            unique (note_id, rev)
+        );
+        """
+    )
+    op.execute("create index if not exists idx_note_revisions_created on note_revisions(created_at);")
+
+
+def downgrade() -> None:
+    op.execute("drop index if exists idx_note_revisions_created;")
+    op.execute("drop table if exists note_revisions;")
@@ -0,0 +1,55 @@
+"""add note attachments
+
+Revision ID: f1a7d3e96b58
+Revises: e8b3c5d1f209
+Create Date: 2026-10-19 16:41:20.318866
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a7d3e96b58'
+down_revision: Union[str, None] = 'e8b3c5d1f209'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # One row per stored file, keyed by its content hash. The bytes live on disk
+    # under ATTACHMENTS_DIR, never in Postgres.
+    op.execute(
+        """
+        create table if not exists attachment_blobs (
+            sha256 text primary key,
+            size bigint not null,
+            created_at timestamptz not null default now()
+        );
+        """
+    )
+
+    # Links from notes to blobs; many notes (and users) can share one blob.
+    op.execute(
+        """
+        create table if not exists note_attachments (
+            id bigserial primary key,
+            note_id bigint not null references notes(id) on delete cascade,
+            user_id uuid not null,
+            sha256 text not null references attachment_blobs(sha256),
+            filename text not null,
+            content_type text not null,
+            created_at timestamptz not null default now()
+        );
+        """
+    )
+    op.execute("create index if not exists idx_note_attachments_note on note_attachments(note_id);")
+    op.execute("create index if not exists idx_note_attachments_sha256 on note_attachments(sha256);")
+
+
+def downgrade() -> None:
+    op.execute("drop index if exists idx_note_attachments_sha256;")
+    op.execute("drop index if exists idx_note_attachments_note;")
+    op.execute("drop table if exists note_attachments;")
+    op.execute("drop table if exists attachment_blobs;")
@@ -0,0 +1,121 @@
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response, BackgroundTasks
+from fastapi.responses import FileResponse
+from typing import List
+from urllib.parse import quote
+from uuid import UUID
+
+from ...db import db_conn
+from ...repos import attachments_repo, notes_repo
+from ...core import blob_store
+from ...core.config import get_attachment_max_bytes, get_attachments_accel_prefix
+from ...core.security import get_current_user_id
+from ..schemas.attachments import Attachment
+
+router = APIRouter()
+
+# Types that are safe to show inline; anything else is forced to download so
+# uploaded HTML/SVG can never run script on our origin.
+INLINE_CONTENT_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp", "application/pdf"}
+
+async def collect_blobs(sha256s):
+    try:
+        await attachments_repo.collect_orphan_attachments(sha256s, acquire=db_conn)
+    except Exception as e:
+        print(f"Attachment GC failed for {sha256s}: {e}")
+
+# UPLOAD ATTACHMENT (raw request body, streamed to disk)
+@router.post("/{note_id}/attachments/", response_model=Attachment, status_code=201)
+async def upload_attachment(
+    note_id: int,
+    request: Request,
+    filename: str = Query(..., min_length=1, max_length=255),
+    user_id: UUID = Depends(get_current_user_id),
+):
+    max_bytes = get_attachment_max_bytes()
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail="Attachment too large")
+    content_type = request.headers.get("content-type", "application/octet-stream").split(";")[0].strip()
+
+    # Cheap ownership check before accepting a potentially large body.
+    async with db_conn(timeout=10) as conn:
+        if not await notes_repo.get_note_for_user(conn, note_id, user_id):
+            raise HTTPException(status_code=404, detail="Note not found")
+
+    try:
+        tmp_path, sha256, size = await blob_store.write_stream(request.stream(), max_bytes)
+    except blob_store.BlobTooLargeError:
+        raise HTTPException(status_code=413, detail="Attachment too large")
+
+    try:
+        async with db_conn(timeout=10) as conn:
+            async with conn.transaction():
+                if not await attachments_repo.lock_note_for_attach(conn, note_id, user_id):
+                    raise HTTPException(status_code=404, detail="Note not found")
+                row = await attachments_repo.add_attachment(
+                    conn, note_id, user_id, sha256, size, filename, content_type
+                )
+                if not row:
+                    raise HTTPException(status_code=500, detail="Failed to store attachment")
+                # Only once the rows are in: a file moved into place for a failed insert would have
+                # no attachment_blobs row, and the GC (which works from those rows) would never find it.
+                # The shared GC lock is still held, so the blob can't be collected before we commit.
+                await blob_store.commit_blob(tmp_path, sha256)
+            return dict(row)
+    finally:
+        blob_store.discard_temp(tmp_path)
+
+# LIST ATTACHMENTS (READ)
+@router.get("/{note_id}/attachments/", response_model=List[Attachment])
+async def list_attachments(note_id: int, user_id: UUID = Depends(get_current_user_id)):
+    try:
+        async with db_conn(timeout=10) as conn:
+            rows = await attachments_repo.list_attachments_for_note(conn, note_id, user_id)
+            return [dict(r) for r in rows]
+    except Exception as e:
+        print(f"Error in list_attachments for note {note_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch attachments")
+
+# DOWNLOAD ATTACHMENT (Range-aware; the file never passes through Postgres)
+@router.get("/{note_id}/attachments/{attachment_id}")
+async def download_attachment(note_id: int, attachment_id: int, user_id: UUID = Depends(get_current_user_id)):
+    async with db_conn(timeout=10) as conn:
+        row = await attachments_repo.get_attachment_for_user(conn, attachment_id, note_id, user_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    disposition = "inline" if row["content_type"] in INLINE_CONTENT_TYPES else "attachment"
+    headers = {
+        "ETag": f'"{row["sha256"]}"',
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "X-Content-Type-Options": "nosniff",
+    }
+    accel_prefix = get_attachments_accel_prefix()
+    if accel_prefix:
+        # nginx serves the file itself with sendfile and handles Range.
+        response = Response(media_type=row["content_type"], headers=headers)
+        response.headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + blob_store.blob_relative_path(row["sha256"])
+        response.headers["Content-Disposition"] = f"{disposition}; filename*=utf-8''{quote(row['filename'])}"
+        return response
+    return FileResponse(
+        blob_store.blob_path(row["sha256"]),
+        media_type=row["content_type"],
+        filename=row["filename"],
+        content_disposition_type=disposition,
+        headers=headers,
+    )
+
+# DELETE ATTACHMENT (WRITE)
+@router.delete("/{note_id}/attachments/{attachment_id}", status_code=204)
+async def delete_attachment(
+    note_id: int,
+    attachment_id: int,
+    background_tasks: BackgroundTasks,
+    user_id: UUID = Depends(get_current_user_id),
+):
+    async with db_conn(timeout=10) as conn:
+        sha256 = await attachments_repo.delete_attachment_for_user(conn, attachment_id, note_id, user_id)
+    if not sha256:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    background_tasks.add_task(collect_blobs, [sha256])
+    return Response(status_code=204)
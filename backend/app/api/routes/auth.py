@@ -1,54 +1,20 @@
-from fastapi import APIRouter, HTTPException, status, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, status, Depends
+from uuid import UUID
 from ...db import db_conn
 from ...core.security import (
     hash_password,
     verify_password,
     create_access_token,
     get_current_user_id,
+    revoke_user,
 )
-from ...repos import users_repo, notes_repo  
-from ..schemas.auth import RegisterIn, LoginIn, TokenOut, MeOut
+from ...repos import users_repo, jobs_repo, deletions_repo
+from ..schemas.auth import RegisterIn, LoginIn, TokenOut, MeOut, DeletionOut
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-# Welcome note content
-WELCOME_NOTE_CONTENT = """# Welcome to scriobh!
-
-This is a **Markdown-enabled notes app**, built with computer science students in mind. It’s designed to make it easy to take well-structured notes during lectures and labs.
-
-In the bottom-left  corner of the app, you’ll find three important buttons:
-
-1. New Note – Create a fresh note instantly.
-
-2. Toggle Markdown Mode – Switch between plain text and Markdown preview mode to format your notes.
-
-3. Logout – Securely log out of your account when you’re done.
-
-## Markdown Features
-
-* **Headings**: Use `#` for different heading sizes.
-* **Bold**: Wrap text in `**double asterisks**`.
-* **Italics**: Use `*single asterisks*`.
-* **Lists**: Start a line with `*` or `-`.
-
----
-
-### Code Blocks
-
-You can display code by wrapping it in backticks.
-
-`console.log("Hello, World!");`
-
-You can also create multi-line code blocks like this:
-
-```javascript
-function sayHello() {
-  console.log("Welcome to scriobh!");
-}
-sayHello();"""
-
 @router.post("/register", status_code=201)
-async def register(payload: RegisterIn, background_tasks: BackgroundTasks):
+async def register(payload: RegisterIn):
     async with db_conn(timeout=10) as conn:
         existing_user = await users_repo.get_user_by_email(conn, payload.email)
         if existing_user:
@@ -58,22 +24,13 @@ async def register(payload: RegisterIn, background_tasks: BackgroundTasks):
             )
 
         hashed_password = await hash_password(payload.password)
-        user = await users_repo.create_user(conn, payload.email, hashed_password)
-
-        async def create_welcome_note(user_id):
-            try:
-                async with db_conn(timeout=10) as bg_conn:
-                    await notes_repo.create_note(
-                        bg_conn,
-                        title="Welcome!",
-                        content=WELCOME_NOTE_CONTENT,
-                        user_id=user_id
-                    )
-                print(f"Welcome note created for user {user_id}")
-            except Exception as e:
-                print(f"Failed to create welcome note for user {user_id}: {e}")
-
-        background_tasks.add_task(create_welcome_note, user["id"])
+        # The welcome note is queued in the same transaction, so it survives restarts
+        # and exists if and only if the user does.
+        async with conn.transaction():
+            user = await users_repo.create_user(conn, payload.email, hashed_password)
+            if not user:
+                raise HTTPException(status_code=500, detail="Failed to create user")
+            await jobs_repo.enqueue_job(conn, "welcome_note", {"user_id": str(user["id"])})
 
         token = create_access_token(str(user["id"]))
         return {
@@ -97,3 +54,27 @@ async def me(user_id: str = Depends(get_current_user_id)):
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
         return {"id": str(user["id"]), "email": user["email"]}
+
+# Delete the account: disabled and its tokens rejected at once, notes purged in the background.
+@router.delete("/me", status_code=status.HTTP_202_ACCEPTED, response_model=DeletionOut)
+async def delete_me(user_id: UUID = Depends(get_current_user_id)):
+    async with db_conn(timeout=10) as conn:
+        async with conn.transaction():
+            if not await users_repo.disable_user(conn, user_id):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+            deletion = await deletions_repo.create_deletion(conn, user_id)
+            await jobs_repo.enqueue_job(
+                conn, "purge_account", {"deletion_id": str(deletion["id"]), "user_id": str(user_id)}
+            )
+    # Other workers hear about it via user_disabled; this one shouldn't wait for the round trip.
+    revoke_user(user_id)
+    return dict(deletion)
+
+# Deletion progress. Unauthenticated (the account's tokens no longer work); the random id is the capability.
+@router.get("/deletions/{deletion_id}", response_model=DeletionOut)
+async def get_deletion(deletion_id: UUID):
+    async with db_conn(timeout=10) as conn:
+        deletion = await deletions_repo.get_deletion(conn, deletion_id)
+    if not deletion:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deletion not found")
+    return dict(deletion)
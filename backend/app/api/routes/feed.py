@@ -0,0 +1,47 @@
+import json
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from uuid import UUID
+
+from ...core.config import get_feed_heartbeat_seconds
+from ...core.security import get_current_user_id
+from ...events import CHANGE_FEED, FeedFullError
+from ...lifecycle import LIFECYCLE
+
+router = APIRouter()
+
+# LIVE CHANGE FEED (Server-Sent Events)
+# Emits `note` events carrying only {"id", "op"}; clients fetch what they need.
+# A `resync` event means changes were missed and the list should be refetched.
+@router.get("/events")
+async def note_events(user_id: UUID = Depends(get_current_user_id)):
+    try:
+        sub = CHANGE_FEED.subscribe(user_id)
+    except FeedFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    if LIFECYCLE.draining:
+        # Shutting down: end straight after the retry hint so the client reconnects elsewhere.
+        sub.close()
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not sub.closed:
+                resync, changes = await sub.next_batch(get_feed_heartbeat_seconds())
+                if sub.closed:
+                    break
+                if resync:
+                    yield "event: resync\ndata: {}\n\n"
+                for note_id, op in changes:
+                    yield f"event: note\ndata: {json.dumps({'id': note_id, 'op': op})}\n\n"
+                if not resync and not changes:
+                    # Heartbeat keeps proxies from timing the stream out and surfaces dead clients.
+                    yield ": ping\n\n"
+        finally:
+            CHANGE_FEED.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
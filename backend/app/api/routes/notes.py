@@ -1,42 +1,120 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, Response
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response, BackgroundTasks
+from typing import List, Optional, Union
 from uuid import UUID
 
 from ...db import db_conn
-from ...repos import notes_repo
+from ...repos import notes_repo, revisions_repo, attachments_repo
 from ...core.security import get_current_user_id 
-from ..schemas.notes import NoteIn, Note, NoteUpdate
+from ...core import render, compression
+from ...core.config import get_render_persist
+from .attachments import collect_blobs
+from ..schemas.notes import NoteIn, Note, NoteUpdate, RenderedNote, TagCount, NoteTitle, RevisionSummary, Revision, normalize_tags
 
 router = APIRouter()
 
+# Record a saved state of a note in its revision history, off the request path.
+async def capture_revision(note):
+    try:
+        async with db_conn(timeout=10) as conn:
+            await revisions_repo.record_revision(
+                conn, note["id"], note["user_id"], note["title"], note["content"], note["updated_at"]
+            )
+    except Exception as e:
+        print(f"Failed to capture revision for note {note['id']}: {e}")
+
 # LIST NOTES (READ, no transaction)
 @router.get("/", response_model=List[Note])
 async def list_notes(
+    response: Response,
     user_id: UUID = Depends(get_current_user_id),
     search: Optional[str] = Query(None),
+    tag: Optional[List[str]] = Query(None),
+    tag_mode: str = Query("any", pattern="^(any|all)$"),
+    sort: str = Query("updated", pattern="^(updated|created|title)$"),
+    order: Optional[str] = Query(None, pattern="^(asc|desc)$"),
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0),
 ):
-    print(f"list_notes called for user {user_id} | search='{search}' | limit={limit} | offset={offset}")
+    # Newest first for the dates, A-Z for titles, unless asked otherwise. Pinned notes always lead.
+    descending = order == "desc" if order else sort != "title"
+    print(f"list_notes called for user {user_id} | search='{search}' | tags={tag} ({tag_mode}) | sort={sort} {'desc' if descending else 'asc'} | limit={limit} | offset={offset}")
+    try:
+        tags = normalize_tags(tag)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     try:
         async with db_conn(timeout=10) as conn:
             print(f"DB connection acquired for user {user_id}")
             rows = await notes_repo.list_notes_by_user(
-                conn, user_id, search, limit=limit, offset=offset
+                conn, user_id, search, limit=limit, offset=offset,
+                tags=tags, match_all_tags=(tag_mode == "all"),
+                sort=sort, descending=descending,
             )
             print(f"Retrieved {len(rows)} notes for user {user_id}")
+            # Notebook-wide totals from the maintained stats row (not affected by search/tag filters).
+            stats = await notes_repo.get_note_stats_for_user(conn, user_id)
+            if stats:
+                response.headers["X-Total-Count"] = str(stats["note_count"])
+                response.headers["X-Content-Bytes"] = str(stats["content_bytes"])
             return [dict(r) for r in rows]
     except Exception as e:
         print(f"Error in list_notes for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch notes")
 
 
+# LIST TAGS WITH NOTE COUNTS (READ)
+@router.get("/tags", response_model=List[TagCount])
+async def list_tags(user_id: UUID = Depends(get_current_user_id)):
+    try:
+        async with db_conn(timeout=10) as conn:
+            rows = await notes_repo.list_tags_for_user(conn, user_id)
+            return [dict(r) for r in rows]
+    except Exception as e:
+        print(f"Error in list_tags for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch tags")
+
+# TITLE AUTOCOMPLETE / QUICK SWITCHER (READ, titles only)
+@router.get("/titles", response_model=List[NoteTitle])
+async def search_titles(
+    user_id: UUID = Depends(get_current_user_id),
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=25),
+):
+    query = q.strip()
+    # min_length counts the spaces; an empty query would ILIKE '%%' and rank the whole notebook.
+    if not query:
+        return []
+    try:
+        async with db_conn(timeout=10) as conn:
+            rows = await notes_repo.search_titles_for_user(conn, user_id, query, limit=limit)
+            return [dict(r) for r in rows]
+    except Exception as e:
+        print(f"Error in search_titles for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search titles")
+
 # GET SINGLE NOTE (READ)
-@router.get("/{note_id}/", response_model=Note)
-async def get_note(note_id: int, user_id: UUID = Depends(get_current_user_id)):
+@router.get("/{note_id}/", response_model=Union[RenderedNote, Note])
+async def get_note(
+    note_id: int,
+    user_id: UUID = Depends(get_current_user_id),
+    format: str = Query("markdown", pattern="^(markdown|html)$"),
+):
+    with_html = format == "html"
     try:
         async with db_conn(timeout=10) as conn:
-            row = await notes_repo.get_note_for_user(conn, note_id, user_id)
+            row = await notes_repo.get_note_for_user(conn, note_id, user_id, with_html=with_html)
+            if row and with_html:
+                note = dict(row)
+                digest = render.content_hash(note["content"])
+                if note.pop("content_html_hash") == digest:
+                    render.record_persisted_hit()
+                    note["html"] = note.pop("content_html")
+                else:
+                    note.pop("content_html")
+                    note["html"] = await render.render_markdown(note["content"], digest)
+                    if get_render_persist():
+                        await notes_repo.save_rendered_html(conn, note_id, user_id, digest, note["html"])
+                return note
     except Exception as e:
         print(f"Unexpected DB error in get_note: {e}")
         raise HTTPException(status_code=500, detail="Database error")
@@ -46,14 +124,53 @@ async def get_note(note_id: int, user_id: UUID = Depends(get_current_user_id)):
 
     return dict(row)
 
+# GET A NOTE'S BODY AS MARKDOWN (READ)
+# Large notes are stored as plain zstd frames; a client that accepts zstd gets those
+# bytes exactly as stored, with no decompress/recompress. Everyone else gets text
+# (which nginx may gzip on the way out).
+@router.get("/{note_id}/content")
+async def get_note_content(
+    note_id: int,
+    request: Request,
+    user_id: UUID = Depends(get_current_user_id),
+):
+    try:
+        async with db_conn(timeout=10) as conn:
+            row = await notes_repo.get_note_body_for_user(conn, note_id, user_id)
+    except Exception as e:
+        print(f"Unexpected DB error in get_note_content: {e}")
+        raise HTTPException(status_code=500, detail="Database error")
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "private, no-cache"}
+    media_type = "text/markdown; charset=utf-8"
+    frame = row["content_zstd"]
+    # Dictionary frames need our dictionary to decode, so those are always sent as text.
+    if frame is not None and row["content_dict_id"] is None and compression.accepts_zstd(request.headers.get("accept-encoding")):
+        return Response(content=frame, media_type=media_type, headers={**headers, "Content-Encoding": "zstd"})
+    content = row["content"] if frame is None else compression.decode(frame, row["content_dict_id"])
+    return Response(content=content, media_type=media_type, headers=headers)
+
 # CREATE NOTE
 @router.post("/", response_model=Note, status_code=201)
-async def create_note(payload: NoteIn, user_id: UUID = Depends(get_current_user_id)):
+async def create_note(
+    payload: NoteIn,
+    background_tasks: BackgroundTasks,
+    user_id: UUID = Depends(get_current_user_id),
+):
     try:
         async with db_conn(timeout=10) as conn:
             async with conn.transaction():
-                row = await notes_repo.create_note(conn, payload.title, payload.content, user_id)
+                row = await notes_repo.create_note(
+                    conn, payload.title, payload.content, user_id, payload.tags, payload.pinned
+                )
+            if row:
+                background_tasks.add_task(capture_revision, dict(row))
             return dict(row)
+    except notes_repo.QuotaExceededError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"Error in create_note: {e}")
         raise HTTPException(status_code=500, detail="Failed to create note")
@@ -63,31 +180,77 @@ async def create_note(payload: NoteIn, user_id: UUID = Depends(get_current_user_
 async def update_note(
     note_id: int,
     payload: NoteUpdate,
+    background_tasks: BackgroundTasks,
     user_id: UUID = Depends(get_current_user_id),
 ):
     try:
         async with db_conn(timeout=10) as conn:
             async with conn.transaction():
                 row = await notes_repo.update_note_for_user(
-                    conn, note_id, user_id, payload.title, payload.content
+                    conn, note_id, user_id, payload.title, payload.content, payload.tags, payload.pinned
                 )
             if not row:
                 raise HTTPException(status_code=404, detail="Note not found")
+            if payload.title is not None or payload.content is not None:
+                background_tasks.add_task(capture_revision, dict(row))
             return dict(row)
+    except notes_repo.QuotaExceededError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"Error in update_note: {e}")
         raise HTTPException(status_code=500, detail="Failed to update note")
 
 # DELETE NOTE (WRITE)
 @router.delete("/{note_id}/", status_code=204)
-async def delete_note(note_id: int, user_id: UUID = Depends(get_current_user_id)):
+async def delete_note(
+    note_id: int,
+    background_tasks: BackgroundTasks,
+    user_id: UUID = Depends(get_current_user_id),
+):
     try:
         async with db_conn(timeout=10) as conn:
             async with conn.transaction():
+                # Detach explicitly (rather than via cascade) to learn which blobs may now be orphaned.
+                sha256s = await attachments_repo.detach_all_for_note(conn, note_id, user_id)
                 success = await notes_repo.delete_note_for_user(conn, note_id, user_id)
             if not success:
                 raise HTTPException(status_code=404, detail="Note not found")
+            if sha256s:
+                background_tasks.add_task(collect_blobs, sha256s)
             return Response(status_code=204)
     except Exception as e:
         print(f"Error in delete_note: {e}")
         raise HTTPException(status_code=500, detail="Failed to delete note")
+
+# LIST REVISIONS OF A NOTE (READ)
+@router.get("/{note_id}/revisions/", response_model=List[RevisionSummary])
+async def list_revisions(
+    note_id: int,
+    user_id: UUID = Depends(get_current_user_id),
+    limit: int = Query(50, le=100),
+    offset: int = Query(0, ge=0),
+):
+    try:
+        async with db_conn(timeout=10) as conn:
+            rows = await revisions_repo.list_revisions_for_note(
+                conn, note_id, user_id, limit=limit, offset=offset
+            )
+            return [dict(r) for r in rows]
+    except Exception as e:
+        print(f"Error in list_revisions for note {note_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch revisions")
+
+# GET A RECONSTRUCTED REVISION (READ)
+@router.get("/{note_id}/revisions/{rev}/", response_model=Revision)
+async def get_revision(note_id: int, rev: int, user_id: UUID = Depends(get_current_user_id)):
+    try:
+        async with db_conn(timeout=10) as conn:
+            revision = await revisions_repo.get_revision_for_note(conn, note_id, user_id, rev)
+    except Exception as e:
+        print(f"Unexpected DB error in get_revision: {e}")
+        raise HTTPException(status_code=500, detail="Database error")
+
+    if not revision:
+        raise HTTPException(status_code=404, detail="Revision not found")
+
+    return revision
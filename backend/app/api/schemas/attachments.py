@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class Attachment(BaseModel):
+    id: int
+    note_id: int
+    filename: str
+    content_type: str
+    sha256: str
+    size: int
+    created_at: datetime
@@ -1,4 +1,6 @@
 from pydantic import BaseModel, EmailStr, field_validator
+from datetime import datetime
+from typing import Optional
 from uuid import UUID
 from pydantic import BaseModel, EmailStr, validator
 
@@ -23,3 +25,11 @@ class TokenOut(BaseModel):
 class MeOut(BaseModel):
     id: UUID
     email: EmailStr
+
+class DeletionOut(BaseModel):
+    id: UUID
+    status: str
+    notes_total: int
+    notes_deleted: int
+    requested_at: datetime
+    finished_at: Optional[datetime] = None
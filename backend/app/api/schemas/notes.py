@@ -1,20 +1,78 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, field_validator
+from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
 
+MAX_TAGS_PER_NOTE = 32
+MAX_TAG_LENGTH = 64
+
+def normalize_tags(tags: Optional[List[str]]) -> Optional[List[str]]:
+    """Lower-case, strip and de-duplicate tags, keeping their original order."""
+    if tags is None:
+        return None
+    normalized = []
+    for tag in tags:
+        tag = tag.strip().lower()
+        if tag and tag not in normalized:
+            normalized.append(tag)
+    if len(normalized) > MAX_TAGS_PER_NOTE:
+        raise ValueError(f"A note can have at most {MAX_TAGS_PER_NOTE} tags")
+    if any(len(tag) > MAX_TAG_LENGTH for tag in normalized):
+        raise ValueError(f"Tags must be at most {MAX_TAG_LENGTH} characters")
+    return normalized
+
 class NoteIn(BaseModel):
     title: str
     content: str
+    tags: List[str] = []
+    pinned: bool = False
+
+    @field_validator("tags")
+    def clean_tags(cls, v):
+        return normalize_tags(v)
 
 class Note(BaseModel):
     id: int
     user_id: UUID
     title: str
     content: str
+    tags: List[str] = []
+    pinned: bool = False
     created_at: datetime
     updated_at: datetime
 
+class RenderedNote(Note):
+    html: str
+
 class NoteUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
+    tags: Optional[List[str]] = None
+    pinned: Optional[bool] = None
+
+    @field_validator("tags")
+    def clean_tags(cls, v):
+        return normalize_tags(v)
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+class NoteTitle(BaseModel):
+    id: int
+    title: str
+    score: float
+
+class RevisionSummary(BaseModel):
+    rev: int
+    kind: str
+    title: str
+    content_bytes: int
+    stored_bytes: int
+    created_at: datetime
+
+class Revision(BaseModel):
+    rev: int
+    title: str
+    content: str
+    created_at: datetime
@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Tuple
+
+from .config import get_attachments_dir
+
+
+class BlobTooLargeError(Exception):
+    """Raised when an upload stream exceeds the allowed size."""
+
+
+# Blobs live at <root>/ab/cd/<sha256>, so identical files are stored once.
+def blob_relative_path(sha256: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+def blob_path(sha256: str) -> Path:
+    return Path(get_attachments_dir()) / blob_relative_path(sha256)
+
+def _tmp_dir() -> Path:
+    # Same filesystem as the blobs, so the final rename is atomic.
+    path = Path(get_attachments_dir()) / "tmp"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def _fsync_and_close(f) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+# Stream an upload to a temp file, hashing as we go; nothing is held in memory beyond one chunk.
+async def write_stream(chunks: AsyncIterator[bytes], max_bytes: int) -> Tuple[Path, str, int]:
+    loop = asyncio.get_event_loop()
+    tmp_path = await loop.run_in_executor(None, lambda: _tmp_dir() / f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    f = await loop.run_in_executor(None, open, tmp_path, "wb")
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if size > max_bytes:
+                raise BlobTooLargeError(f"Attachment exceeds {max_bytes} bytes")
+            digest.update(chunk)
+            await loop.run_in_executor(None, f.write, chunk)
+        await loop.run_in_executor(None, _fsync_and_close, f)
+    except BaseException:
+        f.close()
+        await loop.run_in_executor(None, discard_temp, tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+def _commit_sync(tmp_path: Path, sha256: str) -> None:
+    final = blob_path(sha256)
+    if final.exists():
+        tmp_path.unlink(missing_ok=True)
+        return
+    final.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_path, final)
+
+# Move a finished temp file into place (or drop it if the blob is already stored).
+async def commit_blob(tmp_path: Path, sha256: str) -> None:
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, _commit_sync, tmp_path, sha256)
+
+def discard_temp(tmp_path: Path) -> None:
+    tmp_path.unlink(missing_ok=True)
+
+def _remove_sync(sha256s) -> None:
+    for sha256 in sha256s:
+        blob_path(sha256).unlink(missing_ok=True)
+
+async def remove_blobs(sha256s) -> None:
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, _remove_sync, list(sha256s))
+
+# Drop temp files left behind by uploads that died mid-stream.
+def remove_stale_temp(max_age_seconds: int = 24 * 3600) -> int:
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for path in _tmp_dir().glob("*.part"):
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
@@ -0,0 +1,105 @@
+import re
+import threading
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Set, Tuple
+
+import zstandard
+
+from .config import get_note_compress_min_bytes, get_note_dict_max_bytes, get_note_compress_level
+
+# A note body lives in exactly one of two columns:
+#   content       plain text: short notes, and any that zstd doesn't shrink;
+#   content_zstd  a zstd frame, with content_size holding the text's length in bytes.
+# Mid-sized bodies (up to NOTE_DICT_MAX_BYTES) are compressed against the newest
+# trained dictionary (note_dictionaries, content_dict_id): a few hundred bytes of
+# text have too little repetition of their own for zstd to find. Larger bodies
+# use no dictionary, so their frames are standard zstd that a client sending
+# Accept-Encoding: zstd can decode itself.
+
+_dictionaries: Dict[int, zstandard.ZstdCompressionDict] = {}
+_current_dict_id: Optional[int] = None
+# zstd contexts are reusable but not thread-safe. Compression only happens on the
+# event loop thread; decompression also runs in executor threads (see
+# notes_repo._decode_rows), so each thread gets its own decompressors.
+_compressors: Dict[Optional[int], zstandard.ZstdCompressor] = {}
+_decompressors: Dict[Tuple[int, Optional[int]], zstandard.ZstdDecompressor] = {}
+
+def register_dictionary(dict_id: int, data: bytes) -> None:
+    global _current_dict_id
+    _dictionaries[dict_id] = zstandard.ZstdCompressionDict(data)
+    if _current_dict_id is None or dict_id > _current_dict_id:
+        _current_dict_id = dict_id
+
+def missing_dictionaries(dict_ids: Iterable[Optional[int]]) -> Set[int]:
+    return {d for d in dict_ids if d is not None and d not in _dictionaries}
+
+def _compressor(dict_id: Optional[int]) -> zstandard.ZstdCompressor:
+    compressor = _compressors.get(dict_id)
+    if compressor is None:
+        dict_data = _dictionaries[dict_id] if dict_id is not None else None
+        compressor = zstandard.ZstdCompressor(level=get_note_compress_level(), dict_data=dict_data)
+        _compressors[dict_id] = compressor
+    return compressor
+
+def _decompressor(dict_id: Optional[int]) -> zstandard.ZstdDecompressor:
+    key = (threading.get_ident(), dict_id)
+    decompressor = _decompressors.get(key)
+    if decompressor is None:
+        dict_data = _dictionaries[dict_id] if dict_id is not None else None
+        decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+        _decompressors[key] = decompressor
+    return decompressor
+
+def encode(content: str) -> Tuple[Optional[str], Optional[bytes], Optional[int], Optional[int]]:
+    """Column values (content, content_zstd, content_dict_id, content_size) for a note body."""
+    raw = content.encode()
+    if len(raw) < get_note_compress_min_bytes():
+        return content, None, None, None
+    dict_id = _current_dict_id if len(raw) <= get_note_dict_max_bytes() else None
+    frame = _compressor(dict_id).compress(raw)
+    if len(frame) >= len(raw):
+        return content, None, None, None
+    return None, frame, dict_id, len(raw)
+
+def decode(frame: bytes, dict_id: Optional[int]) -> str:
+    """The text of a content_zstd frame; its dictionary must have been registered."""
+    return _decompressor(dict_id).decompress(frame).decode()
+
+def decode_row(row: Mapping[str, Any]) -> dict:
+    """A note row as a dict with plain `content`, whichever column the body was stored in."""
+    note = dict(row)
+    frame = note.pop("content_zstd", None)
+    dict_id = note.pop("content_dict_id", None)
+    note.pop("content_size", None)
+    if frame is not None:
+        note["content"] = decode(frame, dict_id)
+    return note
+
+def train_dictionary(samples: Sequence[bytes], size: int) -> bytes:
+    """Train a dictionary on sample bodies (CPU-bound: run it in an executor)."""
+    return zstandard.train_dictionary(size, list(samples)).as_bytes()
+
+def like_pattern(pattern: str) -> "re.Pattern":
+    """A regex that fullmatches what `ILIKE pattern` would, for bodies the database can't read itself."""
+    parts = []
+    for char in pattern:
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+def accepts_zstd(accept_encoding: Optional[str]) -> bool:
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        if coding.strip().lower() != "zstd":
+            continue
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
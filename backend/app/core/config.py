@@ -50,8 +50,125 @@ def get_db_pool_min():
 def get_db_pool_max():
     return int(os.getenv("DB_POOL_MAX", "10"))
 
+def get_db_pool_warm():
+    # Connections to open and check before reporting ready (at most DB_POOL_MAX).
+    return int(os.getenv("DB_POOL_WARM", str(get_db_pool_min())))
+
 def get_db_pool_mode():
+    # "session" for a direct connection, "transaction" behind a transaction pooler such as PgBouncer.
     return os.getenv("DB_POOL_MODE", "session")
 
+# Where to reach Postgres itself, bypassing any pooler (LISTEN, migrations, bulk loads).
+def get_db_direct_host():
+    return os.getenv("DB_DIRECT_HOST") or get_db_host()
+
+def get_db_direct_port():
+    return os.getenv("DB_DIRECT_PORT") or get_db_port()
+
 def get_db_timeout():
-    return int(os.getenv("DB_TIMEOUT", "10"))               
\ No newline at end of file
+    return int(os.getenv("DB_TIMEOUT", "10"))
+
+# Per-user quotas
+def get_max_notes_per_user():
+    return int(os.getenv("NOTES_MAX_PER_USER", "10000"))
+
+def get_max_content_bytes_per_user():
+    return int(os.getenv("NOTES_MAX_BYTES_PER_USER", str(100 * 1024 * 1024)))
+
+# Markdown rendering
+def get_render_cache_max_bytes():
+    return int(os.getenv("RENDER_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+def get_render_persist():
+    return os.getenv("RENDER_PERSIST", "true").lower() == "true"
+
+# Note cache
+def get_note_cache_max_bytes():
+    return int(os.getenv("NOTE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Compressed note storage
+def get_note_compress_min_bytes():
+    # Bodies smaller than this stay plain text; the frame overhead isn't worth it.
+    return int(os.getenv("NOTE_COMPRESS_MIN_BYTES", "512"))
+
+def get_note_dict_max_bytes():
+    # Bodies up to this size are compressed with the trained dictionary (when there is one).
+    return int(os.getenv("NOTE_DICT_MAX_BYTES", "8192"))
+
+def get_note_compress_level():
+    return int(os.getenv("NOTE_COMPRESS_LEVEL", "3"))
+
+# Note revisions
+def get_revision_snapshot_interval():
+    return int(os.getenv("REVISION_SNAPSHOT_INTERVAL", "20"))
+
+def get_revision_keep_all_days():
+    return int(os.getenv("REVISION_KEEP_ALL_DAYS", "7"))
+
+def get_revision_retention_days():
+    return int(os.getenv("REVISION_RETENTION_DAYS", "90"))
+
+# Attachments
+def get_attachments_dir():
+    return os.getenv("ATTACHMENTS_DIR", "/app/data/attachments")
+
+def get_attachment_max_bytes():
+    return int(os.getenv("ATTACHMENT_MAX_BYTES", str(25 * 1024 * 1024)))
+
+def get_attachments_accel_prefix():
+    # e.g. "/_attachments/" to hand downloads to an nginx internal location via X-Accel-Redirect.
+    return os.getenv("ATTACHMENTS_ACCEL_PREFIX", "")
+
+# Live change feed
+def get_feed_max_connections():
+    return int(os.getenv("FEED_MAX_CONNECTIONS", "1000"))
+
+def get_feed_max_per_user():
+    return int(os.getenv("FEED_MAX_PER_USER", "10"))
+
+def get_feed_max_pending():
+    return int(os.getenv("FEED_MAX_PENDING", "256"))
+
+def get_feed_heartbeat_seconds():
+    return int(os.getenv("FEED_HEARTBEAT_SECONDS", "15"))
+
+# Background jobs
+def get_jobs_in_process():
+    return os.getenv("JOBS_IN_PROCESS", "true").lower() == "true"
+
+def get_jobs_concurrency():
+    return int(os.getenv("JOBS_CONCURRENCY", "2"))
+
+def get_jobs_pool_max():
+    return int(os.getenv("JOBS_POOL_MAX", "3"))
+
+def get_jobs_batch_size():
+    return int(os.getenv("JOBS_BATCH_SIZE", "10"))
+
+def get_jobs_poll_interval():
+    return float(os.getenv("JOBS_POLL_INTERVAL", "1.0"))
+
+def get_jobs_visibility_timeout():
+    return int(os.getenv("JOBS_VISIBILITY_TIMEOUT", "300"))
+
+def get_jobs_retry_base_seconds():
+    return float(os.getenv("JOBS_RETRY_BASE_SECONDS", "5"))
+
+# Account deletion
+def get_purge_batch_size():
+    return int(os.getenv("ACCOUNT_PURGE_BATCH_SIZE", "500"))
+
+def get_purge_batch_pause():
+    return float(os.getenv("ACCOUNT_PURGE_BATCH_PAUSE", "0.25"))
+
+def get_purge_run_seconds():
+    return float(os.getenv("ACCOUNT_PURGE_RUN_SECONDS", "20"))
+
+# Graceful shutdown
+def get_shutdown_grace_seconds():
+    # Total time from SIGTERM to a closed pool; keep it under the orchestrator's kill timeout.
+    return float(os.getenv("SHUTDOWN_GRACE_SECONDS", "25"))
+
+def get_shutdown_drain_delay():
+    # How long /health/ready reports 503 before the listening socket closes, so the proxy moves off first.
+    return float(os.getenv("SHUTDOWN_DRAIN_DELAY", "5"))
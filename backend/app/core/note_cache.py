@@ -0,0 +1,78 @@
+import json
+from collections import OrderedDict
+from typing import Any, Mapping, Optional, Tuple
+from uuid import UUID
+
+from .config import get_note_cache_max_bytes
+from .lru import ByteBudgetLRU
+
+# How many recent invalidations to remember for the stale-fill check below.
+_RECENT_INVALIDATIONS = 4096
+# Rough per-entry overhead on top of the text itself (dict, timestamps, ids).
+_ENTRY_OVERHEAD = 256
+
+_cache = ByteBudgetLRU(get_note_cache_max_bytes())
+# Only serve from the cache while invalidations are known to be arriving (see set_coherent).
+_coherent = False
+_sequence = 0
+_recent: "OrderedDict[Tuple[UUID, int], int]" = OrderedDict()
+_forgotten_before = 0
+_skipped_fills = 0
+
+def _entry_size(row: Mapping[str, Any]) -> int:
+    tags = row.get("tags") or ()
+    return _ENTRY_OVERHEAD + len(row["title"].encode()) + len(row["content"].encode()) + sum(len(t) for t in tags)
+
+def lookup(user_id: UUID, note_id: int) -> Tuple[Optional[dict], Optional[int]]:
+    """Return (cached note or None, fill token). Pass the token back to fill() after reading the database."""
+    if not _coherent:
+        return None, None
+    note = _cache.get((user_id, note_id))
+    return (dict(note) if note is not None else None), _sequence
+
+def fill(user_id: UUID, note_id: int, row: Mapping[str, Any], token: Optional[int]) -> None:
+    """Cache a row read from the database, unless it may have been invalidated while it was being read."""
+    global _skipped_fills
+    if token is None or not _coherent:
+        return
+    key = (user_id, note_id)
+    if token < _forgotten_before or _recent.get(key, -1) > token:
+        _skipped_fills += 1
+        return
+    _cache.put(key, dict(row), _entry_size(row))
+
+def invalidate(user_id: UUID, note_id: int) -> None:
+    global _sequence, _forgotten_before
+    _sequence += 1
+    key = (user_id, note_id)
+    _cache.pop(key)
+    _recent[key] = _sequence
+    _recent.move_to_end(key)
+    while len(_recent) > _RECENT_INVALIDATIONS:
+        _, _forgotten_before = _recent.popitem(last=False)
+
+def on_note_change(payload: str) -> None:
+    """note_changes listener callback: every worker, including the writer, drops its copy."""
+    event = json.loads(payload)
+    if event["op"] == "created":
+        # Nothing can be cached for a note that didn't exist yet.
+        return
+    invalidate(UUID(event["user_id"]), event["note_id"])
+
+def set_coherent(coherent: bool) -> None:
+    """Called as the LISTEN connection comes and goes.
+
+    Notifications sent while it was down are lost, so whatever was cached then
+    can't be trusted: drop it, and bypass the cache until the listener is back.
+    """
+    global _coherent
+    _coherent = coherent
+    _cache.clear()
+
+def get_note_cache_stats() -> dict:
+    return {
+        **_cache.stats(),
+        "enabled": _coherent,
+        "invalidations": _sequence,
+        "skipped_fills": _skipped_fills,
+    }
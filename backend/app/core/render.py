@@ -0,0 +1,50 @@
+import asyncio
+import hashlib
+
+import markdown
+import nh3
+
+from .config import get_render_cache_max_bytes
+from .lru import ByteBudgetLRU
+
+# Bump when the Markdown extensions or sanitiser policy change so persisted HTML is re-rendered.
+RENDERER_VERSION = "1"
+
+_MARKDOWN_EXTENSIONS = ["fenced_code", "tables", "sane_lists"]
+_ALLOWED_ATTRIBUTES = {**nh3.ALLOWED_ATTRIBUTES, "code": {"class"}}
+
+_cache = ByteBudgetLRU(get_render_cache_max_bytes())
+_persisted_hits = 0
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(f"{RENDERER_VERSION}\0{content}".encode()).hexdigest()
+
+def _keep_language_classes(tag: str, attr: str, value: str):
+    # fenced_code emits class="language-xyz"; drop any other class values.
+    if tag == "code" and attr == "class" and not value.startswith("language-"):
+        return None
+    return value
+
+# Synchronous Markdown -> sanitized HTML
+def _render_sync(content: str) -> str:
+    html = markdown.markdown(content, extensions=_MARKDOWN_EXTENSIONS, output_format="html")
+    return nh3.clean(html, attributes=_ALLOWED_ATTRIBUTES, attribute_filter=_keep_language_classes)
+
+# Async wrapper: cached by content hash, rendered in the default executor on a miss
+async def render_markdown(content: str, digest: str = None) -> str:
+    digest = digest or content_hash(content)
+    html = _cache.get(digest)
+    if html is not None:
+        return html
+    loop = asyncio.get_event_loop()
+    html = await loop.run_in_executor(None, _render_sync, content)
+    _cache.put(digest, html, len(html.encode()))
+    return html
+
+def record_persisted_hit() -> None:
+    """Count a render served from the notes.content_html column."""
+    global _persisted_hits
+    _persisted_hits += 1
+
+def get_render_cache_stats() -> dict:
+    return {**_cache.stats(), "persisted_hits": _persisted_hits}
@@ -0,0 +1,109 @@
+import json
+import zlib
+from datetime import datetime, timedelta, timezone
+from difflib import SequenceMatcher
+from typing import Any, List, Mapping, Optional, Sequence
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+# Revision bodies are zlib-compressed. A snapshot body is the full UTF-8 text; a
+# delta body is a JSON list of line-level ops against the previous revision:
+#   [start, end]  copy lines start..end from the previous revision
+#   "text"        insert this text
+
+def encode_snapshot(content: str) -> bytes:
+    return zlib.compress(content.encode(), 6)
+
+def decode_snapshot(body: bytes) -> str:
+    return zlib.decompress(body).decode()
+
+def encode_delta(previous: str, content: str) -> bytes:
+    old_lines = previous.splitlines(keepends=True)
+    new_lines = content.splitlines(keepends=True)
+    ops: List[Any] = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(new_lines[j1:j2]))
+    return zlib.compress(json.dumps(ops, separators=(",", ":")).encode(), 6)
+
+def apply_delta(previous: str, body: bytes) -> str:
+    old_lines = previous.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(body)):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(old_lines[op[0]:op[1]])
+    return "".join(parts)
+
+def encode_revision(previous: Optional[str], content: str, force_snapshot: bool) -> tuple:
+    """Return (kind, body) for a new revision, preferring a delta unless a snapshot is due or smaller."""
+    snapshot = encode_snapshot(content)
+    if force_snapshot or previous is None:
+        return SNAPSHOT, snapshot
+    delta = encode_delta(previous, content)
+    if len(delta) >= len(snapshot):
+        return SNAPSHOT, snapshot
+    return DELTA, delta
+
+def reconstruct(chain: Sequence[Mapping[str, Any]]) -> str:
+    """Rebuild the content of the last revision in a chain that starts with a snapshot."""
+    content = None
+    for row in chain:
+        if row["kind"] == SNAPSHOT:
+            content = decode_snapshot(row["body"])
+        else:
+            content = apply_delta(content, row["body"])
+    return content
+
+def plan_compaction(
+    rows: Sequence[Mapping[str, Any]],
+    *,
+    keep_all_days: int,
+    retention_days: int,
+    snapshot_interval: int,
+    now: Optional[datetime] = None,
+) -> tuple:
+    """Decide which revisions of one note survive compaction and re-encode the survivors.
+
+    rows must be every revision of the note in rev order. Recent revisions are
+    all kept; older ones are thinned to the last revision of each day, and
+    anything past the retention window is dropped. The newest revision is
+    always kept. Returns (ids_to_delete, [(id, kind, body), ...] to rewrite).
+    """
+    now = now or datetime.now(timezone.utc)
+    keep_all_after = now - timedelta(days=keep_all_days)
+    drop_before = now - timedelta(days=retention_days)
+
+    contents = []
+    content = None
+    for row in rows:
+        content = decode_snapshot(row["body"]) if row["kind"] == SNAPSHOT else apply_delta(content, row["body"])
+        contents.append(content)
+
+    keep = []
+    for i, row in enumerate(rows):
+        created = row["created_at"]
+        is_last = i == len(rows) - 1
+        if is_last or created >= keep_all_after:
+            keep.append(i)
+        elif created >= drop_before and rows[i + 1]["created_at"].date() != created.date():
+            keep.append(i)
+
+    if len(keep) == len(rows):
+        return [], []
+
+    kept = set(keep)
+    to_delete = [row["id"] for i, row in enumerate(rows) if i not in kept]
+    to_rewrite = []
+    previous = None
+    for position, i in enumerate(keep):
+        kind, body = encode_revision(previous, contents[i], position % snapshot_interval == 0)
+        if kind != rows[i]["kind"] or body != rows[i]["body"]:
+            to_rewrite.append((rows[i]["id"], kind, body))
+        previous = contents[i]
+    return to_delete, to_rewrite
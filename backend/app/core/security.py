@@ -1,6 +1,8 @@
 import bcrypt
 import asyncio
+import json
 from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Mapping, Optional
 from uuid import UUID
 
 from fastapi import Depends, HTTPException, status
@@ -45,6 +47,34 @@ def create_access_token(sub: str, *, expires_minutes: int = None) -> str:
     }
     return jwt.encode(payload, get_jwt_secret(), algorithm=get_jwt_alg())
 
+# Revoked accounts: user id -> when their last possible token expires.
+# Tokens are stateless, so a deleted account's tokens stay valid until they expire;
+# each worker keeps this small set instead of checking the database per request.
+# It's fed by the user_disabled channel and reloaded whenever the listener
+# (re)connects (see app/events.py).
+_revoked: Dict[UUID, datetime] = {}
+
+def revoke_user(user_id: UUID, disabled_at: Optional[datetime] = None) -> None:
+    disabled_at = disabled_at or datetime.now(timezone.utc)
+    _revoked[user_id] = disabled_at + timedelta(minutes=get_access_token_expiry())
+
+def load_revoked_users(rows: Iterable[Mapping]) -> None:
+    for row in rows:
+        revoke_user(row["user_id"], row["requested_at"])
+
+def on_user_disabled(payload: str) -> None:
+    revoke_user(UUID(json.loads(payload)["user_id"]))
+
+def is_revoked(user_id: UUID) -> bool:
+    until = _revoked.get(user_id)
+    if until is None:
+        return False
+    if until < datetime.now(timezone.utc):
+        # Every token issued before the account was disabled has expired by now.
+        del _revoked[user_id]
+        return False
+    return True
+
 # Token payload model
 class TokenData(BaseModel):
     sub: UUID
@@ -68,7 +98,11 @@ async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> UUID:
             print("Token expired")
             raise credentials_exc
 
-        return UUID(str(sub))
+        user_id = UUID(str(sub))
+        if is_revoked(user_id):
+            print("Token belongs to a deleted account")
+            raise credentials_exc
+        return user_id
     except JWTError as e:
         print(f"Token decode failed: {e}")
         raise credentials_exc
\ No newline at end of file
@@ -5,12 +5,56 @@ from contextlib import asynccontextmanager
 from app.core.config import (
     get_db_user, get_db_password, get_db_host, get_db_port,
     get_db_name, get_db_ssl_mode, get_db_pool_min, get_db_pool_max,
-    get_db_timeout
+    get_db_timeout, get_db_pool_mode, get_db_direct_host, get_db_direct_port,
+    get_db_pool_warm,
 )
 
 DB_POOL = None
 _TEST_POOL = None
 
+def _ssl_context():
+    ssl_mode = get_db_ssl_mode().lower()
+    if ssl_mode != "disable":
+        return ssl_lib.create_default_context()
+    return None
+
+def _connect_kwargs(direct=False):
+    """Connection settings shared by the pool and dedicated connections."""
+    return dict(
+        user=get_db_user(),
+        password=get_db_password(),
+        host=get_db_direct_host() if direct else get_db_host(),
+        port=int(get_db_direct_port() if direct else get_db_port()),
+        database=get_db_name(),
+        command_timeout=int(get_db_timeout()),
+        ssl=_ssl_context(),
+    )
+
+async def _skip_session_reset(conn):
+    # asyncpg still rolls back any open transaction before this runs.
+    pass
+
+def _pool_mode_kwargs():
+    """Extra pool options for DB_POOL_MODE.
+
+    Behind a transaction pooler, consecutive statements on one asyncpg
+    connection can land on different server connections, so nothing may rely
+    on session state:
+      * no named prepared statements: the statement cache is off, and asyncpg
+        falls back to unnamed statements that live only as long as the query;
+      * no session reset on release: RESET ALL / UNLISTEN * would just run on
+        whichever server connection the pooler picks, for nothing;
+      * settings go in the transaction that needs them (SET LOCAL, as the repos
+        do), never SET on the connection;
+      * LISTEN needs a real session, so connect_dedicated() goes direct.
+    """
+    mode = get_db_pool_mode().lower()
+    if mode == "transaction":
+        return dict(statement_cache_size=0, reset=_skip_session_reset)
+    if mode != "session":
+        raise ValueError(f"Unknown DB_POOL_MODE {mode!r} (expected 'session' or 'transaction')")
+    return {}
+
 # Retry logic for pool initialization
 async def init_db_pool(retries=3, delay=2):
     """Initialize the main app pool with retry support."""
@@ -18,25 +62,16 @@ async def init_db_pool(retries=3, delay=2):
     if DB_POOL:
         return DB_POOL
 
-    ssl_mode = get_db_ssl_mode().lower()
-    ssl = None
-    if ssl_mode != "disable":
-        ssl = ssl_lib.create_default_context()
-
+    pool_kwargs = _pool_mode_kwargs()
     for attempt in range(retries):
         try:
             DB_POOL = await asyncpg.create_pool(
-                user=get_db_user(),
-                password=get_db_password(),
-                host=get_db_host(),
-                port=int(get_db_port()),
-                database=get_db_name(),
                 min_size=int(get_db_pool_min()),
                 max_size=int(get_db_pool_max()),
-                command_timeout=int(get_db_timeout()),
-                ssl=ssl,
+                **pool_kwargs,
+                **_connect_kwargs(),
             )
-            print(f"DB pool initialized: max={DB_POOL._maxsize}")
+            print(f"DB pool initialized: max={DB_POOL._maxsize} mode={get_db_pool_mode()}")
             return DB_POOL
         except Exception as e:
             print(f"DB pool init failed (attempt {attempt + 1}): {e}")
@@ -44,10 +79,48 @@ async def init_db_pool(retries=3, delay=2):
 
     raise RuntimeError("Failed to initialize DB pool after retries.")
 
-async def close_db_pool():
+async def create_dedicated_pool(min_size: int, max_size: int):
+    """A separate pool with its own connection budget (e.g. for the job worker)."""
+    return await asyncpg.create_pool(min_size=min_size, max_size=max_size, **_pool_mode_kwargs(), **_connect_kwargs())
+
+async def connect_dedicated():
+    """Open a session straight to Postgres, bypassing any pooler, for long-lived uses such as LISTEN."""
+    return await asyncpg.connect(**_connect_kwargs(direct=True))
+
+async def warm_db_pool(size=None):
+    """Open and check `size` connections (DB_POOL_WARM) before the worker reports ready.
+
+    Otherwise the first requests after a restart each pay for a new connection
+    (TCP, TLS, auth) on top of their own query.
+    """
+    if not DB_POOL:
+        raise RuntimeError("DB pool not initialized. Call init_db_pool() on startup.")
+    size = min(size or get_db_pool_warm(), DB_POOL._maxsize)
+    # Hold them all at once, or the pool would just hand back the same connection.
+    acquired = await asyncio.gather(*(DB_POOL.acquire(timeout=10) for _ in range(size)), return_exceptions=True)
+    conns = [c for c in acquired if not isinstance(c, BaseException)]
+    try:
+        for failure in acquired:
+            if isinstance(failure, BaseException):
+                raise failure
+        await asyncio.gather(*(conn.fetchval("SELECT 1") for conn in conns))
+    finally:
+        for conn in conns:
+            await DB_POOL.release(conn)
+    print(f"DB pool warmed: {size} connections")
+
+async def close_db_pool(timeout=None):
+    """Close the main pool, waiting for connections in use to be released.
+
+    With a timeout, connections still out after it are terminated instead.
+    """
     global DB_POOL
     if DB_POOL:
-        await DB_POOL.close()
+        try:
+            await asyncio.wait_for(DB_POOL.close(), timeout)
+        except asyncio.TimeoutError:
+            print("DB pool did not close in time; terminating remaining connections")
+            DB_POOL.terminate()
         DB_POOL = None
 
 @asynccontextmanager
@@ -68,6 +141,7 @@ def get_pool_status():
         return {"error": "DB pool not initialized"}
 
     return {
+        "mode": get_db_pool_mode(),
         "max_size": DB_POOL._maxsize,
         "current_size": DB_POOL._queue.qsize(),
         "in_use": DB_POOL._maxsize - DB_POOL._queue.qsize()
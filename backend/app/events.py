@@ -0,0 +1,252 @@
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from .db import connect_dedicated, db_conn
+from .core import note_cache, security
+from .core.config import (
+    get_feed_max_connections, get_feed_max_per_user, get_feed_max_pending, get_access_token_expiry,
+)
+from .repos import deletions_repo, compression_repo
+
+# Channel notes_repo writes to on every create/update/delete.
+NOTE_CHANGES_CHANNEL = "note_changes"
+# Channel users_repo.disable_user writes to when an account is deleted.
+USER_DISABLED_CHANNEL = "user_disabled"
+# Channel compression_repo.save_dictionary writes a new dictionary's id to.
+NOTE_DICTIONARY_CHANNEL = "note_dictionaries"
+
+
+class PgListener:
+    """A single dedicated LISTEN connection per worker, fanning notifications out to callbacks.
+
+    The connection is re-established with backoff if it drops. Notifications sent
+    while it was down are lost, so reconnect hooks run after every (re)connect to
+    let subscribers resynchronise.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[str], None]]] = {}
+        self._reconnect_hooks: List[Callable[[], None]] = []
+        self._disconnect_hooks: List[Callable[[], None]] = []
+        self._conn = None
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        self._handlers.setdefault(channel, []).append(callback)
+
+    def on_reconnect(self, callback: Callable[[], None]) -> None:
+        self._reconnect_hooks.append(callback)
+
+    def on_disconnect(self, callback: Callable[[], None]) -> None:
+        self._disconnect_hooks.append(callback)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _dispatch(self, conn, pid, channel, payload) -> None:
+        for callback in self._handlers.get(channel, []):
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"Listener callback for {channel} failed: {e}")
+
+    async def _run(self) -> None:
+        delay = 1
+        while True:
+            lost = asyncio.Event()
+            try:
+                self._conn = await connect_dedicated()
+                self._conn.add_termination_listener(lambda conn: lost.set())
+                for channel in self._handlers:
+                    await self._conn.add_listener(channel, self._dispatch)
+                self.connected = True
+                delay = 1
+                print(f"Listening on {sorted(self._handlers)}")
+                for hook in self._reconnect_hooks:
+                    hook()
+                await lost.wait()
+                print("Listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                print(f"Listener connection failed: {e}")
+            finally:
+                if self.connected:
+                    for hook in self._disconnect_hooks:
+                        hook()
+                self.connected = False
+                if self._conn is not None and not self._conn.is_closed():
+                    await self._conn.close()
+                self._conn = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+class FeedFullError(Exception):
+    """Raised when a worker or a user has no change-feed slots left."""
+
+
+class Subscription:
+    """Pending changes for one connected client.
+
+    Changes to the same note coalesce, so a burst of autosaves is one event. If
+    a slow client lets more than max_pending distinct notes pile up, the backlog
+    is dropped and the client is told to resync (refetch the list) instead, which
+    keeps memory per client bounded.
+    """
+
+    def __init__(self, user_id: UUID, max_pending: int):
+        self.user_id = user_id
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[int, str]" = OrderedDict()
+        self._resync = False
+        self._ready = asyncio.Event()
+        self.closed = False
+
+    def offer(self, note_id: int, op: str) -> None:
+        if not self._resync:
+            if note_id in self._pending:
+                self._pending.move_to_end(note_id)
+                self._pending[note_id] = op
+            elif len(self._pending) >= self.max_pending:
+                self._pending.clear()
+                self._resync = True
+            else:
+                self._pending[note_id] = op
+        self._ready.set()
+
+    def request_resync(self) -> None:
+        self._pending.clear()
+        self._resync = True
+        self._ready.set()
+
+    def close(self) -> None:
+        """End the stream (the worker is shutting down); the client reconnects elsewhere."""
+        self.closed = True
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> Tuple[bool, List[Tuple[int, str]]]:
+        """Wait up to timeout for changes; returns (resync, [(note_id, op), ...])."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False, []
+        resync, changes = self._resync, list(self._pending.items())
+        self._pending.clear()
+        self._resync = False
+        self._ready.clear()
+        return resync, changes
+
+
+class ChangeFeed:
+    """Per-user in-memory channels fed by the note_changes notifications."""
+
+    def __init__(self):
+        self._subscribers: Dict[UUID, Set[Subscription]] = {}
+        self._count = 0
+        self.unrouted = 0
+
+    def subscribe(self, user_id: UUID) -> Subscription:
+        if self._count >= get_feed_max_connections():
+            raise FeedFullError("Too many live connections on this server")
+        if len(self._subscribers.get(user_id, ())) >= get_feed_max_per_user():
+            raise FeedFullError("Too many live connections for this account")
+        sub = Subscription(user_id, get_feed_max_pending())
+        self._subscribers.setdefault(user_id, set()).add(sub)
+        self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.user_id)
+        if subs and sub in subs:
+            subs.discard(sub)
+            self._count -= 1
+            if not subs:
+                del self._subscribers[sub.user_id]
+
+    def publish(self, payload: str) -> None:
+        event = json.loads(payload)
+        subs = self._subscribers.get(UUID(event["user_id"]))
+        if not subs:
+            # Nobody on this worker is watching that user.
+            self.unrouted += 1
+            return
+        for sub in subs:
+            sub.offer(event["note_id"], event["op"])
+
+    def resync_all(self) -> None:
+        for subs in self._subscribers.values():
+            for sub in subs:
+                sub.request_resync()
+
+    def close_all(self) -> None:
+        for subs in self._subscribers.values():
+            for sub in subs:
+                sub.close()
+
+    def stats(self) -> dict:
+        return {
+            "connections": self._count,
+            "users": len(self._subscribers),
+            "unrouted_events": self.unrouted,
+            "max_connections": get_feed_max_connections(),
+            "listener_connected": LISTENER.connected,
+        }
+
+
+_background: Set[asyncio.Task] = set()
+
+def _spawn(coro) -> None:
+    # Reconnect hooks are synchronous; keep a reference so the task isn't collected mid-run.
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+async def wait_background(timeout: float) -> None:
+    """Give background tasks started here up to timeout to finish (shutdown)."""
+    if _background:
+        await asyncio.wait(set(_background), timeout=timeout)
+
+async def reload_revoked_users() -> None:
+    """Catch up on account deletions whose notifications were missed (startup, or while disconnected)."""
+    try:
+        async with db_conn(timeout=10) as conn:
+            rows = await deletions_repo.list_recent_deletions(conn, get_access_token_expiry() * 60)
+        security.load_revoked_users(rows)
+    except Exception as e:
+        print(f"Failed to reload revoked users: {e}")
+
+async def load_note_dictionaries(dict_ids=None) -> None:
+    """Pick up the newest trained dictionary for compressing notes (on connect, and when one is trained)."""
+    try:
+        async with db_conn(timeout=10) as conn:
+            await compression_repo.load_dictionaries(conn, dict_ids)
+    except Exception as e:
+        print(f"Failed to load note dictionaries: {e}")
+
+
+LISTENER = PgListener()
+CHANGE_FEED = ChangeFeed()
+LISTENER.subscribe(NOTE_CHANGES_CHANNEL, CHANGE_FEED.publish)
+LISTENER.on_reconnect(CHANGE_FEED.resync_all)
+LISTENER.subscribe(NOTE_CHANGES_CHANNEL, note_cache.on_note_change)
+LISTENER.on_reconnect(lambda: note_cache.set_coherent(True))
+LISTENER.on_disconnect(lambda: note_cache.set_coherent(False))
+LISTENER.subscribe(USER_DISABLED_CHANNEL, security.on_user_disabled)
+LISTENER.on_reconnect(lambda: _spawn(reload_revoked_users()))
+LISTENER.subscribe(NOTE_DICTIONARY_CHANNEL, lambda payload: _spawn(load_note_dictionaries([int(payload)])))
+LISTENER.on_reconnect(lambda: _spawn(load_note_dictionaries()))
@@ -0,0 +1,4 @@
+from .worker import JOB_WORKER, HANDLERS, JobWorker, job_handler
+from . import handlers
+
+__all__ = ["JOB_WORKER", "HANDLERS", "JobWorker", "job_handler"]
@@ -0,0 +1,46 @@
+"""Run the job worker on its own, outside the API process:
+
+    python -m app.jobs                       # process jobs until SIGTERM/SIGINT
+    python -m app.jobs enqueue <kind> [json] # queue a job, e.g. compact_revisions
+"""
+import argparse
+import asyncio
+import json
+import signal
+
+from ..db import db_conn, init_db_pool, close_db_pool
+from ..repos import jobs_repo
+from . import JOB_WORKER, HANDLERS
+
+async def run_worker():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await JOB_WORKER.start()
+    try:
+        await stop.wait()
+    finally:
+        await JOB_WORKER.stop()
+
+async def enqueue(kind: str, payload: dict):
+    await init_db_pool()
+    try:
+        async with db_conn(timeout=10) as conn:
+            job_id = await jobs_repo.enqueue_job(conn, kind, payload)
+        print(f"Queued job {job_id} ({kind})")
+    finally:
+        await close_db_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="scriobh background job worker")
+    sub = parser.add_subparsers(dest="command")
+    enqueue_parser = sub.add_parser("enqueue", help="queue a job")
+    enqueue_parser.add_argument("kind", choices=sorted(HANDLERS))
+    enqueue_parser.add_argument("payload", nargs="?", default="{}")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        asyncio.run(enqueue(args.kind, json.loads(args.payload)))
+    else:
+        asyncio.run(run_worker())
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from uuid import UUID
+
+from ..maintenance import compact_revisions, train_note_dictionary, compress_notes, resume_deletions
+from ..repos import notes_repo, jobs_repo, deletions_repo, attachments_repo
+from ..core.config import get_purge_batch_size, get_purge_batch_pause, get_purge_run_seconds
+from .worker import job_handler
+
+# Welcome note content
+WELCOME_NOTE_CONTENT = """# Welcome to scriobh!
+
+This is a **Markdown-enabled notes app**, built with computer science students in mind. It’s designed to make it easy to take well-structured notes during lectures and labs.
+
+In the bottom-left  corner of the app, you’ll find three important buttons:
+
+1. New Note – Create a fresh note instantly.
+
+2. Toggle Markdown Mode – Switch between plain text and Markdown preview mode to format your notes.
+
+3. Logout – Securely log out of your account when you’re done.
+
+## Markdown Features
+
+* **Headings**: Use `#` for different heading sizes.
+* **Bold**: Wrap text in `**double asterisks**`.
+* **Italics**: Use `*single asterisks*`.
+* **Lists**: Start a line with `*` or `-`.
+
+---
+
+### Code Blocks
+
+You can display code by wrapping it in backticks.
+
+`console.log("Hello, World!");`
+
+You can also create multi-line code blocks like this:
+
+```javascript
+function sayHello() {
+  console.log("Welcome to scriobh!");
+}
+sayHello();"""
+
+@job_handler("welcome_note")
+async def create_welcome_note(ctx, payload):
+    user_id = UUID(payload["user_id"])
+    async with ctx.acquire() as conn:
+        async with conn.transaction():
+            # Completing inside the same transaction means a retry can never add a second welcome note.
+            if not await ctx.complete_in(conn):
+                return
+            note = await notes_repo.create_note(conn, title="Welcome!", content=WELCOME_NOTE_CONTENT, user_id=user_id)
+            if not note:
+                # create_note reports failure as {}; raising rolls back complete_in too, so the job is retried.
+                raise RuntimeError(f"Could not create welcome note for user {user_id}")
+    print(f"Welcome note created for user {user_id}")
+
+@job_handler("compact_revisions")
+async def run_compact_revisions(ctx, payload):
+    await compact_revisions(acquire=ctx.acquire)
+
+@job_handler("gc_attachments")
+async def run_collect_orphan_attachments(ctx, payload):
+    await attachments_repo.collect_orphan_attachments(payload.get("sha256s"), acquire=ctx.acquire)
+
+@job_handler("train_note_dictionary")
+async def run_train_note_dictionary(ctx, payload):
+    await train_note_dictionary(acquire=ctx.acquire)
+
+@job_handler("compress_notes")
+async def run_compress_notes(ctx, payload):
+    await compress_notes(acquire=ctx.acquire)
+
+@job_handler("resume_deletions")
+async def run_resume_deletions(ctx, payload):
+    await resume_deletions(acquire=ctx.acquire)
+
+@job_handler("purge_account")
+async def purge_account(ctx, payload):
+    """Delete a disabled account's notes a small batch at a time, then the account itself.
+
+    Each batch is its own short transaction with a pause after it, so locks,
+    WAL and I/O stay in small steps that other users' queries slot in between.
+    After ACCOUNT_PURGE_RUN_SECONDS the job hands over to a fresh copy of
+    itself, so no single run outlives the visibility timeout.
+
+    If the last attempt fails too, the deletion is marked failed (that's what
+    GET /auth/deletions/{id} shows) and left for the resume-deletions sweep.
+    """
+    deletion_id, user_id = UUID(payload["deletion_id"]), UUID(payload["user_id"])
+    try:
+        await _purge_account(ctx, payload, deletion_id, user_id)
+    except Exception:
+        if ctx.final_attempt:
+            async with ctx.acquire() as conn:
+                await deletions_repo.fail_deletion(conn, deletion_id)
+        raise
+
+async def _purge_account(ctx, payload, deletion_id: UUID, user_id: UUID) -> None:
+    batch_size = get_purge_batch_size()
+    deadline = time.monotonic() + get_purge_run_seconds()
+    while True:
+        async with ctx.acquire() as conn:
+            async with conn.transaction():
+                deleted, sha256s = await deletions_repo.purge_notes_batch(conn, user_id, batch_size)
+                await deletions_repo.record_progress(conn, deletion_id, deleted)
+        if sha256s:
+            await attachments_repo.collect_orphan_attachments(sha256s, acquire=ctx.acquire)
+        if deleted < batch_size:
+            break
+        if time.monotonic() > deadline:
+            async with ctx.acquire() as conn:
+                async with conn.transaction():
+                    if await ctx.complete_in(conn):
+                        await jobs_repo.enqueue_job(conn, "purge_account", payload)
+            return
+        await asyncio.sleep(get_purge_batch_pause())
+
+    async with ctx.acquire() as conn:
+        async with conn.transaction():
+            if not await ctx.complete_in(conn):
+                return
+            if not await deletions_repo.finish_deletion(conn, deletion_id, user_id):
+                # A note slipped in (e.g. a late welcome note); roll back and let the retry sweep it.
+                raise RuntimeError(f"User {user_id} still has notes")
+    print(f"Account {user_id} purged")
@@ -0,0 +1,202 @@
+import asyncio
+import os
+import random
+import socket
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from ..db import create_dedicated_pool
+from ..repos import jobs_repo
+from ..core.config import (
+    get_jobs_concurrency, get_jobs_pool_max, get_jobs_batch_size, get_jobs_poll_interval,
+    get_jobs_visibility_timeout, get_jobs_retry_base_seconds,
+)
+
+MAX_RETRY_DELAY_SECONDS = 3600
+_REAP_INTERVAL_SECONDS = 30
+
+Handler = Callable[["JobContext", Mapping[str, Any]], Awaitable[None]]
+HANDLERS: Dict[str, Handler] = {}
+
+def job_handler(kind: str):
+    """Register a coroutine as the handler for a job kind."""
+    def register(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter: base, 2x base, 4x base, ... capped at an hour."""
+    delay = min(get_jobs_retry_base_seconds() * 2 ** (attempts - 1), MAX_RETRY_DELAY_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class JobContext:
+    """What a handler gets besides its payload: the job row and the worker's connections."""
+
+    def __init__(self, pool, job: Mapping[str, Any]):
+        self.job = job
+        self.completed = False
+        self._pool = pool
+
+    @asynccontextmanager
+    async def acquire(self, timeout=10):
+        async with self._pool.acquire(timeout=timeout) as conn:
+            yield conn
+
+    @property
+    def final_attempt(self) -> bool:
+        """True if the worker gives the job up should this attempt fail."""
+        return self.job["attempts"] >= self.job["max_attempts"]
+
+    async def complete_in(self, conn) -> bool:
+        """Mark the job done inside the handler's own transaction, for exactly-once effects.
+
+        Returns False if another attempt already completed it, in which case the
+        handler should roll back / skip its work.
+        """
+        self.completed = True
+        return await jobs_repo.complete_job(conn, self.job["id"])
+
+
+class JobWorker:
+    """Claims jobs in batches with FOR UPDATE SKIP LOCKED and runs them with bounded concurrency.
+
+    The worker has its own small pool (JOBS_POOL_MAX), so background work can
+    never starve request handlers of connections.
+    """
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.pool = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        # Created in start(): an Event binds to the loop that first waits on it, and
+        # JOB_WORKER outlives any one loop (tests, repeated asyncio.run).
+        self._stopping: Optional[asyncio.Event] = None
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.avg_wait_seconds: Optional[float] = None
+        self.avg_run_seconds: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = asyncio.Event()
+        self.pool = await create_dedicated_pool(1, get_jobs_pool_max())
+        self._task = asyncio.create_task(self._run())
+        print(f"Job worker {self.worker_id} started (concurrency={get_jobs_concurrency()})")
+
+    async def stop(self, timeout: float = 30) -> None:
+        """Stop claiming, give running jobs up to timeout to finish, then close the pool.
+
+        Jobs still running after that are cancelled; they stay 'running' and are
+        requeued by the next worker once JOBS_VISIBILITY_TIMEOUT passes.
+        """
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+        if self._inflight:
+            _, pending = await asyncio.wait(set(self._inflight), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+        await self.pool.close()
+        self.pool = None
+        print(f"Job worker {self.worker_id} stopped")
+
+    async def _run(self) -> None:
+        last_reap = 0.0
+        loop = asyncio.get_event_loop()
+        while not self._stopping.is_set():
+            claimed = []
+            want = 0
+            try:
+                if loop.time() - last_reap > _REAP_INTERVAL_SECONDS:
+                    async with self.pool.acquire(timeout=10) as conn:
+                        requeued = await jobs_repo.requeue_stale_jobs(conn, get_jobs_visibility_timeout())
+                    if requeued:
+                        print(f"Requeued {requeued} stale jobs")
+                    last_reap = loop.time()
+
+                want = min(get_jobs_concurrency() - len(self._inflight), get_jobs_batch_size())
+                if want > 0:
+                    async with self.pool.acquire(timeout=10) as conn:
+                        claimed = await jobs_repo.claim_jobs(conn, self.worker_id, want)
+                    for job in claimed:
+                        task = asyncio.create_task(self._execute(job))
+                        self._inflight.add(task)
+                        task.add_done_callback(self._inflight.discard)
+            except Exception as e:
+                print(f"Job worker loop error: {e}")
+
+            # A full batch means more may be waiting: claim again straight away if there's room.
+            if claimed and len(claimed) == want and len(self._inflight) < get_jobs_concurrency():
+                continue
+            stop_waiter = asyncio.create_task(self._stopping.wait())
+            await asyncio.wait(
+                {stop_waiter, *self._inflight},
+                timeout=get_jobs_poll_interval(),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            stop_waiter.cancel()
+
+    async def _execute(self, job: Mapping[str, Any]) -> None:
+        started = time.monotonic()
+        wait = (datetime.now(timezone.utc) - job["run_at"]).total_seconds()
+        ctx = JobContext(self.pool, job)
+        try:
+            handler = HANDLERS.get(job["kind"])
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{job['kind']}'")
+            await handler(ctx, job["payload"])
+            if not ctx.completed:
+                async with self.pool.acquire(timeout=10) as conn:
+                    await jobs_repo.complete_job(conn, job["id"])
+            self.processed += 1
+            self._observe(wait, time.monotonic() - started)
+        except Exception as e:
+            give_up = ctx.final_attempt
+            delay = None if give_up else retry_delay(job["attempts"])
+            print(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed: {e}")
+            if give_up:
+                self.failed += 1
+            else:
+                self.retried += 1
+            try:
+                async with self.pool.acquire(timeout=10) as conn:
+                    await jobs_repo.fail_job(conn, job["id"], repr(e)[:2000], delay)
+            except Exception as record_error:
+                print(f"Could not record failure of job {job['id']}: {record_error}")
+
+    def _observe(self, wait: float, run: float) -> None:
+        # Exponential moving averages; cheap and good enough for a health endpoint.
+        alpha = 0.1
+        self.avg_wait_seconds = wait if self.avg_wait_seconds is None else (1 - alpha) * self.avg_wait_seconds + alpha * wait
+        self.avg_run_seconds = run if self.avg_run_seconds is None else (1 - alpha) * self.avg_run_seconds + alpha * run
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "running": self.running,
+            "in_flight": len(self._inflight),
+            "concurrency": get_jobs_concurrency(),
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "avg_wait_seconds": self.avg_wait_seconds,
+            "avg_run_seconds": self.avg_run_seconds,
+        }
+
+
+JOB_WORKER = JobWorker()
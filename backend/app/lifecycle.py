@@ -0,0 +1,156 @@
+import asyncio
+import signal
+import threading
+import time
+from typing import Callable, List, Optional
+
+from starlette.datastructures import MutableHeaders
+
+from .core.config import get_shutdown_grace_seconds, get_shutdown_drain_delay
+
+
+class Lifecycle:
+    """Readiness, in-flight request tracking and graceful draining for one worker.
+
+    A restart goes: SIGTERM -> draining (readiness turns 503, live SSE streams end,
+    responses carry Connection: close) -> after SHUTDOWN_DRAIN_DELAY the server is
+    told to stop, so it stops accepting and waits for open requests -> the lifespan
+    shutdown waits out whatever is left (in-flight requests with their background
+    tasks, running jobs) and closes the pool. All of that fits in SHUTDOWN_GRACE_SECONDS
+    from the signal.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self._drain_started: Optional[float] = None
+        self._drain_hooks: List[Callable[[], None]] = []
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._previous_handler = None
+
+    def on_drain(self, callback: Callable[[], None]) -> None:
+        self._drain_hooks.append(callback)
+
+    def reset(self) -> None:
+        """Back to not-ready, not-draining (startup; matters when one process runs the app repeatedly)."""
+        self.ready = False
+        self.draining = False
+        self._drain_started = None
+        # A fresh Event for this run's loop: one that was waited on under an earlier loop can't be awaited here.
+        self._idle = asyncio.Event()
+        if self._in_flight == 0:
+            self._idle.set()
+
+    def begin_drain(self) -> None:
+        if self.draining:
+            return
+        self.draining = True
+        self.ready = False
+        self._drain_started = time.monotonic()
+        print(f"Draining: {self._in_flight} requests in flight")
+        for hook in self._drain_hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"Drain hook failed: {e}")
+
+    def remaining(self) -> float:
+        """Seconds left of the shutdown grace period (all of it if draining hasn't started)."""
+        if self._drain_started is None:
+            return get_shutdown_grace_seconds()
+        return max(0.0, get_shutdown_grace_seconds() - (time.monotonic() - self._drain_started))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def request_started(self) -> None:
+        self._in_flight += 1
+        self._idle.clear()
+
+    def request_finished(self) -> None:
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait up to timeout for in-flight requests to finish; False if some are still running."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            print(f"Shutdown grace period over with {self._in_flight} requests still in flight")
+            return False
+
+    def install_signal_handler(self) -> None:
+        """Put draining in front of the server's own SIGTERM handling.
+
+        The server's handler (uvicorn's, installed before the lifespan starts)
+        still runs, SHUTDOWN_DRAIN_DELAY later, so the proxy has stopped
+        routing here by the time the socket closes.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def forward(sig, frame):
+            if callable(previous):
+                previous(sig, frame)
+            else:
+                # No server handler to defer to: restore the default and let it act.
+                signal.signal(sig, previous)
+                signal.raise_signal(sig)
+
+        def handle(sig, frame):
+            # Signal handlers interrupt whatever the loop is doing; hand over to it instead.
+            loop.call_soon_threadsafe(self.begin_drain)
+            loop.call_soon_threadsafe(loop.call_later, get_shutdown_drain_delay(), forward, sig, frame)
+
+        signal.signal(signal.SIGTERM, handle)
+        self._previous_handler = previous
+
+    def uninstall_signal_handler(self) -> None:
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGTERM, self._previous_handler)
+            self._previous_handler = None
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "in_flight": self._in_flight,
+        }
+
+
+class InFlightMiddleware:
+    """Counts HTTP requests from first byte until the app returns, background tasks included.
+
+    While draining, responses are sent with Connection: close so keep-alive
+    clients (nginx's upstream connections) reconnect to another worker.
+    """
+
+    def __init__(self, app, lifecycle: Lifecycle):
+        self.app = app
+        self.lifecycle = lifecycle
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and self.lifecycle.draining:
+                MutableHeaders(scope=message)["connection"] = "close"
+            await send(message)
+
+        self.lifecycle.request_started()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.lifecycle.request_finished()
+
+
+LIFECYCLE = Lifecycle()
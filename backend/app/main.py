@@ -2,19 +2,45 @@ from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from .api.routes.notes import router as notes_router
-from .db import DB_POOL, db_conn, init_db_pool, close_db_pool, get_pool_status
+from .db import DB_POOL, db_conn, init_db_pool, warm_db_pool, close_db_pool, get_pool_status
 from .api.routes.auth import router as auth_router
+from .api.routes.attachments import router as attachments_router
+from .api.routes.feed import router as feed_router
+from .events import LISTENER, CHANGE_FEED, wait_background
+from .lifecycle import LIFECYCLE, InFlightMiddleware
+from .jobs import JOB_WORKER
+from .repos import jobs_repo
+from .core.config import get_jobs_in_process
+from .core.render import get_render_cache_stats
+from .core.note_cache import get_note_cache_stats
 from fastapi.responses import JSONResponse
 
 
+# Live SSE streams would otherwise hold the server open until the grace period runs out.
+LIFECYCLE.on_drain(CHANGE_FEED.close_all)
+
 # Lifespan shutdown / startup context manager. FastAPI instance calls this on start up and shutdown.
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    LIFECYCLE.reset()
     await init_db_pool()
+    await warm_db_pool()
+    await LISTENER.start()
+    if get_jobs_in_process():
+        await JOB_WORKER.start()
+    LIFECYCLE.install_signal_handler()
+    LIFECYCLE.ready = True
     try:
         yield
     finally:
-        await close_db_pool()
+        # Already underway if this is a SIGTERM; everything below shares what's left of the grace period.
+        LIFECYCLE.begin_drain()
+        await LIFECYCLE.wait_idle(LIFECYCLE.remaining())
+        await JOB_WORKER.stop(timeout=LIFECYCLE.remaining())
+        await wait_background(LIFECYCLE.remaining())
+        await LISTENER.stop()
+        await close_db_pool(timeout=max(LIFECYCLE.remaining(), 1))
+        LIFECYCLE.uninstall_signal_handler()
 
 # Create fastapi instance and assign to app variable.
 app = FastAPI(lifespan=lifespan)
@@ -33,11 +59,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
+    expose_headers=["X-Total-Count", "X-Content-Bytes"],
 )
 
+# Outermost, so it sees every request from start to finish.
+app.add_middleware(InFlightMiddleware, lifecycle=LIFECYCLE)
+
 # mount the auth_router and notes_router (which contain many routes) onto the main FastAPI application.
 app.include_router(auth_router) 
+app.include_router(feed_router, prefix="/notes", tags=["notes"])
 app.include_router(notes_router, prefix="/notes", tags=["notes"])
+app.include_router(attachments_router, prefix="/notes", tags=["attachments"])
 
 @app.get("/")
 async def root():
@@ -48,6 +80,18 @@ async def root():
 async def health():
     return {"ok": True}
 
+# Liveness: the event loop is answering. Stays 200 while draining, so the worker isn't killed mid-drain.
+@app.get("/health/live", tags=["health"])
+async def health_live():
+    return {"ok": True}
+
+# Readiness: route traffic here only once the pool is warm, and not while draining.
+@app.get("/health/ready", tags=["health"])
+async def health_ready():
+    ready = LIFECYCLE.ready and not LIFECYCLE.draining
+    code = status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse({**LIFECYCLE.stats(), "pool": get_pool_status()}, status_code=code)
+
 # db health check.
 @app.get("/health/db", tags=["health"])
 async def health_db():
@@ -66,3 +110,21 @@ async def health_db():
 async def health_db_pool():
     pool_status = get_pool_status()
     return pool_status
+
+@app.get("/health/render-cache", tags=["health"])
+async def health_render_cache():
+    return get_render_cache_stats()
+
+@app.get("/health/note-cache", tags=["health"])
+async def health_note_cache():
+    return get_note_cache_stats()
+
+@app.get("/health/feed", tags=["health"])
+async def health_feed():
+    return CHANGE_FEED.stats()
+
+@app.get("/health/jobs", tags=["health"])
+async def health_jobs():
+    async with db_conn() as conn:
+        queue = await jobs_repo.get_queue_stats(conn)
+    return {"queue": queue, "worker": JOB_WORKER.stats()}
@@ -0,0 +1,148 @@
+"""Periodic maintenance tasks, run from cron or by hand:
+
+    python -m app.maintenance compact-revisions
+    python -m app.maintenance gc-attachments
+    python -m app.maintenance train-note-dictionary
+    python -m app.maintenance compress-notes
+    python -m app.maintenance decompress-notes
+    python -m app.maintenance resume-deletions
+
+Each is also registered as a job kind (see app/jobs/handlers.py), so it can be
+queued instead: python -m app.jobs enqueue compact_revisions
+"""
+import argparse
+import asyncio
+
+from .db import db_conn, init_db_pool, close_db_pool
+from .core import compression
+from .core.config import get_note_compress_min_bytes, get_note_dict_max_bytes
+from .repos import revisions_repo, attachments_repo, compression_repo, deletions_repo, jobs_repo
+
+# Thin out old note revisions, one note per transaction so no lock is held for long.
+async def compact_revisions(batch_size: int = 500, acquire=db_conn) -> int:
+    deleted = 0
+    last_note_id = 0
+    while True:
+        async with acquire(timeout=10) as conn:
+            note_ids = await revisions_repo.list_notes_with_old_revisions(
+                conn, after_note_id=last_note_id, limit=batch_size
+            )
+        if not note_ids:
+            break
+        for note_id in note_ids:
+            async with acquire(timeout=10) as conn:
+                deleted += await revisions_repo.compact_revisions_for_note(conn, note_id)
+        last_note_id = note_ids[-1]
+    print(f"Revision compaction removed {deleted} revisions")
+    return deleted
+
+async def _decode_bodies(conn, rows):
+    missing = compression.missing_dictionaries(row["content_dict_id"] for row in rows)
+    if missing:
+        await compression_repo.load_dictionaries(conn, missing)
+    return [compression.decode_row(row)["content"] for row in rows]
+
+# Train a zstd dictionary on a sample of mid-sized note bodies. Running workers
+# load it on commit and compress new writes with it; older frames keep theirs.
+async def train_note_dictionary(samples: int = 5000, dict_bytes: int = 112_640, acquire=db_conn):
+    async with acquire(timeout=10) as conn:
+        async with conn.transaction():
+            rows = await compression_repo.sample_note_bodies(
+                conn, min_bytes=get_note_compress_min_bytes(), max_bytes=get_note_dict_max_bytes(), limit=samples
+            )
+            bodies = [body.encode() for body in await _decode_bodies(conn, rows)]
+    # zstd needs a fair amount of material; a handful of notes would make a useless dictionary.
+    if len(bodies) < 100:
+        print(f"Only {len(bodies)} notes to learn from; not training a dictionary")
+        return None
+    loop = asyncio.get_event_loop()
+    data = await loop.run_in_executor(None, compression.train_dictionary, bodies, dict_bytes)
+    async with acquire(timeout=10) as conn:
+        async with conn.transaction():
+            dict_id = await compression_repo.save_dictionary(conn, data, len(bodies))
+    compression.register_dictionary(dict_id, data)
+    print(f"Trained note dictionary {dict_id} ({len(data)} bytes) on {len(bodies)} notes")
+    return dict_id
+
+# Compress plain-text notes written before compression (or before a dictionary existed), a batch per transaction.
+async def compress_notes(batch_size: int = 200, acquire=db_conn) -> int:
+    async with acquire(timeout=10) as conn:
+        await compression_repo.load_dictionaries(conn)
+    compressed = 0
+    last_id = 0
+    while True:
+        async with acquire(timeout=10) as conn:
+            async with conn.transaction():
+                rows = await compression_repo.list_uncompressed_notes(
+                    conn, after_id=last_id, min_bytes=get_note_compress_min_bytes(), limit=batch_size
+                )
+                for row in rows:
+                    _, frame, dict_id, size = compression.encode(row["content"])
+                    # Notes edited since they were read are skipped; the edit stored them compressed already.
+                    if frame is not None and await compression_repo.store_body(
+                        conn, row["id"], row["user_id"], None, frame, dict_id, size, read_at_updated=row["updated_at"]
+                    ):
+                        compressed += 1
+        if len(rows) < batch_size:
+            break
+        last_id = rows[-1]["id"]
+    print(f"Compressed {compressed} notes")
+    return compressed
+
+# Store every compressed note as plain text again (needed before downgrading past the compression migration).
+async def decompress_notes(batch_size: int = 200, acquire=db_conn) -> int:
+    restored = 0
+    last_id = 0
+    while True:
+        async with acquire(timeout=10) as conn:
+            async with conn.transaction():
+                rows = await compression_repo.list_compressed_notes(conn, after_id=last_id, limit=batch_size)
+                for row, content in zip(rows, await _decode_bodies(conn, rows)):
+                    if await compression_repo.store_body(
+                        conn, row["id"], row["user_id"], content, None, None, None, read_at_updated=row["updated_at"]
+                    ):
+                        restored += 1
+        if len(rows) < batch_size:
+            break
+        last_id = rows[-1]["id"]
+    print(f"Decompressed {restored} notes")
+    return restored
+
+# Queue a purge again for every unfinished account deletion whose job gave up (or whose worker was lost).
+async def resume_deletions(batch_size: int = 100, acquire=db_conn) -> int:
+    resumed = 0
+    while True:
+        async with acquire(timeout=10) as conn:
+            async with conn.transaction():
+                stalled = await deletions_repo.lock_stalled_deletions(conn, batch_size)
+                for deletion in stalled:
+                    await jobs_repo.enqueue_job(
+                        conn, "purge_account", {"deletion_id": str(deletion["id"]), "user_id": str(deletion["user_id"])}
+                    )
+        resumed += len(stalled)
+        if len(stalled) < batch_size:
+            break
+    print(f"Resumed {resumed} account deletions")
+    return resumed
+
+TASKS = {
+    "compact-revisions": compact_revisions,
+    "gc-attachments": attachments_repo.collect_orphan_attachments,
+    "train-note-dictionary": train_note_dictionary,
+    "compress-notes": compress_notes,
+    "decompress-notes": decompress_notes,
+    "resume-deletions": resume_deletions,
+}
+
+async def _run(task_name: str):
+    await init_db_pool()
+    try:
+        await TASKS[task_name](acquire=db_conn)
+    finally:
+        await close_db_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a scriobh maintenance task.")
+    parser.add_argument("task", choices=sorted(TASKS))
+    args = parser.parse_args()
+    asyncio.run(_run(args.task))
@@ -0,0 +1,164 @@
+import asyncio
+from typing import Any, Mapping, Optional, Sequence
+from asyncpg import Connection
+from uuid import UUID
+
+from app.core import blob_store
+
+# Uploads hold this lock shared while linking a blob; garbage collection takes it
+# exclusively, so a blob can't be collected between being written and referenced.
+_GC_LOCK_SHARED = "SELECT pg_advisory_xact_lock_shared(hashtext('attachment_blobs'), 0)"
+_GC_LOCK_EXCLUSIVE = "SELECT pg_advisory_xact_lock(hashtext('attachment_blobs'), 0)"
+
+_ATTACHMENT_COLUMNS = "a.id, a.note_id, a.filename, a.content_type, a.sha256, b.size, a.created_at"
+
+# CHECK NOTE OWNERSHIP (and keep the note from being deleted until the transaction ends)
+async def lock_note_for_attach(conn: Connection, note_id: int, user_id: UUID) -> bool:
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            found = await conn.fetchval(
+                "SELECT 1 FROM notes WHERE id = $1 AND user_id = $2 FOR KEY SHARE",
+                note_id, user_id,
+            )
+            if found:
+                await conn.execute(_GC_LOCK_SHARED)
+            return bool(found)
+    except Exception as e:
+        print(f"lock_note_for_attach failed: {e}")
+        return False
+
+# ADD ATTACHMENT (call inside the transaction that called lock_note_for_attach)
+async def add_attachment(
+    conn: Connection,
+    note_id: int,
+    user_id: UUID,
+    sha256: str,
+    size: int,
+    filename: str,
+    content_type: str,
+) -> Optional[Mapping[str, Any]]:
+    try:
+        await conn.execute(
+            "INSERT INTO attachment_blobs (sha256, size) VALUES ($1, $2) ON CONFLICT (sha256) DO NOTHING",
+            sha256, size,
+        )
+        return await conn.fetchrow(
+            f"""
+            WITH a AS (
+                INSERT INTO note_attachments (note_id, user_id, sha256, filename, content_type)
+                VALUES ($1, $2, $3, $4, $5)
+                RETURNING id, note_id, sha256, filename, content_type, created_at
+            )
+            SELECT {_ATTACHMENT_COLUMNS}
+            FROM a JOIN attachment_blobs b ON b.sha256 = a.sha256
+            """,
+            note_id, user_id, sha256, filename, content_type,
+        )
+    except Exception as e:
+        print(f"add_attachment failed: {e}")
+        return None
+
+# LIST ATTACHMENTS OF A NOTE
+async def list_attachments_for_note(conn: Connection, note_id: int, user_id: UUID) -> Sequence[Mapping[str, Any]]:
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            return await conn.fetch(
+                f"""
+                SELECT {_ATTACHMENT_COLUMNS}
+                FROM note_attachments a JOIN attachment_blobs b ON b.sha256 = a.sha256
+                WHERE a.note_id = $1 AND a.user_id = $2
+                ORDER BY a.id
+                """,
+                note_id, user_id,
+            )
+    except Exception as e:
+        print(f"list_attachments_for_note failed: {e}")
+        return []
+
+# GET SINGLE ATTACHMENT
+async def get_attachment_for_user(
+    conn: Connection, attachment_id: int, note_id: int, user_id: UUID
+) -> Optional[Mapping[str, Any]]:
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            return await conn.fetchrow(
+                f"""
+                SELECT {_ATTACHMENT_COLUMNS}
+                FROM note_attachments a JOIN attachment_blobs b ON b.sha256 = a.sha256
+                WHERE a.id = $1 AND a.note_id = $2 AND a.user_id = $3
+                """,
+                attachment_id, note_id, user_id,
+            )
+    except Exception as e:
+        print(f"get_attachment_for_user failed: {e}")
+        return None
+
+# DELETE SINGLE ATTACHMENT (returns the blob hash so it can be collected if now unreferenced)
+async def delete_attachment_for_user(
+    conn: Connection, attachment_id: int, note_id: int, user_id: UUID
+) -> Optional[str]:
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            return await conn.fetchval(
+                "DELETE FROM note_attachments WHERE id = $1 AND note_id = $2 AND user_id = $3 RETURNING sha256",
+                attachment_id, note_id, user_id,
+            )
+    except Exception as e:
+        print(f"delete_attachment_for_user failed: {e}")
+        return None
+
+# DETACH EVERYTHING FROM A NOTE (before deleting it, so its blobs can be collected)
+async def detach_all_for_note(conn: Connection, note_id: int, user_id: UUID) -> Sequence[str]:
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            rows = await conn.fetch(
+                "DELETE FROM note_attachments WHERE note_id = $1 AND user_id = $2 RETURNING sha256",
+                note_id, user_id,
+            )
+            return list({r["sha256"] for r in rows})
+    except Exception as e:
+        print(f"detach_all_for_note failed: {e}")
+        return []
+
+# DELETE UNREFERENCED BLOB ROWS (call inside a transaction; remove the files before committing)
+async def delete_orphan_blobs(conn: Connection, sha256s: Optional[Sequence[str]] = None, *, limit: int = 1000) -> Sequence[str]:
+    """Delete blob rows no attachment points at. Restricted to sha256s when given, else a full sweep."""
+    await conn.execute(_GC_LOCK_EXCLUSIVE)
+    rows = await conn.fetch(
+        """
+        DELETE FROM attachment_blobs
+        WHERE sha256 IN (
+            SELECT b.sha256 FROM attachment_blobs b
+            WHERE ($1::text[] IS NULL OR b.sha256 = ANY($1::text[]))
+              AND NOT EXISTS (SELECT 1 FROM note_attachments a WHERE a.sha256 = b.sha256)
+            LIMIT $2
+        )
+        RETURNING sha256
+        """,
+        list(sha256s) if sha256s is not None else None, limit,
+    )
+    return [r["sha256"] for r in rows]
+
+# COLLECT ORPHANED BLOBS, rows and files, a batch per transaction (acquire: app.db.db_conn or a job's ctx.acquire).
+# With sha256s, only those candidates are checked; without, it is a full sweep that also clears stale uploads.
+async def collect_orphan_attachments(sha256s: Optional[Sequence[str]] = None, *, acquire, batch_size: int = 1000) -> int:
+    removed = 0
+    while True:
+        async with acquire(timeout=10) as conn:
+            async with conn.transaction():
+                orphans = await delete_orphan_blobs(conn, sha256s, limit=batch_size)
+                # Unlink while the GC lock is still held, so no upload can re-reference them meanwhile.
+                await blob_store.remove_blobs(orphans)
+        removed += len(orphans)
+        if sha256s is not None or len(orphans) < batch_size:
+            break
+    if sha256s is None:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, blob_store.remove_stale_temp)
+    print(f"Attachment GC removed {removed} blobs")
+    return removed
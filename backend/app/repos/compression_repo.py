@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import Any, Iterable, Mapping, Optional, Sequence
+from uuid import UUID
+from asyncpg import Connection
+
+from app.core import compression
+
+# LOAD TRAINED DICTIONARIES (the newest one if no ids are given) into app.core.compression
+async def load_dictionaries(conn: Connection, dict_ids: Optional[Iterable[int]] = None) -> None:
+    if dict_ids is None:
+        rows = await conn.fetch("SELECT id, data FROM note_dictionaries ORDER BY id DESC LIMIT 1")
+    else:
+        rows = await conn.fetch("SELECT id, data FROM note_dictionaries WHERE id = ANY($1::int[])", list(dict_ids))
+    for row in rows:
+        compression.register_dictionary(row["id"], row["data"])
+
+# SAVE A NEWLY TRAINED DICTIONARY (running workers load it when this commits; see app/events.py)
+async def save_dictionary(conn: Connection, data: bytes, sample_count: int) -> int:
+    dict_id = await conn.fetchval(
+        "INSERT INTO note_dictionaries (data, sample_count) VALUES ($1, $2) RETURNING id",
+        data, sample_count,
+    )
+    await conn.execute("SELECT pg_notify('note_dictionaries', $1)", str(dict_id))
+    return dict_id
+
+# SAMPLE NOTE BODIES BETWEEN min_bytes AND max_bytes (dictionary training input)
+async def sample_note_bodies(conn: Connection, *, min_bytes: int, max_bytes: int, limit: int) -> Sequence[Mapping[str, Any]]:
+    async with conn.transaction():
+        await conn.execute("SET LOCAL statement_timeout = 0")
+        # Bernoulli sampling reads the table once instead of sorting all of it by random().
+        total = await conn.fetchval("SELECT greatest(sum(reltuples), 1) FROM pg_class WHERE relname ~ '^notes_p[0-9]+$'")
+        percent = min(100.0, 100.0 * limit * 4 / total)
+        return await conn.fetch(
+            """
+            SELECT content, content_zstd, content_dict_id
+            FROM notes TABLESAMPLE BERNOULLI ($1)
+            WHERE coalesce(octet_length(content), content_size) BETWEEN $2 AND $3
+            LIMIT $4
+            """,
+            percent, min_bytes, max_bytes, limit,
+        )
+
+# PLAIN-TEXT NOTES OF AT LEAST min_bytes, IN ID ORDER (compression backfill)
+async def list_uncompressed_notes(conn: Connection, *, after_id: int, min_bytes: int, limit: int) -> Sequence[Mapping[str, Any]]:
+    async with conn.transaction():
+        await conn.execute("SET LOCAL statement_timeout = 30000")
+        return await conn.fetch(
+            """
+            SELECT id, user_id, updated_at, content
+            FROM notes
+            WHERE id > $1 AND content IS NOT NULL AND octet_length(content) >= $2
+            ORDER BY id
+            LIMIT $3
+            """,
+            after_id, min_bytes, limit,
+        )
+
+# COMPRESSED NOTES, IN ID ORDER (undoing the backfill)
+async def list_compressed_notes(conn: Connection, *, after_id: int, limit: int) -> Sequence[Mapping[str, Any]]:
+    async with conn.transaction():
+        await conn.execute("SET LOCAL statement_timeout = 30000")
+        return await conn.fetch(
+            """
+            SELECT id, user_id, updated_at, content_zstd, content_dict_id
+            FROM notes
+            WHERE id > $1 AND content_zstd IS NOT NULL
+            ORDER BY id
+            LIMIT $2
+            """,
+            after_id, limit,
+        )
+
+# REWRITE HOW ONE NOTE'S BODY IS STORED (same text; not an edit, so updated_at stays)
+async def store_body(
+    conn: Connection,
+    note_id: int,
+    user_id: UUID,
+    content: Optional[str],
+    content_zstd: Optional[bytes],
+    content_dict_id: Optional[int],
+    content_size: Optional[int],
+    *,
+    read_at_updated: datetime,
+) -> bool:
+    """Returns False, changing nothing, if the note was edited or deleted since it was read."""
+    async with conn.transaction():
+        await conn.execute("SET LOCAL statement_timeout = 10000")
+        result = await conn.execute(
+            """
+            UPDATE notes
+            SET content = $3, content_zstd = $4, content_dict_id = $5, content_size = $6
+            WHERE id = $1 AND user_id = $2 AND updated_at = $7
+            """,
+            note_id, user_id, content, content_zstd, content_dict_id, content_size, read_at_updated,
+        )
+        return result.strip().upper().startswith("UPDATE 1")
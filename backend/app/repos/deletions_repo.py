@@ -0,0 +1,117 @@
+from typing import Any, Mapping, Optional, Sequence, Tuple
+from uuid import UUID
+from asyncpg import Connection
+
+# Like jobs_repo, these let errors propagate: a purge batch that silently "deleted
+# nothing" would look like a finished purge.
+
+_DELETION_COLUMNS = "id, status, notes_total, notes_deleted, requested_at, finished_at"
+
+# START AN ACCOUNT DELETION (in the same transaction as users_repo.disable_user)
+async def create_deletion(conn: Connection, user_id: UUID) -> Mapping[str, Any]:
+    return await conn.fetchrow(
+        f"""
+        INSERT INTO account_deletions (user_id, notes_total)
+        SELECT $1, coalesce((SELECT note_count FROM user_note_stats WHERE user_id = $1), 0)
+        RETURNING {_DELETION_COLUMNS}
+        """,
+        user_id,
+    )
+
+# GET DELETION PROGRESS
+async def get_deletion(conn: Connection, deletion_id: UUID) -> Optional[Mapping[str, Any]]:
+    return await conn.fetchrow(
+        f"SELECT {_DELETION_COLUMNS} FROM account_deletions WHERE id = $1",
+        deletion_id,
+    )
+
+# PURGE ONE BATCH OF A USER'S NOTES (returns how many went, and attachment blobs that may now be orphaned)
+async def purge_notes_batch(conn: Connection, user_id: UUID, limit: int) -> Tuple[int, Sequence[str]]:
+    async with conn.transaction():
+        await conn.execute("SET LOCAL statement_timeout = 10000")
+        # Fail fast rather than queue behind someone else's lock; the job just retries.
+        await conn.execute("SET LOCAL lock_timeout = 2000")
+        row = await conn.fetchrow(
+            """
+            WITH doomed AS (
+                SELECT id FROM notes WHERE user_id = $1 LIMIT $2
+            ), detached AS (
+                DELETE FROM note_attachments a
+                USING doomed d
+                WHERE a.user_id = $1 AND a.note_id = d.id
+                RETURNING a.sha256
+            ), gone AS (
+                DELETE FROM notes n
+                USING doomed d
+                WHERE n.user_id = $1 AND n.id = d.id
+                RETURNING n.id
+            )
+            SELECT (SELECT count(*) FROM gone) AS deleted,
+                   ARRAY(SELECT DISTINCT sha256 FROM detached) AS sha256s
+            """,
+            user_id, limit,
+        )
+        return row["deleted"], list(row["sha256s"])
+
+# RECORD PROGRESS
+async def record_progress(conn: Connection, deletion_id: UUID, deleted: int) -> None:
+    await conn.execute(
+        "UPDATE account_deletions SET status = 'running', notes_deleted = notes_deleted + $2 WHERE id = $1",
+        deletion_id, deleted,
+    )
+
+# FINISH: drop the (by now empty) user row and mark the deletion done
+async def finish_deletion(conn: Connection, deletion_id: UUID, user_id: UUID) -> bool:
+    """Returns False, changing nothing, if the user still has notes left to purge."""
+    result = await conn.execute(
+        """
+        DELETE FROM users
+        WHERE id = $1 AND disabled_at IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM notes WHERE user_id = $1)
+        """,
+        user_id,
+    )
+    if not result.strip().upper().startswith("DELETE 1"):
+        return False
+    await conn.execute(
+        "UPDATE account_deletions SET status = 'done', finished_at = now() WHERE id = $1",
+        deletion_id,
+    )
+    return True
+
+# MARK A DELETION FAILED (its purge job gave up; resume-deletions queues it again)
+async def fail_deletion(conn: Connection, deletion_id: UUID) -> None:
+    await conn.execute(
+        "UPDATE account_deletions SET status = 'failed' WHERE id = $1 AND status <> 'done'",
+        deletion_id,
+    )
+
+# UNFINISHED DELETIONS WITH NO PURGE JOB QUEUED OR RUNNING (locked until the caller's transaction ends)
+async def lock_stalled_deletions(conn: Connection, limit: int) -> Sequence[Mapping[str, Any]]:
+    return await conn.fetch(
+        """
+        SELECT d.id, d.user_id
+        FROM account_deletions d
+        WHERE d.status <> 'done'
+          AND NOT EXISTS (
+              SELECT 1 FROM jobs j
+              WHERE j.kind = 'purge_account' AND j.status IN ('queued', 'running')
+                AND j.payload->>'deletion_id' = d.id::text
+          )
+        ORDER BY d.requested_at
+        LIMIT $1
+        FOR UPDATE OF d SKIP LOCKED
+        """,
+        limit,
+    )
+
+# USERS DISABLED WITHIN THE LAST window_seconds (whose tokens may still be unexpired)
+async def list_recent_deletions(conn: Connection, window_seconds: int) -> Sequence[Mapping[str, Any]]:
+    return await conn.fetch(
+        """
+        SELECT user_id, requested_at
+        FROM account_deletions
+        WHERE requested_at > now() - make_interval(secs => $1)
+        """,
+        window_seconds,
+    )
@@ -0,0 +1,100 @@
+import json
+from typing import Any, Mapping, Optional, Sequence
+from asyncpg import Connection
+
+# Unlike the other repos these let errors propagate: a job that silently fails to
+# enqueue, or a claim that silently returns nothing, would lose work.
+
+# ENQUEUE JOB (call inside the caller's transaction to make the job part of the same write)
+async def enqueue_job(
+    conn: Connection,
+    kind: str,
+    payload: Optional[Mapping[str, Any]] = None,
+    *,
+    delay_seconds: float = 0,
+    max_attempts: int = 5,
+) -> int:
+    return await conn.fetchval(
+        """
+        INSERT INTO jobs (kind, payload, run_at, max_attempts)
+        VALUES ($1, $2::jsonb, now() + make_interval(secs => $3), $4)
+        RETURNING id
+        """,
+        kind, json.dumps(payload or {}), delay_seconds, max_attempts,
+    )
+
+# CLAIM A BATCH OF READY JOBS (concurrent workers skip each other's rows instead of blocking)
+async def claim_jobs(conn: Connection, worker_id: str, limit: int) -> Sequence[Mapping[str, Any]]:
+    # MATERIALIZED: as a plain IN (subquery) the planner may run the pick more than once
+    # (e.g. as the inner side of a join), and with SKIP LOCKED each run can return different
+    # rows, so a claim could take more than `limit` jobs.
+    rows = await conn.fetch(
+        """
+        WITH picked AS MATERIALIZED (
+            SELECT id FROM jobs
+            WHERE status = 'queued' AND run_at <= now()
+            ORDER BY run_at
+            LIMIT $2
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE jobs
+        SET status = 'running', locked_at = now(), locked_by = $1, attempts = attempts + 1
+        FROM picked
+        WHERE jobs.id = picked.id
+        RETURNING jobs.id, kind, payload, attempts, max_attempts, run_at, locked_at
+        """,
+        worker_id, limit,
+    )
+    return [{**dict(r), "payload": json.loads(r["payload"])} for r in rows]
+
+# COMPLETE JOB
+async def complete_job(conn: Connection, job_id: int) -> bool:
+    result = await conn.execute("DELETE FROM jobs WHERE id = $1", job_id)
+    return result.strip().upper().startswith("DELETE 1")
+
+# FAIL JOB (retry after a delay, or give up when retry_in_seconds is None)
+async def fail_job(conn: Connection, job_id: int, error: str, retry_in_seconds: Optional[float]) -> None:
+    if retry_in_seconds is None:
+        await conn.execute(
+            "UPDATE jobs SET status = 'failed', locked_at = NULL, locked_by = NULL, last_error = $2 WHERE id = $1",
+            job_id, error,
+        )
+    else:
+        await conn.execute(
+            """
+            UPDATE jobs
+            SET status = 'queued', locked_at = NULL, locked_by = NULL, last_error = $2,
+                run_at = now() + make_interval(secs => $3)
+            WHERE id = $1
+            """,
+            job_id, error, retry_in_seconds,
+        )
+
+# REQUEUE JOBS WHOSE WORKER DISAPPEARED
+async def requeue_stale_jobs(conn: Connection, visibility_timeout_seconds: float) -> int:
+    result = await conn.execute(
+        """
+        UPDATE jobs
+        SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+            locked_at = NULL, locked_by = NULL, last_error = 'worker lost'
+        WHERE status = 'running' AND locked_at < now() - make_interval(secs => $1)
+        """,
+        visibility_timeout_seconds,
+    )
+    return int(result.split()[-1])
+
+# QUEUE DEPTH / AGE
+async def get_queue_stats(conn: Connection) -> Mapping[str, Any]:
+    row = await conn.fetchrow(
+        """
+        SELECT
+            count(*) FILTER (WHERE status = 'queued' AND run_at <= now()) AS ready,
+            count(*) FILTER (WHERE status = 'queued' AND run_at > now()) AS scheduled,
+            count(*) FILTER (WHERE status = 'running') AS running,
+            count(*) FILTER (WHERE status = 'failed') AS failed,
+            extract(epoch FROM now() - min(run_at) FILTER (WHERE status = 'queued' AND run_at <= now()))::float8
+                AS oldest_ready_age_seconds
+        FROM jobs
+        """
+    )
+    return dict(row)
@@ -1,71 +1,320 @@
+import asyncio
+import json
+import re
 from typing import Any, Mapping, Sequence, Optional
 from asyncpg import Connection
 from uuid import UUID
 
-# LIST NOTES
+from app.core import note_cache, compression
+from app.core.config import get_max_notes_per_user, get_max_content_bytes_per_user
+from app.repos import compression_repo
+
+
+class QuotaExceededError(Exception):
+    """Raised when a write would take a user past their note count or storage quota."""
+
+# Tell other workers (and devices) about a write; delivered when the transaction commits.
+async def _notify_change(conn: Connection, user_id: UUID, note_id: int, op: str) -> None:
+    payload = json.dumps({"user_id": str(user_id), "note_id": note_id, "op": op})
+    await conn.execute("SELECT pg_notify('note_changes', $1)", payload)
+
+# The body columns a read needs; compression.decode_row turns them back into `content`.
+_BODY_COLUMNS = "content, content_zstd, content_dict_id"
+
+def _decode_batch(rows: Sequence[Mapping[str, Any]], pattern: Optional[re.Pattern]) -> list:
+    notes = [compression.decode_row(row) for row in rows]
+    if pattern is not None:
+        notes = [note for note in notes if pattern.fullmatch(note["content"])]
+    return notes
+
+async def _decode_rows(conn: Connection, rows: Sequence[Mapping[str, Any]], pattern: Optional[re.Pattern] = None) -> list:
+    """The rows as dicts with plain `content`; given a like_pattern, only those whose body matches it."""
+    missing = compression.missing_dictionaries(row["content_dict_id"] for row in rows)
+    if missing:
+        # A dictionary trained (by another process) since this one loaded its own.
+        await compression_repo.load_dictionaries(conn, missing)
+    if not any(row["content_zstd"] is not None for row in rows):
+        return _decode_batch(rows, pattern)
+    # Decompressing (a long note, or a page of them) is CPU work; keep it off the event loop.
+    return await asyncio.get_running_loop().run_in_executor(None, _decode_batch, rows, pattern)
+
+# Supported list orderings; each has an idx_notes_user_pinned_<sort> index.
+SORT_COLUMNS = {"updated": "updated_at", "created": "created_at", "title": "title"}
+
+# Most candidate rows a body search fetches in one go.
+_SEARCH_CHUNK_MAX = 1000
+
+# LIST NOTES (pinned first, then by the chosen sort)
 async def list_notes_by_user(
     conn: Connection,
     user_id: UUID,
     search: Optional[str] = None,
     *,
     limit: int,
-    offset: int
+    offset: int,
+    tags: Optional[Sequence[str]] = None,
+    match_all_tags: bool = False,
+    sort: str = "updated",
+    descending: bool = True,
 ) -> Sequence[Mapping[str, Any]]:
+    column = SORT_COLUMNS[sort]
+    direction = "DESC" if descending else "ASC"
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            conditions = ["user_id = $1"]
+            args: list = [user_id]
+            if search:
+                args.append(f"%{search}%")
+                # Compressed bodies are opaque to ILIKE: they come back as candidates and
+                # are decompressed and matched below, unless the title already matched.
+                conditions.append(f"(title ILIKE ${len(args)} OR content ILIKE ${len(args)} OR content_zstd IS NOT NULL)")
+                matched = f", (title ILIKE ${len(args)} OR content ILIKE ${len(args)}) AS matched"
+            else:
+                matched = ""
+            if tags:
+                # && (overlap) and @> (contains) are both served by idx_notes_user_tags.
+                args.append(list(tags))
+                conditions.append(f"tags {'@>' if match_all_tags else '&&'} ${len(args)}::text[]")
+            where = " AND ".join(conditions)
+            order = f"{column} {direction}, id {direction}"
+            if not search:
+                args.extend([limit, offset])
+                # Pinned and unpinned notes are fetched as two runs, each an ordered walk of
+                # (user_id, pinned, <column>, id) that stops after limit + offset rows; only
+                # those few rows are merged, never the whole notebook.
+                branch = f"""
+                    (SELECT id, title, {_BODY_COLUMNS}, tags, pinned, user_id, created_at, updated_at
+                     FROM notes
+                     WHERE {where} AND pinned = {{pinned}}
+                     ORDER BY {order}
+                     LIMIT ${len(args) - 1}::bigint + ${len(args)}::bigint)
+                """
+                query = f"""
+                    {branch.format(pinned="true")}
+                    UNION ALL
+                    {branch.format(pinned="false")}
+                    ORDER BY pinned DESC, {order}
+                    LIMIT ${len(args) - 1} OFFSET ${len(args)}
+                """
+                return await _decode_rows(conn, await conn.fetch(query, *args))
+
+            # How many candidates turn out to match isn't known up front, so the same two
+            # runs are walked a chunk at a time until the page is full: each chunk picks up
+            # after the last (<column>, id) seen, so no index entry is read twice. Only
+            # compressed bodies whose title didn't match are decompressed, a chunk at a time.
+            pattern = compression.like_pattern(f"%{search}%")
+            wanted = limit + offset
+            hits = []
+            for pinned in ("true", "false"):
+                after = None
+                chunk = wanted
+                while len(hits) < wanted:
+                    walk_args = list(args)
+                    keyset = ""
+                    if after is not None:
+                        walk_args.extend(after)
+                        keyset = f"AND ({column}, id) {'<' if descending else '>'} (${len(walk_args) - 1}, ${len(walk_args)})"
+                    walk_args.append(chunk)
+                    rows = await conn.fetch(
+                        f"""
+                        SELECT id, title, {_BODY_COLUMNS}, tags, pinned, user_id, created_at, updated_at{matched}
+                        FROM notes
+                        WHERE {where} AND pinned = {pinned} {keyset}
+                        ORDER BY {order}
+                        LIMIT ${len(walk_args)}
+                        """,
+                        *walk_args,
+                    )
+                    found = {
+                        note["id"]: note
+                        for note in await _decode_rows(conn, [row for row in rows if not row["matched"]], pattern)
+                    }
+                    for row in rows:
+                        if row["matched"]:
+                            hits.append(row)
+                        elif row["id"] in found:
+                            hits.append(found[row["id"]])
+                    if len(rows) < chunk:
+                        break
+                    after = (rows[-1][column], rows[-1]["id"])
+                    # Still short of a page: take bigger steps, within reason.
+                    chunk = min(chunk * 2, _SEARCH_CHUNK_MAX)
+            page = hits[offset:offset + limit]
+            decoded = iter(await _decode_rows(conn, [hit for hit in page if not isinstance(hit, dict)]))
+            notes = [hit if isinstance(hit, dict) else next(decoded) for hit in page]
+            for note in notes:
+                note.pop("matched", None)
+            return notes
+    except Exception as e:
+        print(f"list_notes_by_user failed: {e}")
+        return []
+
+# LIST TAGS WITH COUNTS
+async def list_tags_for_user(conn: Connection, user_id: UUID) -> Sequence[Mapping[str, Any]]:
     try:
-        await conn.execute("SET LOCAL statement_timeout = 10000")
-        if search:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            # Maintained by the notes_track_user_tags trigger: one row per tag, however many notes.
             return await conn.fetch(
                 """
-                SELECT id, title, content, user_id, created_at, updated_at
-                FROM notes
-                WHERE user_id = $1 AND (title ILIKE $2 OR content ILIKE $2)
-                ORDER BY updated_at DESC
-                LIMIT $3 OFFSET $4
+                SELECT tag, note_count AS count
+                FROM user_tag_counts
+                WHERE user_id = $1
+                ORDER BY note_count DESC, tag
                 """,
-                user_id, f"%{search}%", limit, offset
+                user_id,
             )
-        return await conn.fetch(
-            """
-            SELECT id, title, content, user_id, created_at, updated_at
-            FROM notes
-            WHERE user_id = $1
-            ORDER BY updated_at DESC
-            LIMIT $2 OFFSET $3
-            """,
-            user_id, limit, offset
-        )
     except Exception as e:
-        print(f"list_notes_by_user failed: {e}")
+        print(f"list_tags_for_user failed: {e}")
         return []
 
-# GET SINGLE NOTE
-async def get_note_for_user(conn: Connection, note_id: int, user_id: UUID) -> Optional[Mapping[str, Any]]:
+# TITLE AUTOCOMPLETE
+async def search_titles_for_user(
+    conn: Connection,
+    user_id: UUID,
+    query: str,
+    *,
+    limit: int,
+) -> Sequence[Mapping[str, Any]]:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 2000")
+            # The default threshold (0.6) is too strict for half-typed or misspelt titles.
+            await conn.execute("SET LOCAL pg_trgm.word_similarity_threshold = 0.3")
+            # Each predicate is its own lookup in idx_notes_user_title_trgm. ORed together the
+            # planner can't use the index and reads every note the user owns instead.
+            # Only titles leave the database.
+            return await conn.fetch(
+                """
+                SELECT id, title, word_similarity($2, title) AS score
+                FROM (
+                    SELECT id, title, updated_at FROM notes WHERE user_id = $1 AND title ILIKE $3
+                    UNION
+                    SELECT id, title, updated_at FROM notes WHERE user_id = $1 AND $2 <% title
+                ) matches
+                ORDER BY score DESC, updated_at DESC
+                LIMIT $4
+                """,
+                user_id, query, f"%{escaped}%", limit,
+            )
+    except Exception as e:
+        print(f"search_titles_for_user failed: {e}")
+        return []
+
+# GET NOTE STATS (maintained by the notes_track_user_stats trigger)
+async def get_note_stats_for_user(conn: Connection, user_id: UUID) -> Optional[Mapping[str, Any]]:
     try:
-        await conn.execute("SET LOCAL statement_timeout = 10000")
         return await conn.fetchrow(
-            """
-            SELECT id, title, content, user_id, created_at, updated_at
-            FROM notes 
-            WHERE id = $1 AND user_id = $2
-            """,
-            note_id, user_id,
+            "SELECT note_count, content_bytes FROM user_note_stats WHERE user_id = $1",
+            user_id,
         )
+    except Exception as e:
+        print(f"get_note_stats_for_user failed: {e}")
+        return None
+
+# GET SINGLE NOTE (read-through note_cache; the rendered-HTML columns always come from the table)
+async def get_note_for_user(
+    conn: Connection,
+    note_id: int,
+    user_id: UUID,
+    *,
+    with_html: bool = False,
+) -> Optional[Mapping[str, Any]]:
+    html_columns = ", content_html, content_html_hash" if with_html else ""
+    token = None
+    if not with_html:
+        cached, token = note_cache.lookup(user_id, note_id)
+        if cached is not None:
+            return cached
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            row = await conn.fetchrow(
+                f"""
+                SELECT id, title, {_BODY_COLUMNS}, tags, pinned, user_id, created_at, updated_at{html_columns}
+                FROM notes 
+                WHERE id = $1 AND user_id = $2
+                """,
+                note_id, user_id,
+            )
+            if not row:
+                return None
+            note = (await _decode_rows(conn, [row]))[0]
+            if not with_html:
+                note_cache.fill(user_id, note_id, note, token)
+            return note
     except Exception as e:
         print(f"get_note_for_user failed: {e}")
         return None
 
-# CREATE NOTE
-async def create_note(conn: Connection, title: str, content: str, user_id: UUID) -> Mapping[str, Any]:
+# GET A NOTE'S STORED BODY, AS STORED (for passing a compressed body through undecoded)
+async def get_note_body_for_user(conn: Connection, note_id: int, user_id: UUID) -> Optional[Mapping[str, Any]]:
     try:
-        await conn.execute("SET LOCAL statement_timeout = 10000")
-        return await conn.fetchrow(
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            row = await conn.fetchrow(
+                f"SELECT {_BODY_COLUMNS} FROM notes WHERE id = $1 AND user_id = $2",
+                note_id, user_id,
+            )
+            if row and compression.missing_dictionaries([row["content_dict_id"]]):
+                await compression_repo.load_dictionaries(conn, [row["content_dict_id"]])
+            return row
+    except Exception as e:
+        print(f"get_note_body_for_user failed: {e}")
+        return None
+
+# SAVE RENDERED HTML (does not touch updated_at)
+async def save_rendered_html(conn: Connection, note_id: int, user_id: UUID, content_hash: str, html: str) -> None:
+    try:
+        await conn.execute(
             """
-            INSERT INTO notes (title, content, user_id)
-            VALUES ($1, $2, $3)
-            RETURNING id, title, content, user_id, created_at, updated_at
+            UPDATE notes
+            SET content_html = $4, content_html_hash = $3
+            WHERE id = $1 AND user_id = $2
             """,
-            title, content, user_id
+            note_id, user_id, content_hash, html,
         )
+    except Exception as e:
+        print(f"save_rendered_html failed: {e}")
+
+# CREATE NOTE
+async def create_note(
+    conn: Connection,
+    title: str,
+    content: str,
+    user_id: UUID,
+    tags: Sequence[str] = (),
+    pinned: bool = False,
+) -> Mapping[str, Any]:
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            # Locking the stats row serialises concurrent creates for the same user,
+            # so two requests can't both squeeze in under the quota.
+            stats = await conn.fetchrow(
+                "SELECT note_count, content_bytes FROM user_note_stats WHERE user_id = $1 FOR UPDATE",
+                user_id,
+            )
+            if stats:
+                if stats["note_count"] + 1 > get_max_notes_per_user():
+                    raise QuotaExceededError("Note limit reached")
+                if stats["content_bytes"] + len(content.encode()) > get_max_content_bytes_per_user():
+                    raise QuotaExceededError("Storage quota exceeded")
+            stored, frame, dict_id, size = compression.encode(content)
+            row = await conn.fetchrow(
+                """
+                INSERT INTO notes (title, content, content_zstd, content_dict_id, content_size, user_id, tags, pinned)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                RETURNING id, title, tags, pinned, user_id, created_at, updated_at
+                """,
+                title, stored, frame, dict_id, size, user_id, list(tags), pinned
+            )
+            await _notify_change(conn, user_id, row["id"], "created")
+            return {**dict(row), "content": content}
+    except QuotaExceededError:
+        raise
     except Exception as e:
         print(f"create_note failed: {e}")
         return {}
@@ -77,21 +326,58 @@ async def update_note_for_user(
     user_id: UUID,
     title: Optional[str],
     content: Optional[str],
+    tags: Optional[Sequence[str]] = None,
+    pinned: Optional[bool] = None,
 ) -> Optional[Mapping[str, Any]]:
+    # Pinning or unpinning alone isn't an edit, so it leaves updated_at (and the note's place in that sort) alone.
+    edited = title is not None or content is not None or tags is not None
     try:
-        await conn.execute("SET LOCAL statement_timeout = 10000")
-        return await conn.fetchrow(
-            """
-            UPDATE notes
-            SET
-              title = COALESCE($3, title),
-              content = COALESCE($4, content),
-              updated_at = now()
-            WHERE id = $1 AND user_id = $2
-            RETURNING id, title, content, user_id, created_at, updated_at
-            """,
-            note_id, user_id, title, content
-        )
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            if content is not None:
+                current = await conn.fetchrow(
+                    """
+                    SELECT s.content_bytes, coalesce(octet_length(n.content), n.content_size) AS old_bytes
+                    FROM user_note_stats s
+                    JOIN notes n ON n.user_id = s.user_id
+                    WHERE s.user_id = $2 AND n.id = $1
+                    FOR UPDATE OF s
+                    """,
+                    note_id, user_id,
+                )
+                new_bytes = len(content.encode())
+                # Shrinking a note is always allowed, even for users already over quota.
+                if current and new_bytes > current["old_bytes"]:
+                    if current["content_bytes"] - current["old_bytes"] + new_bytes > get_max_content_bytes_per_user():
+                        raise QuotaExceededError("Storage quota exceeded")
+            replace_body = content is not None
+            stored, frame, dict_id, size = compression.encode(content) if replace_body else (None, None, None, None)
+            row = await conn.fetchrow(
+                f"""
+                UPDATE notes
+                SET
+                  title = COALESCE($3, title),
+                  content = CASE WHEN $8 THEN $4::text ELSE content END,
+                  content_zstd = CASE WHEN $8 THEN $9::bytea ELSE content_zstd END,
+                  content_dict_id = CASE WHEN $8 THEN $10::integer ELSE content_dict_id END,
+                  content_size = CASE WHEN $8 THEN $11::integer ELSE content_size END,
+                  tags = COALESCE($5::text[], tags),
+                  pinned = COALESCE($6, pinned),
+                  updated_at = CASE WHEN $7 THEN now() ELSE updated_at END
+                WHERE id = $1 AND user_id = $2
+                RETURNING id, title, {"" if replace_body else _BODY_COLUMNS + ", "}tags, pinned, user_id, created_at, updated_at
+                """,
+                note_id, user_id, title, stored, list(tags) if tags is not None else None, pinned, edited,
+                replace_body, frame, dict_id, size,
+            )
+            if row:
+                row = {**dict(row), "content": content} if replace_body else (await _decode_rows(conn, [row]))[0]
+                # Drop our copy now; other workers (and this one again, after commit) hear it via note_changes.
+                note_cache.invalidate(user_id, note_id)
+                await _notify_change(conn, user_id, note_id, "updated")
+            return row
+    except QuotaExceededError:
+        raise
     except Exception as e:
         print(f"update_note_for_user failed: {e}")
         return None
@@ -99,12 +385,17 @@ async def update_note_for_user(
 # DELETE NOTE
 async def delete_note_for_user(conn: Connection, note_id: int, user_id: UUID) -> bool:
     try:
-        await conn.execute("SET LOCAL statement_timeout = 10000")
-        result = await conn.execute(
-            "DELETE FROM notes WHERE id = $1 AND user_id = $2",
-            note_id, user_id
-        )
-        return result.strip().upper().startswith("DELETE 1")
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            result = await conn.execute(
+                "DELETE FROM notes WHERE id = $1 AND user_id = $2",
+                note_id, user_id
+            )
+            deleted = result.strip().upper().startswith("DELETE 1")
+            if deleted:
+                note_cache.invalidate(user_id, note_id)
+                await _notify_change(conn, user_id, note_id, "deleted")
+            return deleted
     except Exception as e:
         print(f"delete_note_for_user failed: {e}")
         return False
\ No newline at end of file
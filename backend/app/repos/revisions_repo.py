@@ -0,0 +1,178 @@
+import asyncio
+from typing import Any, Mapping, Optional, Sequence
+from asyncpg import Connection
+from datetime import datetime
+from uuid import UUID
+
+from app.core import revisions
+from app.core.config import (
+    get_revision_snapshot_interval, get_revision_keep_all_days, get_revision_retention_days
+)
+
+# Revisions of a note are serialised with a transaction-scoped advisory lock keyed on the note id.
+_LOCK_NOTE = "SELECT pg_advisory_xact_lock($1)"
+
+# RECORD REVISION
+async def record_revision(
+    conn: Connection,
+    note_id: int,
+    user_id: UUID,
+    title: str,
+    content: str,
+    note_updated_at: datetime,
+) -> Optional[int]:
+    """Append the given state of a note to its history. Returns the new rev, or None if skipped."""
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            await conn.execute(_LOCK_NOTE, note_id)
+            # Everything since the latest snapshot: enough to rebuild the previous revision.
+            chain = await conn.fetch(
+                """
+                SELECT rev, kind, title, body, note_updated_at
+                FROM note_revisions
+                WHERE note_id = $1
+                  AND rev >= (SELECT max(rev) FROM note_revisions WHERE note_id = $1 AND kind = 'snapshot')
+                ORDER BY rev
+                """,
+                note_id,
+            )
+            loop = asyncio.get_event_loop()
+            previous = None
+            if chain:
+                last = chain[-1]
+                # Captures run in the background and can arrive out of order; never record an older save.
+                if last["note_updated_at"] >= note_updated_at:
+                    return None
+                previous = await loop.run_in_executor(None, revisions.reconstruct, chain)
+                if previous == content and last["title"] == title:
+                    return None
+            force_snapshot = len(chain) >= get_revision_snapshot_interval()
+            kind, body = await loop.run_in_executor(
+                None, revisions.encode_revision, previous, content, force_snapshot
+            )
+            rev = chain[-1]["rev"] + 1 if chain else 1
+            await conn.execute(
+                """
+                INSERT INTO note_revisions
+                  (note_id, user_id, rev, kind, title, body, content_bytes, note_updated_at)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                """,
+                note_id, user_id, rev, kind, title, body, len(content.encode()), note_updated_at,
+            )
+            return rev
+    except Exception as e:
+        print(f"record_revision failed for note {note_id}: {e}")
+        return None
+
+# LIST REVISIONS
+async def list_revisions_for_note(
+    conn: Connection,
+    note_id: int,
+    user_id: UUID,
+    *,
+    limit: int,
+    offset: int,
+) -> Sequence[Mapping[str, Any]]:
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            return await conn.fetch(
+                """
+                SELECT rev, kind, title, content_bytes, octet_length(body) AS stored_bytes, created_at
+                FROM note_revisions
+                WHERE note_id = $1 AND user_id = $2
+                ORDER BY rev DESC
+                LIMIT $3 OFFSET $4
+                """,
+                note_id, user_id, limit, offset,
+            )
+    except Exception as e:
+        print(f"list_revisions_for_note failed: {e}")
+        return []
+
+# GET SINGLE REVISION (reads at most one snapshot interval of rows)
+async def get_revision_for_note(
+    conn: Connection,
+    note_id: int,
+    user_id: UUID,
+    rev: int,
+) -> Optional[Mapping[str, Any]]:
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            chain = await conn.fetch(
+                """
+                SELECT rev, kind, title, body, created_at
+                FROM note_revisions
+                WHERE note_id = $1 AND user_id = $2 AND rev <= $3
+                  AND rev >= (
+                    SELECT max(rev) FROM note_revisions
+                    WHERE note_id = $1 AND user_id = $2 AND rev <= $3 AND kind = 'snapshot'
+                  )
+                ORDER BY rev
+                """,
+                note_id, user_id, rev,
+            )
+            if not chain or chain[-1]["rev"] != rev:
+                return None
+            loop = asyncio.get_event_loop()
+            content = await loop.run_in_executor(None, revisions.reconstruct, chain)
+            last = chain[-1]
+            return {"rev": rev, "title": last["title"], "content": content, "created_at": last["created_at"]}
+    except Exception as e:
+        print(f"get_revision_for_note failed: {e}")
+        return None
+
+# NOTES WITH REVISIONS OLD ENOUGH TO COMPACT
+async def list_notes_with_old_revisions(conn: Connection, *, after_note_id: int, limit: int) -> Sequence[int]:
+    try:
+        rows = await conn.fetch(
+            """
+            SELECT DISTINCT note_id
+            FROM note_revisions
+            WHERE created_at < now() - make_interval(days => $1) AND note_id > $2
+            ORDER BY note_id
+            LIMIT $3
+            """,
+            get_revision_keep_all_days(), after_note_id, limit,
+        )
+        return [r["note_id"] for r in rows]
+    except Exception as e:
+        print(f"list_notes_with_old_revisions failed: {e}")
+        return []
+
+# COMPACT ONE NOTE'S HISTORY
+async def compact_revisions_for_note(conn: Connection, note_id: int) -> int:
+    """Thin out old revisions of a note and re-chain the survivors. Returns the number deleted."""
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 60000")
+            await conn.execute(_LOCK_NOTE, note_id)
+            rows = await conn.fetch(
+                "SELECT id, kind, body, created_at FROM note_revisions WHERE note_id = $1 ORDER BY rev",
+                note_id,
+            )
+            if not rows:
+                return 0
+            loop = asyncio.get_event_loop()
+            to_delete, to_rewrite = await loop.run_in_executor(
+                None,
+                lambda: revisions.plan_compaction(
+                    rows,
+                    keep_all_days=get_revision_keep_all_days(),
+                    retention_days=get_revision_retention_days(),
+                    snapshot_interval=get_revision_snapshot_interval(),
+                ),
+            )
+            if not to_delete:
+                return 0
+            await conn.execute("DELETE FROM note_revisions WHERE id = ANY($1::bigint[])", to_delete)
+            await conn.executemany(
+                "UPDATE note_revisions SET kind = $2, body = $3 WHERE id = $1",
+                to_rewrite,
+            )
+            return len(to_delete)
+    except Exception as e:
+        print(f"compact_revisions_for_note failed for note {note_id}: {e}")
+        return 0
@@ -1,14 +1,17 @@
+import json
 from typing import Optional, Mapping, Any
 from asyncpg import Connection
+from uuid import UUID
 
 # GET USER BY ID
 async def get_user_by_id(conn: Connection, user_id: str) -> Optional[Mapping[str, Any]]:
     try:
-        await conn.execute("SET LOCAL statement_timeout = 10000")
-        return await conn.fetchrow(
-            "SELECT id, email, created_at FROM users WHERE id = $1",
-            user_id,
-        )
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            return await conn.fetchrow(
+                "SELECT id, email, created_at FROM users WHERE id = $1 AND disabled_at IS NULL",
+                user_id,
+            )
     except Exception as e:
         print(f"get_user_by_id failed: {e}")
         return None
@@ -16,11 +19,12 @@ async def get_user_by_id(conn: Connection, user_id: str) -> Optional[Mapping[str
 # GET USER BY EMAIL
 async def get_user_by_email(conn: Connection, email: str) -> Optional[Mapping[str, Any]]:
     try:
-        await conn.execute("SET LOCAL statement_timeout = 10000")
-        return await conn.fetchrow(
-            "SELECT id, email, password_hash FROM users WHERE email = $1",
-            email
-        )
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            return await conn.fetchrow(
+                "SELECT id, email, password_hash FROM users WHERE email = $1",
+                email
+            )
     except Exception as e:
         print(f"get_user_by_email failed: {e}")
         return None
@@ -28,15 +32,39 @@ async def get_user_by_email(conn: Connection, email: str) -> Optional[Mapping[st
 # CREATE USER
 async def create_user(conn: Connection, email: str, password_hash: str) -> Optional[Mapping[str, Any]]:
     try:
-        await conn.execute("SET LOCAL statement_timeout = 10000")
-        return await conn.fetchrow(
-            """
-            INSERT INTO users (email, password_hash)
-            VALUES ($1, $2)
-            RETURNING id, email, password_hash
-            """,
-            email, password_hash
-        )
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            return await conn.fetchrow(
+                """
+                INSERT INTO users (email, password_hash)
+                VALUES ($1, $2)
+                RETURNING id, email, password_hash
+                """,
+                email, password_hash
+            )
     except Exception as e:
         print(f"create_user failed: {e}")
-        return None
\ No newline at end of file
+        return None
+
+# DISABLE USER (first step of account deletion; the notes are purged later by a job)
+async def disable_user(conn: Connection, user_id: UUID) -> bool:
+    try:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL statement_timeout = 10000")
+            # Scrub the credentials now: the address is free to register again and nobody can log in.
+            result = await conn.execute(
+                """
+                UPDATE users
+                SET disabled_at = now(), email = 'deleted-' || id || '@deleted.invalid', password_hash = '!'
+                WHERE id = $1 AND disabled_at IS NULL
+                """,
+                user_id,
+            )
+            if not result.strip().upper().startswith("UPDATE 1"):
+                return False
+            # Every worker drops the user's tokens when this commits (see app/events.py).
+            await conn.execute("SELECT pg_notify('user_disabled', $1)", json.dumps({"user_id": str(user_id)}))
+            return True
+    except Exception as e:
+        print(f"disable_user failed: {e}")
+        return False
@@ -0,0 +1,215 @@
+"""Measure what zstd note storage saves, against plain text columns (with Postgres' own TOAST compression).
+
+    python -m benchmarks.compression --rows 200000
+
+Builds two scratch tables in a `bench` schema (never the real ones), loads the
+same synthetic note bodies into both (datagen's mix of many short notes and a
+long tail of big ones), one as plain text and one encoded the way notes_repo
+stores them, with a dictionary trained on a sample first. It then reports:
+
+  * table sizes (heap + TOAST) and bytes stored per size bucket, with and
+    without the dictionary for the mid-sized notes it is meant for;
+  * encode/decode cost per note;
+  * fetch-by-id latency and bytes sent to the app: plain text, zstd decoded in
+    the app, and zstd passed through to the client undecoded;
+  * a body search: ILIKE over plain text against the candidate-and-decompress
+    path compressed bodies need.
+
+Uses the DB_* settings from the environment. Pass --keep to leave the tables behind.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+import zstandard
+
+from app.core import compression
+from app.core.config import get_note_compress_min_bytes, get_note_dict_max_bytes
+from app.db import connect_dedicated
+from .datagen import note_records
+from .partitioning import percentiles
+
+LOAD_BATCH = 20_000
+DICT_ID = 1
+
+def bucket(size: int) -> str:
+    if size < get_note_compress_min_bytes():
+        return "short"
+    if size <= get_note_dict_max_bytes():
+        return "mid"
+    return "long"
+
+async def create_tables(conn) -> None:
+    await conn.execute("DROP SCHEMA IF EXISTS bench CASCADE")
+    await conn.execute("CREATE SCHEMA bench")
+    await conn.execute("CREATE TABLE bench.notes_plain (id bigint PRIMARY KEY, content text NOT NULL)")
+    await conn.execute(
+        """
+        CREATE TABLE bench.notes_zstd (
+            id bigint PRIMARY KEY,
+            content text,
+            content_zstd bytea,
+            content_dict_id integer,
+            content_size integer
+        )
+        """
+    )
+    await conn.execute("ALTER TABLE bench.notes_zstd ALTER COLUMN content_zstd SET STORAGE EXTERNAL")
+
+def bodies(count: int):
+    user = [uuid.uuid4()]
+    now = datetime.now(timezone.utc)
+    return [record[1] for record in note_records(user, [1.0], count, now)]
+
+def train(sample_count: int, dict_bytes: int) -> None:
+    samples = [
+        body.encode() for body in bodies(sample_count * 40)
+        if bucket(len(body.encode())) == "mid"
+    ][:sample_count]
+    started = time.perf_counter()
+    data = compression.train_dictionary(samples, dict_bytes)
+    compression.register_dictionary(DICT_ID, data)
+    print(f"  trained {len(data):,} byte dictionary on {len(samples):,} notes in {time.perf_counter() - started:.1f}s")
+
+async def load(conn, rows: int) -> dict:
+    plain_zstd = zstandard.ZstdCompressor(level=3)
+    stats = {name: {"notes": 0, "raw": 0, "stored": 0, "no_dict": 0} for name in ("short", "mid", "long")}
+    encode_times = []
+    for start in range(0, rows, LOAD_BATCH):
+        batch = bodies(min(LOAD_BATCH, rows - start))
+        plain, encoded = [], []
+        for i, body in enumerate(batch, start=start + 1):
+            started = time.perf_counter()
+            content, frame, dict_id, size = compression.encode(body)
+            encode_times.append(time.perf_counter() - started)
+            raw = len(body.encode())
+            s = stats[bucket(raw)]
+            s["notes"] += 1
+            s["raw"] += raw
+            s["stored"] += len(frame) if frame is not None else raw
+            s["no_dict"] += min(raw, len(plain_zstd.compress(body.encode()))) if s is stats["mid"] else 0
+            plain.append((i, body))
+            encoded.append((i, content, frame, dict_id, size))
+        await conn.copy_records_to_table("notes_plain", schema_name="bench", records=plain, columns=("id", "content"))
+        await conn.copy_records_to_table(
+            "notes_zstd", schema_name="bench", records=encoded,
+            columns=("id", "content", "content_zstd", "content_dict_id", "content_size"),
+        )
+        print(f"  loaded {start + len(batch):,}/{rows:,}", end="\r")
+    print()
+    await conn.execute("ANALYZE bench.notes_plain")
+    await conn.execute("ANALYZE bench.notes_zstd")
+    print(f"  encode per note     {percentiles(encode_times)}")
+    return stats
+
+async def report_sizes(conn, stats: dict) -> None:
+    for table in ("notes_plain", "notes_zstd"):
+        size = await conn.fetchval("SELECT pg_table_size($1::regclass)", f"bench.{table}")
+        print(f"  {table:<12} table+TOAST={size / 2**20:9.1f} MiB")
+    print("  by size (bytes the app would store; plain text is before TOAST's own compression)")
+    for name, s in stats.items():
+        if not s["notes"]:
+            continue
+        line = f"    {name:<6} {s['notes']:>9,} notes  raw={s['raw'] / 2**20:8.1f} MiB  stored={s['stored'] / 2**20:8.1f} MiB  ({s['stored'] / s['raw']:.0%})"
+        if name == "mid":
+            line += f"  without dictionary={s['no_dict'] / s['raw']:.0%}"
+        print(line)
+
+async def measure_fetch(conn, label: str, size_filter: str, samples: int) -> None:
+    ids = [
+        row["id"] for row in await conn.fetch(
+            f"SELECT id FROM bench.notes_zstd WHERE {size_filter} ORDER BY random() LIMIT $1", samples
+        )
+    ]
+    if not ids:
+        return
+    plain_stmt = await conn.prepare("SELECT content FROM bench.notes_plain WHERE id = $1")
+    zstd_stmt = await conn.prepare("SELECT content, content_zstd, content_dict_id FROM bench.notes_zstd WHERE id = $1")
+    plain_times, decoded_times, passed_times, decode_times = [], [], [], []
+    plain_bytes = zstd_bytes = 0
+    for note_id in ids:
+        started = time.perf_counter()
+        content = await plain_stmt.fetchval(note_id)
+        plain_times.append(time.perf_counter() - started)
+        plain_bytes += len(content.encode())
+
+        started = time.perf_counter()
+        row = await zstd_stmt.fetchrow(note_id)
+        fetched = time.perf_counter()
+        passed_times.append(fetched - started)
+        if row["content_zstd"] is not None:
+            compression.decode(row["content_zstd"], row["content_dict_id"])
+            zstd_bytes += len(row["content_zstd"])
+        else:
+            zstd_bytes += len(row["content"].encode())
+        decode_times.append(time.perf_counter() - fetched)
+        decoded_times.append(time.perf_counter() - started)
+    print(f"  {label} notes ({len(ids)}): {plain_bytes / len(ids):,.0f} -> {zstd_bytes / len(ids):,.0f} bytes per fetch")
+    print(f"    plain text             {percentiles(plain_times)}")
+    print(f"    zstd, decoded          {percentiles(decoded_times)}")
+    print(f"    zstd, passed through   {percentiles(passed_times)}")
+    print(f"    decode alone           {percentiles(decode_times)}")
+
+async def measure_search(conn, word: str) -> None:
+    pattern = f"%{word}%"
+    started = time.perf_counter()
+    plain_hits = len(await conn.fetch("SELECT id FROM bench.notes_plain WHERE content ILIKE $1", pattern))
+    plain = time.perf_counter() - started
+
+    started = time.perf_counter()
+    regex = compression.like_pattern(pattern)
+    hits = 0
+    for row in await conn.fetch(
+        """
+        SELECT content_zstd, content_dict_id, content ILIKE $1 AS matched
+        FROM bench.notes_zstd
+        WHERE content ILIKE $1 OR content_zstd IS NOT NULL
+        """,
+        pattern,
+    ):
+        if row["matched"] or (
+            row["content_zstd"] is not None and regex.fullmatch(compression.decode(row["content_zstd"], row["content_dict_id"]))
+        ):
+            hits += 1
+    compressed = time.perf_counter() - started
+    assert hits == plain_hits, (hits, plain_hits)
+    print(f"  '{word}' in every body ({hits:,} hits): plain ILIKE {plain:.2f}s, zstd candidates + decompress {compressed:.2f}s")
+
+async def main(args) -> None:
+    random.seed(args.seed)
+    conn = await connect_dedicated()
+    try:
+        await conn.execute("SET statement_timeout = 0")
+        print("Training dictionary")
+        train(args.dict_samples, args.dict_bytes)
+        await create_tables(conn)
+        print(f"Loading {args.rows:,} notes")
+        stats = await load(conn, args.rows)
+
+        print("\nSizes")
+        await report_sizes(conn, stats)
+
+        print("\nFetch by id")
+        await measure_fetch(conn, "mid", f"content_size <= {get_note_dict_max_bytes()}", args.samples)
+        await measure_fetch(conn, "long", f"content_size > {get_note_dict_max_bytes()}", args.samples)
+
+        print("\nBody search")
+        await measure_search(conn, args.search)
+    finally:
+        if not args.keep:
+            await conn.execute("DROP SCHEMA IF EXISTS bench CASCADE")
+        await conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plain vs zstd-compressed note body storage benchmark.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--samples", type=int, default=2000, help="notes to time fetches for, per size bucket")
+    parser.add_argument("--dict-samples", type=int, default=5000, help="notes to train the dictionary on")
+    parser.add_argument("--dict-bytes", type=int, default=112_640)
+    parser.add_argument("--search", default="budget", help="word to search bodies for")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the bench schema afterwards")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,148 @@
+"""Load synthetic users and notes into the real schema, fast, with COPY.
+
+    python -m benchmarks.datagen --notes 5000000 --users 50000
+    python -m benchmarks.datagen --drop
+
+Notes are spread over users with Zipf-like skew (--skew), so there are a few
+very heavy accounts and a long tail of light ones, which is what production
+looks like and what exposes per-user scans. Generated users have emails
+ending in DATAGEN_DOMAIN and can be removed again with --drop.
+
+The load runs in one transaction with the per-row stats and tag-count
+triggers disabled, then recomputes user_note_stats and user_tag_counts for
+the generated users. That keeps COPY at
+full speed but locks notes for the duration: point it at a local or test
+database, not a shared one. Uses the DB_* settings from the environment.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.db import connect_dedicated
+
+DATAGEN_DOMAIN = "datagen.example.invalid"
+TAGS = ["work", "home", "ideas", "reading", "travel", "recipes", "todo", "journal", "meeting", "draft"]
+WORDS = (
+    "the of and to in is was for on that with as by at from this be are or an have not which but had "
+    "note meeting project idea plan draft list review budget travel recipe book chapter garden kitchen "
+    "monday tuesday friday weekend morning evening client design release server database index query "
+    "holiday flight hotel market coffee bread tomato basil onion garlic lemon olive pepper salt water"
+).split()
+COPY_BATCH = 50_000
+NOTE_COLUMNS = ("title", "content", "user_id", "created_at", "updated_at", "tags", "pinned")
+
+def zipf_cum_weights(count: int, skew: float):
+    """Cumulative weights for random.choices: rank r gets weight 1 / r**skew."""
+    cum, total = [], 0.0
+    for rank in range(1, count + 1):
+        total += 1 / (rank ** skew)
+        cum.append(total)
+    return cum
+
+def _words(low: int, high: int) -> str:
+    return " ".join(random.choices(WORDS, k=random.randint(low, high)))
+
+def note_records(users, cum_weights, count: int, now: datetime):
+    """Yield (title, content, user_id, created_at, updated_at, tags, pinned) tuples in NOTE_COLUMNS order."""
+    for user_id in random.choices(users, cum_weights=cum_weights, k=count):
+        created = now - timedelta(seconds=random.randint(0, 3 * 365 * 86400))
+        # Mostly short notes with a long tail of big ones.
+        content = _words(5, 60) if random.random() < 0.9 else _words(300, 3000)
+        yield (
+            _words(1, 6).capitalize(),
+            content,
+            user_id,
+            created,
+            created + timedelta(seconds=random.randint(0, 30 * 86400)),
+            random.sample(TAGS, random.randint(0, 3)),
+            random.random() < 0.02,
+        )
+
+async def generate(conn, users: int, notes: int, skew: float, password_hash: str) -> None:
+    now = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    # Ranked heaviest first: datagen-0 owns the most notes.
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    async with conn.transaction():
+        await conn.execute("SET LOCAL statement_timeout = 0")
+        await conn.copy_records_to_table(
+            "users",
+            records=[(uid, f"datagen-{i}@{DATAGEN_DOMAIN}", password_hash, now) for i, uid in enumerate(user_ids)],
+            columns=("id", "email", "password_hash", "created_at"),
+        )
+        await conn.execute("ALTER TABLE notes DISABLE TRIGGER notes_track_user_stats")
+        await conn.execute("ALTER TABLE notes DISABLE TRIGGER notes_track_user_tags")
+        cum_weights = zipf_cum_weights(users, skew)
+        for start in range(0, notes, COPY_BATCH):
+            batch = list(note_records(user_ids, cum_weights, min(COPY_BATCH, notes - start), now))
+            await conn.copy_records_to_table("notes", records=batch, columns=NOTE_COLUMNS)
+            print(f"  {start + len(batch):,}/{notes:,} notes", end="\r")
+        print()
+        await conn.execute("ALTER TABLE notes ENABLE TRIGGER notes_track_user_stats")
+        await conn.execute("ALTER TABLE notes ENABLE TRIGGER notes_track_user_tags")
+        await conn.execute(
+            """
+            UPDATE user_note_stats s
+            SET note_count = agg.note_count, content_bytes = agg.content_bytes
+            FROM (
+                SELECT user_id, count(*) AS note_count, sum(octet_length(content)) AS content_bytes
+                FROM notes
+                WHERE user_id = ANY($1::uuid[])
+                GROUP BY user_id
+            ) agg
+            WHERE s.user_id = agg.user_id
+            """,
+            user_ids,
+        )
+        await conn.execute(
+            """
+            INSERT INTO user_tag_counts (user_id, tag, note_count)
+            SELECT n.user_id, t.tag, count(*)
+            FROM notes n, LATERAL (SELECT DISTINCT unnest(n.tags) AS tag) t
+            WHERE n.user_id = ANY($1::uuid[])
+            GROUP BY n.user_id, t.tag
+            """,
+            user_ids,
+        )
+    await conn.execute("ANALYZE users")
+    await conn.execute("ANALYZE notes")
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {users:,} users and {notes:,} notes in {elapsed:.1f}s ({notes / elapsed:,.0f} notes/s)")
+
+async def drop(conn) -> None:
+    result = await conn.execute("DELETE FROM users WHERE email LIKE $1", f"%@{DATAGEN_DOMAIN}")
+    print(f"Removed generated users and their notes ({result})")
+
+async def dataset_user(conn, rank: int = 0):
+    """(user_id, note_count) of the generated user at this rank (0 is the heaviest), or None if not loaded."""
+    return await conn.fetchrow(
+        """
+        SELECT u.id AS user_id, s.note_count
+        FROM users u
+        JOIN user_note_stats s ON s.user_id = u.id
+        WHERE u.email = $1
+        """,
+        f"datagen-{rank}@{DATAGEN_DOMAIN}",
+    )
+
+async def main(args) -> None:
+    conn = await connect_dedicated()
+    try:
+        if args.drop:
+            await drop(conn)
+        else:
+            # Any valid bcrypt hash will do; nobody logs in as these users.
+            await generate(conn, args.users, args.notes, args.skew, "$2b$12$" + "x" * 53)
+    finally:
+        await conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic users and notes with COPY.")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--notes", type=int, default=1_000_000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for notes per user")
+    parser.add_argument("--drop", action="store_true", help="remove previously generated users and notes")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,196 @@
+"""Compare a single notes heap against a hash-partitioned one at scale.
+
+    python -m benchmarks.partitioning --rows 10000000 --users 50000 --partitions 16
+
+Builds two scratch copies of the notes schema in a `bench` schema (never the
+real tables), loads the same skewed data into both with COPY, then reports:
+
+  * per-user latency of the list_notes and get_note query shapes (p50/p95/p99),
+    sampled over heavy and light users alike;
+  * table and index sizes;
+  * vacuum cost after the same update churn: the whole single table versus
+    each partition, which is the unit autovacuum actually works on.
+
+Uses the DB_* settings from the environment. Pass --keep to leave the tables
+behind for poking at with EXPLAIN.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+from app.db import connect_dedicated
+from .datagen import NOTE_COLUMNS, note_records, zipf_cum_weights
+
+COLUMNS = ("id", *NOTE_COLUMNS)
+LOAD_BATCH = 50_000
+
+LIST_QUERY = """
+    SELECT id, title, content, tags, user_id, created_at, updated_at
+    FROM {table}
+    WHERE user_id = $1
+    ORDER BY updated_at DESC
+    LIMIT 50
+"""
+GET_QUERY = """
+    SELECT id, title, content, tags, user_id, created_at, updated_at
+    FROM {table}
+    WHERE id = $1 AND user_id = $2
+"""
+
+async def create_tables(conn, partitions: int) -> None:
+    await conn.execute("DROP SCHEMA IF EXISTS bench CASCADE")
+    await conn.execute("CREATE SCHEMA bench")
+    columns = """
+        id bigint NOT NULL,
+        title text NOT NULL,
+        content text NOT NULL,
+        user_id uuid NOT NULL,
+        created_at timestamptz NOT NULL,
+        updated_at timestamptz NOT NULL,
+        tags text[] NOT NULL DEFAULT '{}',
+        pinned boolean NOT NULL DEFAULT false
+    """
+    await conn.execute(f"CREATE TABLE bench.notes_single ({columns}, PRIMARY KEY (id))")
+    await conn.execute(
+        f"CREATE TABLE bench.notes_hashed ({columns}, PRIMARY KEY (id, user_id)) PARTITION BY HASH (user_id)"
+    )
+    for remainder in range(partitions):
+        await conn.execute(
+            f"""
+            CREATE TABLE bench.notes_hashed_p{remainder} PARTITION OF bench.notes_hashed
+            FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})
+            """
+        )
+
+async def create_indexes(conn) -> None:
+    for table in ("notes_single", "notes_hashed"):
+        await conn.execute(f"CREATE INDEX ON bench.{table} (user_id)")
+        await conn.execute(f"CREATE INDEX ON bench.{table} USING gin (user_id, tags)")
+        await conn.execute(f"ANALYZE bench.{table}")
+
+async def load(conn, rows: int, users: int, skew: float) -> float:
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    cum_weights = zipf_cum_weights(users, skew)
+    now = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    for start in range(0, rows, LOAD_BATCH):
+        records = note_records(user_ids, cum_weights, min(LOAD_BATCH, rows - start), now)
+        batch = [(start + i + 1, *record) for i, record in enumerate(records)]
+        await conn.copy_records_to_table("notes_single", schema_name="bench", records=batch, columns=COLUMNS)
+        print(f"  loaded {start + len(batch):,}/{rows:,}", end="\r")
+    print()
+    # Same rows in both tables; cheaper than generating them twice.
+    await conn.execute("INSERT INTO bench.notes_hashed SELECT * FROM bench.notes_single")
+    return time.perf_counter() - started
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return f"p50={pick(0.50):7.2f}ms  p95={pick(0.95):7.2f}ms  p99={pick(0.99):7.2f}ms  mean={statistics.mean(ordered) * 1000:7.2f}ms"
+
+async def measure_latency(conn, table: str, sample) -> None:
+    list_stmt = await conn.prepare(LIST_QUERY.format(table=f"bench.{table}"))
+    get_stmt = await conn.prepare(GET_QUERY.format(table=f"bench.{table}"))
+    list_times, get_times = [], []
+    for user_id, note_id in sample:
+        started = time.perf_counter()
+        await list_stmt.fetch(user_id)
+        list_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await get_stmt.fetchrow(note_id, user_id)
+        get_times.append(time.perf_counter() - started)
+    print(f"  {table:<13} list_notes  {percentiles(list_times)}")
+    print(f"  {table:<13} get_note    {percentiles(get_times)}")
+
+async def report_sizes(conn) -> None:
+    for table in ("notes_single", "notes_hashed"):
+        heap, indexes = await conn.fetchrow(
+            """
+            SELECT sum(pg_table_size(c.oid)), sum(pg_indexes_size(c.oid))
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'bench' AND c.relkind = 'r'
+              AND (c.relname = $1 OR c.relname LIKE $1 || '\\_p%')
+            """,
+            table,
+        )
+        print(f"  {table:<13} table={heap / 2**20:9.1f} MiB  indexes={indexes / 2**20:9.1f} MiB")
+
+async def measure_vacuum(conn, churn: float) -> None:
+    modulus = max(1, round(1 / churn))
+    for table in ("notes_single", "notes_hashed"):
+        await conn.execute(f"UPDATE bench.{table} SET updated_at = updated_at + interval '1 second' WHERE id % {modulus} = 0")
+
+    started = time.perf_counter()
+    await conn.execute("VACUUM bench.notes_single")
+    single = time.perf_counter() - started
+
+    partitions = await conn.fetch(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'bench.notes_hashed'::regclass
+        ORDER BY c.relname
+        """
+    )
+    timings = []
+    for row in partitions:
+        started = time.perf_counter()
+        await conn.execute(f"VACUUM bench.{row['relname']}")
+        timings.append(time.perf_counter() - started)
+    print(f"  notes_single  whole table      {single:8.2f}s")
+    print(f"  notes_hashed  per partition    max={max(timings):.2f}s  mean={statistics.mean(timings):.2f}s  total={sum(timings):.2f}s")
+
+async def main(args) -> None:
+    conn = await connect_dedicated()
+    try:
+        await conn.execute("SET statement_timeout = 0")
+        print(f"Creating tables ({args.partitions} partitions)")
+        await create_tables(conn, args.partitions)
+        print(f"Loading {args.rows:,} notes over {args.users:,} users")
+        elapsed = await load(conn, args.rows, args.users, args.skew)
+        print(f"  load took {elapsed:.1f}s")
+        await create_indexes(conn)
+
+        # One note per user, for users drawn across the whole skew (not just the heavy head).
+        sample = [
+            (row["user_id"], row["id"])
+            for row in await conn.fetch(
+                """
+                SELECT DISTINCT ON (user_id) user_id, id
+                FROM bench.notes_single
+                WHERE user_id IN (
+                    SELECT user_id FROM (SELECT DISTINCT user_id FROM bench.notes_single) u ORDER BY random() LIMIT $1
+                )
+                """,
+                args.samples,
+            )
+        ]
+        print(f"\nPer-user latency over {len(sample)} users")
+        for table in ("notes_single", "notes_hashed"):
+            await measure_latency(conn, table, sample)
+
+        print("\nSizes")
+        await report_sizes(conn)
+
+        print(f"\nVacuum after updating {args.churn:.0%} of rows")
+        await measure_vacuum(conn, args.churn)
+    finally:
+        if not args.keep:
+            await conn.execute("DROP SCHEMA IF EXISTS bench CASCADE")
+        await conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single vs hash-partitioned notes table benchmark.")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for notes per user")
+    parser.add_argument("--samples", type=int, default=2000, help="users to time queries for")
+    parser.add_argument("--churn", type=float, default=0.05, help="fraction of rows updated before vacuuming")
+    parser.add_argument("--keep", action="store_true", help="keep the bench schema afterwards")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,100 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from app import maintenance
+from app.core import security
+from app.repos import deletions_repo
+from tests.constants import FIXED_USER_ID, TEST_EMAIL
+
+@pytest_asyncio.fixture
+async def fast_purge(monkeypatch, test_pool):
+    monkeypatch.setenv("ACCOUNT_PURGE_BATCH_SIZE", "2")
+    monkeypatch.setenv("ACCOUNT_PURGE_BATCH_PAUSE", "0")
+    # Hand over to a new job after every batch, so the continuation path runs too.
+    monkeypatch.setenv("ACCOUNT_PURGE_RUN_SECONDS", "0")
+    monkeypatch.setenv("JOBS_POLL_INTERVAL", "0.05")
+    yield
+    security._revoked.pop(FIXED_USER_ID, None)
+    async with test_pool.acquire() as conn:
+        await conn.execute("DELETE FROM account_deletions WHERE user_id = $1", FIXED_USER_ID)
+        await conn.execute("DELETE FROM jobs WHERE kind = 'purge_account'")
+
+def test_revocation_lapses_with_the_token_lifetime():
+    user_id = uuid.uuid4()
+    long_ago = datetime.now(timezone.utc) - timedelta(minutes=security.get_access_token_expiry() + 1)
+    security.revoke_user(user_id, long_ago)
+    assert not security.is_revoked(user_id)
+
+    security.revoke_user(user_id)
+    assert security.is_revoked(user_id)
+    security._revoked.pop(user_id)
+
+@pytest.mark.asyncio
+async def test_delete_account_revokes_tokens_and_purges_in_batches(async_test_client, seed_auth_user, fast_purge, test_pool):
+    for i in range(5):
+        await async_test_client.post("/notes/", json={"title": f"Doomed {i}", "content": "x"})
+    token = security.create_access_token(str(FIXED_USER_ID))
+    assert await security.get_current_user_id(token=token) == FIXED_USER_ID
+
+    r = await async_test_client.delete("/auth/me")
+    assert r.status_code == 202
+    deletion = r.json()
+    assert deletion["notes_total"] == 5
+
+    # Disabled at once: the token is refused and the address is free again.
+    with pytest.raises(HTTPException) as exc:
+        await security.get_current_user_id(token=token)
+    assert exc.value.status_code == 401
+    assert (await async_test_client.get("/auth/me")).status_code == 401
+    async with test_pool.acquire() as conn:
+        assert await conn.fetchval("SELECT count(*) FROM users WHERE email = $1", TEST_EMAIL) == 0
+
+    for _ in range(200):
+        progress = (await async_test_client.get(f"/auth/deletions/{deletion['id']}")).json()
+        if progress["status"] == "done":
+            break
+        await asyncio.sleep(0.05)
+    assert progress["status"] == "done"
+    assert progress["notes_deleted"] == 5
+    async with test_pool.acquire() as conn:
+        assert await conn.fetchval("SELECT count(*) FROM notes WHERE user_id = $1", FIXED_USER_ID) == 0
+        assert await conn.fetchval("SELECT count(*) FROM users WHERE id = $1", FIXED_USER_ID) == 0
+
+@pytest.mark.asyncio
+async def test_purge_that_runs_out_of_attempts_is_reported_and_resumed(
+    async_test_client, seed_auth_user, fast_purge, test_pool, monkeypatch
+):
+    await async_test_client.post("/notes/", json={"title": "Doomed", "content": "x"})
+    monkeypatch.setenv("JOBS_RETRY_BASE_SECONDS", "0")
+    purge_notes_batch = deletions_repo.purge_notes_batch
+
+    async def locked_out(conn, user_id, limit):
+        raise RuntimeError("canceling statement due to lock timeout")
+
+    monkeypatch.setattr(deletions_repo, "purge_notes_batch", locked_out)
+    deletion = (await async_test_client.delete("/auth/me")).json()
+
+    async def status():
+        return (await async_test_client.get(f"/auth/deletions/{deletion['id']}")).json()["status"]
+
+    for _ in range(200):
+        if await status() == "failed":
+            break
+        await asyncio.sleep(0.05)
+    assert await status() == "failed"
+
+    # The sweep queues it again, and this time the purge gets through.
+    monkeypatch.setattr(deletions_repo, "purge_notes_batch", purge_notes_batch)
+    assert await maintenance.resume_deletions(acquire=test_pool.acquire) == 1
+    # Its job is queued now, so a second sweep leaves it alone.
+    assert await maintenance.resume_deletions(acquire=test_pool.acquire) == 0
+    for _ in range(200):
+        if await status() == "done":
+            break
+        await asyncio.sleep(0.05)
+    assert await status() == "done"
+    async with test_pool.acquire() as conn:
+        assert await conn.fetchval("SELECT count(*) FROM users WHERE id = $1", FIXED_USER_ID) == 0
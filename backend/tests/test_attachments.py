@@ -0,0 +1,70 @@
+import pytest
+from app.core import blob_store
+from app.repos import attachments_repo
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 64
+
+@pytest.fixture
+def attachments_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ATTACHMENTS_DIR", str(tmp_path))
+    monkeypatch.delenv("ATTACHMENTS_ACCEL_PREFIX", raising=False)
+    return tmp_path
+
+async def _upload(client, note_id, data, filename="diagram.png"):
+    return await client.post(
+        f"/notes/{note_id}/attachments/",
+        params={"filename": filename},
+        content=data,
+        headers={"Content-Type": "image/png"},
+    )
+
+@pytest.mark.asyncio
+async def test_identical_uploads_are_stored_once(async_test_client, seed_auth_user, attachments_dir):
+    first = (await async_test_client.post("/notes/", json={"title": "A", "content": "a"})).json()["id"]
+    second = (await async_test_client.post("/notes/", json={"title": "B", "content": "b"})).json()["id"]
+
+    r1 = await _upload(async_test_client, first, PNG_BYTES)
+    r2 = await _upload(async_test_client, second, PNG_BYTES, filename="copy.png")
+    assert r1.status_code == 201 and r2.status_code == 201
+    assert r1.json()["sha256"] == r2.json()["sha256"]
+    assert r1.json()["size"] == len(PNG_BYTES)
+
+    stored = [p for p in attachments_dir.rglob("*") if p.is_file()]
+    assert stored == [blob_store.blob_path(r1.json()["sha256"])]
+
+@pytest.mark.asyncio
+async def test_download_supports_range_requests(async_test_client, seed_auth_user, attachments_dir):
+    note_id = (await async_test_client.post("/notes/", json={"title": "A", "content": "a"})).json()["id"]
+    attachment = (await _upload(async_test_client, note_id, PNG_BYTES)).json()
+
+    url = f"/notes/{note_id}/attachments/{attachment['id']}"
+    r = await async_test_client.get(url)
+    assert r.status_code == 200
+    assert r.content == PNG_BYTES
+    assert r.headers["content-type"] == "image/png"
+
+    r = await async_test_client.get(url, headers={"Range": "bytes=8-15"})
+    assert r.status_code == 206
+    assert r.content == PNG_BYTES[8:16]
+
+@pytest.mark.asyncio
+async def test_deleting_note_collects_unreferenced_blobs(async_test_client, seed_auth_user, attachments_dir):
+    note_id = (await async_test_client.post("/notes/", json={"title": "A", "content": "a"})).json()["id"]
+    sha256 = (await _upload(async_test_client, note_id, b"lecture slides")).json()["sha256"]
+    assert blob_store.blob_path(sha256).exists()
+
+    r = await async_test_client.delete(f"/notes/{note_id}/")
+    assert r.status_code == 204
+    assert not blob_store.blob_path(sha256).exists()
+
+@pytest.mark.asyncio
+async def test_failed_insert_leaves_no_blob_behind(async_test_client, seed_auth_user, attachments_dir, monkeypatch):
+    note_id = (await async_test_client.post("/notes/", json={"title": "A", "content": "a"})).json()["id"]
+
+    async def failing_add_attachment(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(attachments_repo, "add_attachment", failing_add_attachment)
+    r = await _upload(async_test_client, note_id, PNG_BYTES)
+    assert r.status_code == 500
+    assert [p for p in attachments_dir.rglob("*") if p.is_file()] == []
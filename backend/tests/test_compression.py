@@ -0,0 +1,132 @@
+import random
+import pytest
+import zstandard
+from app.core import compression
+from tests.constants import FIXED_USER_ID
+
+WORDS = "meeting project budget review design release server database index query lecture lab exam".split()
+
+def _text(words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+@pytest.fixture
+def no_dictionary():
+    """Isolate tests from any dictionary this process loaded (and from ones they register)."""
+    saved = (dict(compression._dictionaries), compression._current_dict_id, dict(compression._compressors), dict(compression._decompressors))
+    compression._dictionaries.clear()
+    compression._compressors.clear()
+    compression._decompressors.clear()
+    compression._current_dict_id = None
+    yield
+    compression._dictionaries.clear()
+    compression._dictionaries.update(saved[0])
+    compression._current_dict_id = saved[1]
+    compression._compressors.clear()
+    compression._compressors.update(saved[2])
+    compression._decompressors.clear()
+    compression._decompressors.update(saved[3])
+
+def test_short_bodies_stay_plain_and_long_ones_round_trip(no_dictionary):
+    assert compression.encode("short note") == ("short note", None, None, None)
+
+    body = _text(2000)
+    content, frame, dict_id, size = compression.encode(body)
+    assert content is None and dict_id is None
+    assert size == len(body.encode()) and len(frame) < size / 2
+    # No dictionary: a standard frame any zstd decoder (e.g. a browser) can read.
+    assert zstandard.ZstdDecompressor().decompress(frame).decode() == body
+    row = {"id": 1, "content": None, "content_zstd": frame, "content_dict_id": None, "content_size": size}
+    assert compression.decode_row(row) == {"id": 1, "content": body}
+
+def test_mid_sized_bodies_use_the_trained_dictionary(no_dictionary):
+    samples = [(_text(120, seed) + f" note {seed}").encode() for seed in range(500)]
+    compression.register_dictionary(7, compression.train_dictionary(samples, 16 * 1024))
+
+    body = _text(120, seed=10_000)
+    _, frame, dict_id, _ = compression.encode(body)
+    assert dict_id == 7
+    assert compression.decode(frame, 7) == body
+
+    _, _, dict_id, _ = compression.encode(_text(5000))
+    assert dict_id is None
+
+@pytest.mark.parametrize("header, accepted", [
+    ("gzip, deflate, br, zstd", True),
+    ("zstd;q=0.5", True),
+    ("ZSTD", True),
+    ("zstd;q=0", False),
+    ("gzip", False),
+    (None, False),
+])
+def test_accepts_zstd(header, accepted):
+    assert compression.accepts_zstd(header) is accepted
+
+def test_like_pattern_matches_as_ilike_would():
+    pattern = compression.like_pattern("%bud_et%")
+    assert pattern.fullmatch("Q3 BUDGET\nreview")
+    assert pattern.fullmatch("budjet")
+    assert not pattern.fullmatch("budge")
+    assert compression.like_pattern("%100%%").fullmatch("a 100% rise")
+
+@pytest.mark.asyncio
+async def test_large_note_is_stored_compressed_and_served_as_is(async_test_client, seed_auth_user, cleanup_notes, test_pool):
+    body = _text(3000) + " needle"
+    note = (await async_test_client.post("/notes/", json={"title": "Long", "content": body})).json()
+    assert note["content"] == body
+
+    async with test_pool.acquire() as conn:
+        stored = await conn.fetchrow(
+            "SELECT content, content_zstd, content_size FROM notes WHERE id = $1", note["id"]
+        )
+        stats = await conn.fetchval("SELECT content_bytes FROM user_note_stats WHERE user_id = $1", FIXED_USER_ID)
+    assert stored["content"] is None
+    assert stored["content_size"] == len(body.encode())
+    assert len(stored["content_zstd"]) < len(body) / 2
+    # Quotas count what the user wrote, not what it compressed to.
+    assert stats >= len(body.encode())
+
+    assert (await async_test_client.get(f"/notes/{note['id']}/")).json()["content"] == body
+
+    async with async_test_client.stream(
+        "GET", f"/notes/{note['id']}/content", headers={"Accept-Encoding": "zstd"}
+    ) as r:
+        raw = b"".join([chunk async for chunk in r.aiter_raw()])
+    assert r.headers["content-encoding"] == "zstd"
+    assert raw == stored["content_zstd"]
+
+    r = await async_test_client.get(f"/notes/{note['id']}/content", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+    assert r.text == body
+
+    # Search still finds words inside the compressed body.
+    hits = (await async_test_client.get("/notes/", params={"search": "needle"})).json()
+    assert [n["id"] for n in hits] == [note["id"]]
+
+    updated = (await async_test_client.put(f"/notes/{note['id']}/", json={"content": "now short"})).json()
+    assert updated["content"] == "now short"
+    updated = (await async_test_client.put(f"/notes/{note['id']}/", json={"title": "Renamed"})).json()
+    assert updated["content"] == "now short"
+    async with test_pool.acquire() as conn:
+        assert await conn.fetchval("SELECT content FROM notes WHERE id = $1", note["id"]) == "now short"
+
+@pytest.mark.asyncio
+async def test_body_search_pages_through_compressed_candidates(async_test_client, seed_auth_user, cleanup_notes):
+    long_hit, long_miss = _text(3000) + " needle", _text(3000, seed=1)
+    bodies = ["needle", long_miss, long_hit, "haystack", long_miss, long_miss, long_hit, "a needle", long_miss, long_hit]
+    for i, body in enumerate(bodies):
+        await async_test_client.post("/notes/", json={"title": f"Note {i:02}", "content": body})
+    await async_test_client.post("/notes/", json={"title": "Pinned", "content": long_hit, "pinned": True})
+    expected = ["Pinned"] + [f"Note {i:02}" for i, body in enumerate(bodies) if "needle" in body]
+
+    params = {"search": "needle", "sort": "title", "order": "asc"}
+    everything = (await async_test_client.get("/notes/", params=params)).json()
+    assert [n["title"] for n in everything] == expected
+    assert all(n["content"].endswith("needle") for n in everything)
+
+    # Small pages make the walk go round several times (and past the compressed misses) per page.
+    paged = []
+    for offset in range(0, len(expected) + 2, 2):
+        page = (await async_test_client.get("/notes/", params={**params, "limit": 2, "offset": offset})).json()
+        paged += [n["title"] for n in page]
+    assert paged == expected
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import uuid
+import pytest
+from app.db import connect_dedicated
+from app.events import ChangeFeed, FeedFullError
+from tests.constants import FIXED_USER_ID
+
+def _event(user_id, note_id, op):
+    return json.dumps({"user_id": str(user_id), "note_id": note_id, "op": op})
+
+@pytest.mark.asyncio
+async def test_changes_coalesce_per_note():
+    feed = ChangeFeed()
+    sub = feed.subscribe(FIXED_USER_ID)
+    feed.publish(_event(FIXED_USER_ID, 1, "updated"))
+    feed.publish(_event(FIXED_USER_ID, 2, "created"))
+    feed.publish(_event(FIXED_USER_ID, 1, "deleted"))
+    feed.publish(_event(uuid.uuid4(), 3, "updated"))
+
+    resync, changes = await sub.next_batch(timeout=1)
+    assert not resync
+    assert changes == [(2, "created"), (1, "deleted")]
+
+@pytest.mark.asyncio
+async def test_slow_client_is_told_to_resync(monkeypatch):
+    monkeypatch.setenv("FEED_MAX_PENDING", "2")
+    feed = ChangeFeed()
+    sub = feed.subscribe(FIXED_USER_ID)
+    for note_id in range(5):
+        feed.publish(_event(FIXED_USER_ID, note_id, "updated"))
+
+    resync, changes = await sub.next_batch(timeout=1)
+    assert resync
+    assert changes == []
+
+@pytest.mark.asyncio
+async def test_connection_caps(monkeypatch):
+    monkeypatch.setenv("FEED_MAX_PER_USER", "1")
+    feed = ChangeFeed()
+    sub = feed.subscribe(FIXED_USER_ID)
+    with pytest.raises(FeedFullError):
+        feed.subscribe(FIXED_USER_ID)
+    feed.unsubscribe(sub)
+    feed.subscribe(FIXED_USER_ID)
+
+@pytest.mark.asyncio
+async def test_writes_emit_notifications(async_test_client, seed_auth_user):
+    received = asyncio.Queue()
+    # Its own session, like the app's listener: a LISTEN on a pooled connection would outlive the test.
+    conn = await connect_dedicated()
+    try:
+        await conn.add_listener("note_changes", lambda *args: received.put_nowait(json.loads(args[-1])))
+        note_id = (await async_test_client.post("/notes/", json={"title": "Live", "content": "x"})).json()["id"]
+        await async_test_client.put(f"/notes/{note_id}/", json={"content": "y"})
+        events = [await asyncio.wait_for(received.get(), 5) for _ in range(2)]
+    finally:
+        await conn.close()
+
+    assert events == [
+        {"user_id": str(FIXED_USER_ID), "note_id": note_id, "op": "created"},
+        {"user_id": str(FIXED_USER_ID), "note_id": note_id, "op": "updated"},
+    ]
@@ -0,0 +1,120 @@
+import asyncio
+import uuid
+import pytest
+from app.jobs import JobWorker, job_handler
+from app.repos import jobs_repo
+
+CALLS = []
+
+@job_handler("test_flaky")
+async def flaky_handler(ctx, payload):
+    CALLS.append((ctx.job["attempts"], payload))
+    if ctx.job["attempts"] < payload["succeed_on"]:
+        raise RuntimeError("transient failure")
+
+async def _wait_for(predicate, timeout=10):
+    deadline = asyncio.get_event_loop().time() + timeout
+    while not await predicate():
+        assert asyncio.get_event_loop().time() < deadline, "timed out waiting for jobs"
+        await asyncio.sleep(0.1)
+
+@pytest.fixture
+def fast_jobs(monkeypatch):
+    monkeypatch.setenv("JOBS_POLL_INTERVAL", "0.05")
+    monkeypatch.setenv("JOBS_RETRY_BASE_SECONDS", "0")
+    CALLS.clear()
+
+@pytest.mark.asyncio
+async def test_jobs_retry_then_complete(test_pool, fast_jobs):
+    async with test_pool.acquire() as conn:
+        await conn.execute("DELETE FROM jobs WHERE kind = 'test_flaky'")
+        await jobs_repo.enqueue_job(conn, "test_flaky", {"succeed_on": 3})
+        await jobs_repo.enqueue_job(conn, "test_flaky", {"succeed_on": 9}, max_attempts=2)
+
+    worker = JobWorker(worker_id="test-worker")
+    await worker.start()
+    try:
+        async def settled():
+            async with test_pool.acquire() as conn:
+                return await conn.fetchval(
+                    "SELECT count(*) = 1 AND bool_and(status = 'failed') FROM jobs WHERE kind = 'test_flaky'"
+                )
+        await _wait_for(settled)
+    finally:
+        await worker.stop()
+
+    assert sorted(a for a, p in CALLS if p["succeed_on"] == 3) == [1, 2, 3]
+    assert sorted(a for a, p in CALLS if p["succeed_on"] == 9) == [1, 2]
+    assert worker.processed == 1 and worker.failed == 1 and worker.retried == 3
+
+def test_worker_restarts_under_a_new_event_loop(monkeypatch):
+    monkeypatch.setenv("JOBS_POLL_INTERVAL", "0.1")
+    claims = []
+    claim_jobs = jobs_repo.claim_jobs
+
+    async def counting_claim_jobs(conn, worker_id, limit):
+        claims.append(worker_id)
+        return await claim_jobs(conn, worker_id, limit)
+
+    monkeypatch.setattr(jobs_repo, "claim_jobs", counting_claim_jobs)
+    worker = JobWorker(worker_id="test-worker")
+
+    async def run_briefly():
+        await worker.start()
+        await asyncio.sleep(0.5)
+        await worker.stop()
+
+    # Like the module-level JOB_WORKER across test loops: the second run must still sleep between polls.
+    asyncio.run(run_briefly())
+    asyncio.run(run_briefly())
+    assert len(claims) <= 20
+
+@pytest.mark.asyncio
+async def test_claims_skip_rows_locked_by_another_worker(test_pool):
+    async with test_pool.acquire() as conn:
+        await conn.execute("DELETE FROM jobs WHERE kind = 'test_flaky'")
+        for _ in range(4):
+            await jobs_repo.enqueue_job(conn, "test_flaky", {"succeed_on": 1})
+
+    async with test_pool.acquire() as a, test_pool.acquire() as b:
+        async with a.transaction(), b.transaction():
+            first = await jobs_repo.claim_jobs(a, "a", 3)
+            second = await jobs_repo.claim_jobs(b, "b", 3)
+            assert len(first) == 3 and len(second) == 1
+            assert not {j["id"] for j in first} & {j["id"] for j in second}
+        async with a.transaction():
+            await a.execute("DELETE FROM jobs WHERE kind = 'test_flaky'")
+
+@pytest.mark.asyncio
+async def test_register_queues_welcome_note(async_test_client, cleanup_user, test_pool, fast_jobs):
+    r = await async_test_client.post("/auth/register", json={"email": "auth_test@example.com", "password": "Password123"})
+    assert r.status_code == 201
+
+    async def welcomed():
+        async with test_pool.acquire() as conn:
+            return await conn.fetchval(
+                """
+                SELECT count(*) = 1 FROM notes n JOIN users u ON u.id = n.user_id
+                WHERE u.email = 'auth_test@example.com' AND n.title = 'Welcome!'
+                """
+            )
+    await _wait_for(welcomed)
+
+@pytest.mark.asyncio
+async def test_welcome_note_failure_is_recorded(test_pool, fast_jobs):
+    # No such user: the insert fails, and the job must be failed, not left 'running' for the reaper.
+    async with test_pool.acquire() as conn:
+        job_id = await jobs_repo.enqueue_job(conn, "welcome_note", {"user_id": str(uuid.uuid4())}, max_attempts=1)
+
+    worker = JobWorker(worker_id="test-worker")
+    await worker.start()
+    try:
+        async def settled():
+            async with test_pool.acquire() as conn:
+                return await conn.fetchval("SELECT status = 'failed' FROM jobs WHERE id = $1", job_id)
+        await _wait_for(settled)
+    finally:
+        await worker.stop()
+        async with test_pool.acquire() as conn:
+            await conn.execute("DELETE FROM jobs WHERE id = $1", job_id)
+
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import pytest
+from app.core import note_cache
+from app.events import LISTENER
+from tests.constants import FIXED_USER_ID
+
+def _row(note_id, content="body"):
+    return {"id": note_id, "title": "Cached", "content": content, "tags": ["a"], "user_id": FIXED_USER_ID}
+
+@pytest.fixture
+def coherent_cache():
+    note_cache.set_coherent(True)
+    yield
+    note_cache.set_coherent(False)
+
+def test_fill_then_hit(coherent_cache):
+    cached, token = note_cache.lookup(FIXED_USER_ID, 1)
+    assert cached is None
+    note_cache.fill(FIXED_USER_ID, 1, _row(1), token)
+
+    cached, _ = note_cache.lookup(FIXED_USER_ID, 1)
+    assert cached["content"] == "body"
+    assert note_cache.get_note_cache_stats()["bytes"] > 0
+
+def test_invalidation_during_read_skips_fill(coherent_cache):
+    _, token = note_cache.lookup(FIXED_USER_ID, 2)
+    # Another worker's update lands while our SELECT is in flight.
+    note_cache.on_note_change(json.dumps({"user_id": str(FIXED_USER_ID), "note_id": 2, "op": "updated"}))
+    note_cache.fill(FIXED_USER_ID, 2, _row(2, "stale"), token)
+
+    assert note_cache.lookup(FIXED_USER_ID, 2)[0] is None
+    assert note_cache.get_note_cache_stats()["skipped_fills"] >= 1
+
+def test_unrelated_invalidation_does_not_block_fill(coherent_cache):
+    _, token = note_cache.lookup(FIXED_USER_ID, 3)
+    note_cache.invalidate(FIXED_USER_ID, 4)
+    note_cache.fill(FIXED_USER_ID, 3, _row(3), token)
+
+    assert note_cache.lookup(FIXED_USER_ID, 3)[0] is not None
+
+def test_bypassed_while_listener_is_down(coherent_cache):
+    _, token = note_cache.lookup(FIXED_USER_ID, 5)
+    note_cache.fill(FIXED_USER_ID, 5, _row(5), token)
+    note_cache.set_coherent(False)
+
+    assert note_cache.lookup(FIXED_USER_ID, 5) == (None, None)
+    note_cache.set_coherent(True)
+    assert note_cache.lookup(FIXED_USER_ID, 5)[0] is None
+
+@pytest.mark.asyncio
+async def test_get_is_served_from_cache_and_invalidated_by_update(async_test_client, seed_auth_user):
+    for _ in range(50):
+        if LISTENER.connected:
+            break
+        await asyncio.sleep(0.1)
+    assert LISTENER.connected
+
+    note_id = (await async_test_client.post("/notes/", json={"title": "Hot", "content": "v1"})).json()["id"]
+    await async_test_client.get(f"/notes/{note_id}/")
+    hits_before = (await async_test_client.get("/health/note-cache")).json()["hits"]
+    assert (await async_test_client.get(f"/notes/{note_id}/")).json()["content"] == "v1"
+    assert (await async_test_client.get("/health/note-cache")).json()["hits"] == hits_before + 1
+
+    await async_test_client.put(f"/notes/{note_id}/", json={"content": "v2"})
+    assert (await async_test_client.get(f"/notes/{note_id}/")).json()["content"] == "v2"
+
+    await async_test_client.delete(f"/notes/{note_id}/")
+    assert (await async_test_client.get(f"/notes/{note_id}/")).status_code == 404
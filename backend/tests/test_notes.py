@@ -1,6 +1,7 @@
 import pytest
 from app.main import app
 from app.core.security import get_current_user_id
+from app.repos import notes_repo, users_repo
 from tests.constants import FIXED_USER_ID
 
 app.dependency_overrides[get_current_user_id] = lambda: FIXED_USER_ID
@@ -45,4 +46,144 @@ async def test_delete_then_404(async_test_client, seed_auth_user):
     assert r.status_code == 204
 
     r = await async_test_client.get(f"/notes/{note_id}/")
-    assert r.status_code == 404
\ No newline at end of file
+    assert r.status_code == 404
+
+@pytest.mark.asyncio
+async def test_tag_filters_and_counts(async_test_client, seed_auth_user):
+    graphs = (await async_test_client.post("/notes/", json={"title": "Graphs", "content": "BFS", "tags": ["CS101", "algorithms"]})).json()
+    proofs = (await async_test_client.post("/notes/", json={"title": "Proofs", "content": "Induction", "tags": ["maths", " Algorithms "]})).json()
+    await async_test_client.post("/notes/", json={"title": "Untagged", "content": "Nothing"})
+
+    r = await async_test_client.get("/notes/", params={"tag": "algorithms"})
+    assert r.status_code == 200
+    assert {n["title"] for n in r.json()} == {"Graphs", "Proofs"}
+
+    r = await async_test_client.get("/notes/", params=[("tag", "algorithms"), ("tag", "cs101"), ("tag_mode", "all")])
+    assert [n["title"] for n in r.json()] == ["Graphs"]
+
+    r = await async_test_client.get("/notes/tags")
+    assert r.status_code == 200
+    assert r.json() == [
+        {"tag": "algorithms", "count": 2},
+        {"tag": "cs101", "count": 1},
+        {"tag": "maths", "count": 1},
+    ]
+
+    # Counts follow retagging and deletes.
+    await async_test_client.put(f"/notes/{graphs['id']}/", json={"tags": ["maths"]})
+    await async_test_client.delete(f"/notes/{proofs['id']}/")
+    r = await async_test_client.get("/notes/tags")
+    assert r.json() == [{"tag": "maths", "count": 1}]
+
+
+@pytest.mark.asyncio
+async def test_pinned_first_and_sort_orders(async_test_client, seed_auth_user):
+    ids = {}
+    for title in ["banana", "cherry", "apple"]:
+        ids[title] = (await async_test_client.post("/notes/", json={"title": title, "content": title})).json()["id"]
+    before = (await async_test_client.get(f"/notes/{ids['banana']}/")).json()
+    r = await async_test_client.put(f"/notes/{ids['banana']}/", json={"pinned": True})
+    assert r.json()["pinned"] is True
+    # Pinning isn't an edit.
+    assert r.json()["updated_at"] == before["updated_at"]
+
+    titles = lambda r: [n["title"] for n in r.json()]
+    assert titles(await async_test_client.get("/notes/")) == ["banana", "apple", "cherry"]
+    assert titles(await async_test_client.get("/notes/", params={"sort": "created", "order": "asc"})) == ["banana", "cherry", "apple"]
+    assert titles(await async_test_client.get("/notes/", params={"sort": "title", "limit": 2})) == ["banana", "apple"]
+    assert titles(await async_test_client.get("/notes/", params={"sort": "title", "offset": 1})) == ["apple", "cherry"]
+
+    r = await async_test_client.get("/notes/", params={"sort": "size"})
+    assert r.status_code == 422
+
+@pytest.mark.asyncio
+async def test_list_reports_totals_and_enforces_quota(async_test_client, seed_auth_user, monkeypatch):
+    await async_test_client.post("/notes/", json={"title": "One", "content": "abc"})
+    await async_test_client.post("/notes/", json={"title": "Two", "content": "defgh"})
+
+    r = await async_test_client.get("/notes/", params={"limit": 1})
+    assert r.status_code == 200
+    assert r.headers["X-Total-Count"] == "2"
+    assert r.headers["X-Content-Bytes"] == "8"
+
+    monkeypatch.setenv("NOTES_MAX_PER_USER", "2")
+    r = await async_test_client.post("/notes/", json={"title": "Three", "content": "x"})
+    assert r.status_code == 413
+
+    monkeypatch.setenv("NOTES_MAX_BYTES_PER_USER", "10")
+    note_id = (await async_test_client.get("/notes/")).json()[0]["id"]
+    r = await async_test_client.put(f"/notes/{note_id}/", json={"content": "far too long for the quota"})
+    assert r.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_title_autocomplete_tolerates_typos(async_test_client, seed_auth_user):
+    await async_test_client.post("/notes/", json={"title": "Operating Systems Lecture 3", "content": "Paging"})
+    await async_test_client.post("/notes/", json={"title": "Compilers", "content": "Parsing"})
+
+    r = await async_test_client.get("/notes/titles", params={"q": "operting sys"})
+    assert r.status_code == 200
+    results = r.json()
+    assert results[0]["title"] == "Operating Systems Lecture 3"
+    assert set(results[0]) == {"id", "title", "score"}
+
+    r = await async_test_client.get("/notes/titles", params={"q": "Compil"})
+    assert [n["title"] for n in r.json()] == ["Compilers"]
+
+    r = await async_test_client.get("/notes/titles", params={"q": "   "})
+    assert r.status_code == 200
+    assert r.json() == []
+
+
+@pytest.mark.asyncio
+async def test_get_note_as_html_is_sanitized_and_persisted(async_test_client, seed_auth_user, test_pool):
+    content = "# Heading\n\n<script>alert(1)</script>\n\n**bold**"
+    note_id = (await async_test_client.post("/notes/", json={"title": "Md", "content": content})).json()["id"]
+
+    r = await async_test_client.get(f"/notes/{note_id}/", params={"format": "html"})
+    assert r.status_code == 200
+    html = r.json()["html"]
+    assert "<h1>Heading</h1>" in html
+    assert "<strong>bold</strong>" in html
+    assert "<script>" not in html
+
+    async with test_pool.acquire() as conn:
+        stored = await conn.fetchval("SELECT content_html FROM notes WHERE id = $1", note_id)
+    assert stored == html
+
+    r = await async_test_client.get(f"/notes/{note_id}/")
+    assert "html" not in r.json()
+
+
+class _TimeoutWatcher:
+    """Passes queries through to a connection, noting any SET LOCAL sent outside a transaction."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.ignored = []
+
+    def transaction(self):
+        return self._conn.transaction()
+
+    def __getattr__(self, name):
+        method = getattr(self._conn, name)
+
+        async def call(query, *args, **kwargs):
+            if query.lstrip().upper().startswith("SET LOCAL") and not self._conn.is_in_transaction():
+                self.ignored.append(query)
+            return await method(query, *args, **kwargs)
+        return call
+
+@pytest.mark.asyncio
+async def test_repo_timeouts_apply_without_a_caller_transaction(async_test_client, seed_auth_user, test_pool):
+    note_id = (await async_test_client.post("/notes/", json={"title": "T", "content": "C"})).json()["id"]
+    async with test_pool.acquire() as conn:
+        # SET LOCAL outside a transaction is a no-op (with a warning), so the timeout would silently not apply.
+        watcher = _TimeoutWatcher(conn)
+        await notes_repo.list_notes_by_user(watcher, FIXED_USER_ID, limit=10, offset=0)
+        await notes_repo.list_notes_by_user(watcher, FIXED_USER_ID, "C", limit=10, offset=0)
+        await notes_repo.list_tags_for_user(watcher, FIXED_USER_ID)
+        await notes_repo.get_note_for_user(watcher, note_id, FIXED_USER_ID, with_html=True)
+        await notes_repo.get_note_body_for_user(watcher, note_id, FIXED_USER_ID)
+        await users_repo.get_user_by_id(watcher, FIXED_USER_ID)
+    assert watcher.ignored == []
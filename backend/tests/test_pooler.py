@@ -0,0 +1,100 @@
+"""The app's database paths with DB_POOL_MODE=transaction, through a real transaction pooler.
+
+Opt-in, because it needs PgBouncer running in transaction mode:
+
+    docker compose --profile pooler up -d db pgbouncer
+    POOLER_TEST=1 pytest tests/test_pooler.py
+
+POOLER_HOST / POOLER_PORT (default localhost:6432) locate the pooler, and
+POOLER_SERVER_POOL_SIZE (default 40, matching docker-compose) is the most
+server connections it should open.
+"""
+import asyncio
+import json
+import os
+import asyncpg
+import pytest
+import pytest_asyncio
+from app import db
+from app.repos import notes_repo
+from tests.constants import FIXED_USER_ID
+
+pytestmark = pytest.mark.skipif(not os.getenv("POOLER_TEST"), reason="set POOLER_TEST=1 with a local pooler running")
+
+POOLER_HOST = os.getenv("POOLER_HOST", "localhost")
+POOLER_PORT = os.getenv("POOLER_PORT", "6432")
+
+@pytest_asyncio.fixture
+async def pooled_db(monkeypatch):
+    """The app's main pool, pointed at the pooler in transaction mode; LISTEN still goes direct."""
+    monkeypatch.setenv("DB_DIRECT_HOST", os.getenv("DB_HOST", "localhost"))
+    monkeypatch.setenv("DB_DIRECT_PORT", os.getenv("DB_PORT", "5432"))
+    monkeypatch.setenv("DB_HOST", POOLER_HOST)
+    monkeypatch.setenv("DB_PORT", POOLER_PORT)
+    monkeypatch.setenv("DB_POOL_MODE", "transaction")
+    monkeypatch.setenv("DB_POOL_MAX", "50")
+    pool = await db.init_db_pool()
+    yield pool
+    await db.close_db_pool()
+
+@pytest.mark.asyncio
+async def test_repo_calls_survive_statement_reuse(pooled_db, seed_auth_user):
+    # Each call reuses the same SQL on connections the pooler keeps reshuffling;
+    # named prepared statements would fail here with "prepared statement does not exist".
+    async def session(i):
+        async with db.db_conn(timeout=10) as conn:
+            async with conn.transaction():
+                note = await notes_repo.create_note(conn, f"Pooled {i}", "body", FIXED_USER_ID)
+            async with conn.transaction():
+                updated = await notes_repo.update_note_for_user(conn, note["id"], FIXED_USER_ID, None, "edited", None)
+            fetched = await notes_repo.get_note_for_user(conn, note["id"], FIXED_USER_ID, with_html=True)
+            listed = await notes_repo.list_notes_by_user(conn, FIXED_USER_ID, limit=5, offset=0)
+            return note, updated, fetched, listed
+
+    for _ in range(5):
+        results = await asyncio.gather(*(session(i) for i in range(40)))
+        for note, updated, fetched, listed in results:
+            assert note and updated["content"] == "edited"
+            assert fetched["content"] == "edited"
+            assert listed
+
+@pytest.mark.asyncio
+async def test_many_clients_share_few_server_connections():
+    clients = 400
+    limit = int(os.getenv("POOLER_SERVER_POOL_SIZE", "40"))
+    conns = await asyncio.gather(*(
+        asyncpg.connect(
+            host=POOLER_HOST, port=int(POOLER_PORT), user=os.getenv("DB_USER", "postgres"),
+            password=os.getenv("DB_PASSWORD", "postgres"), database=os.getenv("DB_NAME", "postgres"),
+            statement_cache_size=0,
+        )
+        for _ in range(clients)
+    ))
+    try:
+        async def work(conn):
+            pids = set()
+            for _ in range(3):
+                async with conn.transaction():
+                    pids.add(await conn.fetchval("SELECT pg_backend_pid() FROM pg_sleep(0.02)"))
+            return pids
+
+        backends = set().union(*await asyncio.gather(*(work(c) for c in conns)))
+    finally:
+        await asyncio.gather(*(c.close() for c in conns))
+
+    assert len(backends) <= limit < clients
+
+@pytest.mark.asyncio
+async def test_listen_goes_direct_and_hears_pooled_writes(pooled_db, seed_auth_user):
+    received = asyncio.Queue()
+    listener = await db.connect_dedicated()
+    try:
+        await listener.add_listener("note_changes", lambda *args: received.put_nowait(json.loads(args[-1])))
+        async with db.db_conn(timeout=10) as conn:
+            async with conn.transaction():
+                note = await notes_repo.create_note(conn, "Heard", "x", FIXED_USER_ID)
+        event = await asyncio.wait_for(received.get(), 5)
+    finally:
+        await listener.close()
+
+    assert event == {"user_id": str(FIXED_USER_ID), "note_id": note["id"], "op": "created"}
@@ -0,0 +1,270 @@
+"""Query-plan regression checks for notes_repo and users_repo.
+
+Opt-in, because they need a realistically sized dataset:
+
+    PLAN_CHECK=1 pytest tests/test_query_plans.py
+
+On first run this loads PLAN_CHECK_NOTES synthetic notes (default 200k) with
+benchmarks.datagen; later runs reuse them (`python -m benchmarks.datagen --drop`
+removes them). Every query a repo function sends is run through
+EXPLAIN (ANALYZE, BUFFERS) inside a rolled-back savepoint before it executes
+for real, and the plans are checked for sequential scans, partition pruning,
+rows examined and buffers touched. Dropping an index or writing a query that
+can't use one fails here instead of in production.
+"""
+import inspect
+import json
+import os
+import re
+import pytest
+import pytest_asyncio
+from benchmarks import datagen
+from app.core import compression
+from app.core.config import get_note_compress_min_bytes
+from app.repos import notes_repo, users_repo
+
+pytestmark = pytest.mark.skipif(not os.getenv("PLAN_CHECK"), reason="set PLAN_CHECK=1 to run query-plan checks")
+
+# A leading "(" is a parenthesised UNION branch, as in list_notes_by_user.
+_EXPLAINABLE = re.compile(r"^[\s(]*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_SESSION_SETTING = re.compile(r"^\s*SET\b", re.IGNORECASE)
+
+class _Rollback(Exception):
+    pass
+
+class PlanRecorder:
+    """Stands in for an asyncpg connection, explaining every statement before running it."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.plans = []
+        self.errors = []
+        # Statements that were neither explained nor a SET: a query shape _EXPLAINABLE doesn't know.
+        self.unexplained = []
+
+    def transaction(self):
+        return self._conn.transaction()
+
+    async def _explain(self, query, args):
+        if _SESSION_SETTING.match(query) or "pg_notify" in query:
+            return
+        if not _EXPLAINABLE.match(query):
+            self.unexplained.append(" ".join(query.split()))
+            return
+        try:
+            async with self._conn.transaction():
+                raw = await self._conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", *args)
+                self.plans.append((" ".join(query.split()), json.loads(raw)[0]["Plan"]))
+                # EXPLAIN ANALYZE really executes writes; undo them before the real run.
+                raise _Rollback
+        except _Rollback:
+            pass
+        except Exception as e:
+            self.errors.append(e)
+            raise
+
+    async def execute(self, query, *args, **kwargs):
+        await self._explain(query, args)
+        return await self._conn.execute(query, *args, **kwargs)
+
+    async def fetch(self, query, *args, **kwargs):
+        await self._explain(query, args)
+        return await self._conn.fetch(query, *args, **kwargs)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        await self._explain(query, args)
+        return await self._conn.fetchrow(query, *args, **kwargs)
+
+    async def fetchval(self, query, *args, **kwargs):
+        await self._explain(query, args)
+        return await self._conn.fetchval(query, *args, **kwargs)
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+def rows_examined(plan):
+    """Table rows read to produce the plan's output, including those filtered out."""
+    return sum(
+        (n.get("Actual Rows", 0) + n.get("Rows Removed by Filter", 0) + n.get("Rows Removed by Index Recheck", 0))
+        * n.get("Actual Loops", 1)
+        for n in _nodes(plan)
+        if "Relation Name" in n
+    )
+
+def check_plan(query, plan, *, max_rows, max_buffers):
+    nodes = list(_nodes(plan))
+    seq_scans = [n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"]
+    assert not seq_scans, f"sequential scan on {seq_scans}: {query}"
+
+    partitions = {n["Relation Name"] for n in nodes if re.fullmatch(r"notes_p\d+", n.get("Relation Name", ""))}
+    assert len(partitions) <= 1, f"no partition pruning ({sorted(partitions)}): {query}"
+
+    examined = rows_examined(plan)
+    assert examined <= max_rows, f"examined {examined} rows (budget {max_rows}): {query}"
+
+    buffers = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+    assert buffers <= max_buffers, f"touched {buffers} buffers (budget {max_buffers}): {query}"
+
+# Budgets are in rows and buffers, sized to what a query returns, never to the notebook.
+NOTEBOOK_MIN = 2000
+
+@pytest_asyncio.fixture
+async def heavy_user(test_pool):
+    """A generated user from the heavy head of the distribution (PLAN_CHECK_USER_RANK, default 10).
+
+    Not the very heaviest: with hash partitioning, the top user can own most of
+    their partition, and then a sequential scan of it is the right plan. But
+    heavy enough that their notebook dwarfs the budgets below, so reading all of
+    it fails them.
+    """
+    rank = int(os.getenv("PLAN_CHECK_USER_RANK", "10"))
+    async with test_pool.acquire() as conn:
+        if await datagen.dataset_user(conn) is None:
+            await datagen.generate(
+                conn,
+                users=int(os.getenv("PLAN_CHECK_USERS", "2000")),
+                notes=int(os.getenv("PLAN_CHECK_NOTES", "200000")),
+                skew=1.1,
+                password_hash="$2b$12$" + "x" * 53,
+            )
+        user = await datagen.dataset_user(conn, rank)
+        assert user["note_count"] >= NOTEBOOK_MIN, "notebook too small to tell an index walk from a full read"
+        note = await conn.fetchrow(
+            "SELECT id, title FROM notes WHERE user_id = $1 ORDER BY id LIMIT 1", user["user_id"]
+        )
+    return {**user, "note_id": note["id"], "title": note["title"]}
+
+@pytest_asyncio.fixture
+async def explain(test_pool):
+    """Yield a PlanRecorder on a connection whose writes are all rolled back afterwards."""
+    async with test_pool.acquire() as conn:
+        tx = conn.transaction()
+        await tx.start()
+        try:
+            yield PlanRecorder(conn)
+        finally:
+            await tx.rollback()
+
+def _assert_plans(recorder, **budget):
+    assert not recorder.errors, recorder.errors
+    assert not recorder.unexplained, f"statements the recorder could not explain: {recorder.unexplained}"
+    assert recorder.plans, "no statements were captured"
+    for query, plan in recorder.plans:
+        check_plan(query, plan, **budget)
+
+# Every public query function must be covered by a test below.
+COVERED = {
+    "notes_repo.list_notes_by_user",
+    "notes_repo.list_tags_for_user",
+    "notes_repo.search_titles_for_user",
+    "notes_repo.get_note_stats_for_user",
+    "notes_repo.get_note_for_user",
+    "notes_repo.get_note_body_for_user",
+    "notes_repo.save_rendered_html",
+    "notes_repo.create_note",
+    "notes_repo.update_note_for_user",
+    "notes_repo.delete_note_for_user",
+    "users_repo.get_user_by_id",
+    "users_repo.get_user_by_email",
+    "users_repo.create_user",
+    "users_repo.disable_user",
+}
+
+def test_every_repo_query_is_covered():
+    found = {
+        f"{module.__name__.rsplit('.', 1)[-1]}.{name}"
+        for module in (notes_repo, users_repo)
+        for name, fn in inspect.getmembers(module, inspect.iscoroutinefunction)
+        if not name.startswith("_") and fn.__module__ == module.__name__
+    }
+    assert found - COVERED == set(), "add plan checks for these repo functions"
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort", sorted(notes_repo.SORT_COLUMNS))
+@pytest.mark.parametrize("descending", [True, False])
+async def test_list_notes_sorted(explain, heavy_user, sort, descending):
+    await notes_repo.list_notes_by_user(
+        explain, heavy_user["user_id"], limit=50, offset=0, sort=sort, descending=descending
+    )
+    # Pinned and unpinned runs each stop after 50 index entries, however big the notebook.
+    # datagen pins about one note in fifty, so a heavy user's pinned run is close to 50
+    # long and the planner may just fetch and sort all of it; hence the slack over 100.
+    _assert_plans(explain, max_rows=150, max_buffers=400)
+
+@pytest.mark.asyncio
+async def test_list_notes_by_tag(explain, heavy_user):
+    await notes_repo.list_notes_by_user(explain, heavy_user["user_id"], limit=50, offset=0, tags=["work"])
+    # One note in seven has the tag: the ordered walk stops after about 7 x 50 entries.
+    _assert_plans(explain, max_rows=500, max_buffers=600)
+
+async def _compress_long_notes(conn, user_id):
+    """Store a user's long notes zstd-compressed, as compress-notes would."""
+    rows = await conn.fetch(
+        "SELECT id, content FROM notes WHERE user_id = $1 AND octet_length(content) >= $2",
+        user_id, get_note_compress_min_bytes(),
+    )
+    await conn.executemany(
+        """
+        UPDATE notes SET content = $3, content_zstd = $4, content_dict_id = $5, content_size = $6
+        WHERE id = $1 AND user_id = $2
+        """,
+        [(row["id"], user_id, *compression.encode(row["content"])) for row in rows],
+    )
+    return len(rows)
+
+@pytest.mark.asyncio
+async def test_list_notes_search(explain, heavy_user):
+    # Rolled back with everything else. Long notes become candidates that only decompressing can rule in or out.
+    assert await _compress_long_notes(explain._conn, heavy_user["user_id"])
+    notes = await notes_repo.list_notes_by_user(explain, heavy_user["user_id"], "budget", limit=50, offset=0)
+    assert len(notes) == 50 and all("budget" in (n["title"] + n["content"]).lower() for n in notes)
+    # Bodies have no index, so the walk reads candidates until it has 50 hits: roughly
+    # 50 / (share of notes that mention the word), never the whole notebook.
+    _assert_plans(explain, max_rows=300, max_buffers=400)
+    total = sum(rows_examined(plan) for _, plan in explain.plans)
+    assert total <= 300, f"search examined {total} rows over {len(explain.plans)} queries"
+
+@pytest.mark.asyncio
+async def test_list_tags(explain, heavy_user):
+    await notes_repo.list_tags_for_user(explain, heavy_user["user_id"])
+    # One user_tag_counts row per tag (datagen uses ten), not one per note.
+    _assert_plans(explain, max_rows=20, max_buffers=20)
+
+@pytest.mark.asyncio
+async def test_search_titles(explain, heavy_user):
+    await notes_repo.search_titles_for_user(explain, heavy_user["user_id"], heavy_user["title"].split()[0], limit=10)
+    # Ranking needs every match, but only matches: datagen titles share a small
+    # vocabulary, so a word is in roughly one title in twenty.
+    _assert_plans(explain, max_rows=500, max_buffers=500)
+
+@pytest.mark.asyncio
+async def test_get_note_and_stats(explain, heavy_user):
+    await notes_repo.get_note_for_user(explain, heavy_user["note_id"], heavy_user["user_id"], with_html=True)
+    await notes_repo.get_note_body_for_user(explain, heavy_user["note_id"], heavy_user["user_id"])
+    await notes_repo.get_note_stats_for_user(explain, heavy_user["user_id"])
+    _assert_plans(explain, max_rows=2, max_buffers=20)
+
+@pytest.mark.asyncio
+async def test_note_writes(explain, heavy_user, monkeypatch):
+    # Generated users are far past the default quota; the quota check itself is what's being explained.
+    monkeypatch.setenv("NOTES_MAX_PER_USER", str(10 ** 9))
+    monkeypatch.setenv("NOTES_MAX_BYTES_PER_USER", str(10 ** 12))
+    user_id, note_id = heavy_user["user_id"], heavy_user["note_id"]
+    # The first insert on a connection also loads the partition's indexes and the stats trigger
+    # into the session caches (~300 catalog buffers); do that outside the recorder.
+    await notes_repo.create_note(explain._conn, "Warm-up", "body", user_id, ["work"])
+    await notes_repo.create_note(explain, "Plan check", "body", user_id, ["work"])
+    await notes_repo.update_note_for_user(explain, note_id, user_id, "Plan check", "new body", ["home"])
+    await notes_repo.save_rendered_html(explain, note_id, user_id, "hash", "<p>new body</p>")
+    await notes_repo.delete_note_for_user(explain, note_id, user_id)
+    _assert_plans(explain, max_rows=10, max_buffers=200)
+
+@pytest.mark.asyncio
+async def test_user_queries(explain, heavy_user):
+    user = await users_repo.get_user_by_id(explain, heavy_user["user_id"])
+    await users_repo.get_user_by_email(explain, user["email"])
+    await users_repo.create_user(explain, "plan-check@example.invalid", "$2b$12$" + "x" * 53)
+    await users_repo.disable_user(explain, heavy_user["user_id"])
+    _assert_plans(explain, max_rows=2, max_buffers=50)
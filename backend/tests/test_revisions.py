@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.core import revisions
+from app.repos import revisions_repo
+
+NOW = datetime(2026, 6, 15, 12, 0, tzinfo=timezone.utc)
+
+def _history(ages, snapshot_interval=20):
+    """Revision rows as record_revision would write them, one per age (a timedelta before NOW), oldest first."""
+    rows, contents, previous = [], [], None
+    for i, age in enumerate(ages):
+        content = "".join(f"line {j}\n" for j in range(i + 1))
+        kind, body = revisions.encode_revision(previous, content, i % snapshot_interval == 0)
+        rows.append({"id": i + 1, "kind": kind, "body": body, "created_at": NOW - age})
+        contents.append(content)
+        previous = content
+    return rows, contents
+
+def _compact(rows, **settings):
+    """Apply plan_compaction to rows the way compact_revisions_for_note does; returns the survivors."""
+    to_delete, to_rewrite = revisions.plan_compaction(rows, now=NOW, **settings)
+    rewritten = {row_id: (kind, body) for row_id, kind, body in to_rewrite}
+    survivors = []
+    for row in rows:
+        if row["id"] in to_delete:
+            continue
+        kind, body = rewritten.get(row["id"], (row["kind"], row["body"]))
+        survivors.append({**row, "kind": kind, "body": body})
+    return survivors
+
+SETTINGS = {"keep_all_days": 7, "retention_days": 90, "snapshot_interval": 20}
+
+def test_delta_round_trip():
+    old = "# Lecture 1\n\nintro\nmore\n" * 20
+    new = old.replace("intro", "introduction", 5) + "summary\n"
+    delta = revisions.encode_delta(old, new)
+    assert revisions.apply_delta(old, delta) == new
+
+@pytest.mark.asyncio
+async def test_revisions_are_recorded_and_reconstructed(async_test_client, seed_auth_user):
+    note = (await async_test_client.post("/notes/", json={"title": "History", "content": "v1\n"})).json()
+    note_id = note["id"]
+    for i in range(2, 5):
+        r = await async_test_client.put(f"/notes/{note_id}/", json={"content": f"v1\nv{i}\n"})
+        assert r.status_code == 200
+
+    r = await async_test_client.get(f"/notes/{note_id}/revisions/")
+    assert r.status_code == 200
+    assert [rev["rev"] for rev in r.json()] == [4, 3, 2, 1]
+    assert r.json()[-1]["kind"] == "snapshot"
+
+    r = await async_test_client.get(f"/notes/{note_id}/revisions/1/")
+    assert r.status_code == 200
+    assert r.json()["content"] == "v1\n"
+
+    r = await async_test_client.get(f"/notes/{note_id}/revisions/3/")
+    assert r.json()["content"] == "v1\nv3\n"
+
+    r = await async_test_client.get(f"/notes/{note_id}/revisions/99/")
+    assert r.status_code == 404
+
+def test_compaction_keeps_everything_inside_the_keep_all_window():
+    rows, _ = _history([timedelta(days=6), timedelta(days=3), timedelta(hours=1), timedelta(minutes=1)])
+    assert revisions.plan_compaction(rows, now=NOW, **SETTINGS) == ([], [])
+
+def test_compaction_thins_old_days_and_drops_past_retention():
+    day = timedelta(days=1)
+    rows, contents = _history([
+        200 * day, 100 * day,                                              # past retention
+        30 * day + timedelta(hours=3), 30 * day + timedelta(hours=2), 30 * day,  # one day: keep the last
+        20 * day, 19 * day,                                                # a day each
+        2 * day, 2 * day - timedelta(minutes=5),                           # inside the keep-all window
+    ])
+    survivors = _compact(rows, **SETTINGS)
+    assert [row["id"] for row in survivors] == [5, 6, 7, 8, 9]
+    # The old head snapshot went, so the first survivor was re-encoded as one; every survivor still rebuilds.
+    assert survivors[0]["kind"] == revisions.SNAPSHOT
+    for n, row in enumerate(survivors, start=1):
+        assert revisions.reconstruct(survivors[:n]) == contents[row["id"] - 1]
+
+def test_compaction_always_keeps_the_newest_revision():
+    rows, contents = _history([timedelta(days=400), timedelta(days=300), timedelta(days=200)])
+    survivors = _compact(rows, **SETTINGS)
+    assert [row["id"] for row in survivors] == [3]
+    assert survivors[0]["kind"] == revisions.SNAPSHOT
+    assert revisions.reconstruct(survivors) == contents[-1]
+
+def test_compaction_rechains_survivors_at_the_snapshot_interval():
+    # Forty revisions on forty past days, all kept, but the first twenty days' worth go past retention.
+    rows, contents = _history([timedelta(days=110 - i) for i in range(40)], snapshot_interval=5)
+    survivors = _compact(rows, keep_all_days=7, retention_days=90, snapshot_interval=5)
+    assert [row["id"] for row in survivors] == list(range(21, 41))
+    assert [i for i, row in enumerate(survivors) if row["kind"] == revisions.SNAPSHOT][:4] == [0, 5, 10, 15]
+    for n, row in enumerate(survivors, start=1):
+        assert revisions.reconstruct(survivors[:n]) == contents[row["id"] - 1]
+
+@pytest.mark.asyncio
+async def test_compacted_history_still_reconstructs(async_test_client, seed_auth_user, test_pool):
+    note_id = (await async_test_client.post("/notes/", json={"title": "History", "content": "line 0\n"})).json()["id"]
+    for i in range(1, 8):
+        content = "".join(f"line {j}\n" for j in range(i + 1))
+        assert (await async_test_client.put(f"/notes/{note_id}/", json={"content": content})).status_code == 200
+    expected = {
+        rev: (await async_test_client.get(f"/notes/{note_id}/revisions/{rev}/")).json()["content"]
+        for rev in range(1, 9)
+    }
+
+    day, hour = timedelta(days=1), timedelta(hours=1)
+    ages = [200 * day, 200 * day, 30 * day + 2 * hour, 30 * day + hour, 30 * day, 20 * day, hour, timedelta(minutes=1)]
+    async with test_pool.acquire() as conn:
+        for rev, age in enumerate(ages, start=1):
+            await conn.execute(
+                "UPDATE note_revisions SET created_at = now() - $3::interval WHERE note_id = $1 AND rev = $2",
+                note_id, rev, age,
+            )
+        assert await revisions_repo.compact_revisions_for_note(conn, note_id) == 4
+
+    r = await async_test_client.get(f"/notes/{note_id}/revisions/")
+    assert [rev["rev"] for rev in r.json()] == [8, 7, 6, 5]
+    assert r.json()[-1]["kind"] == "snapshot"
+    for rev in (5, 6, 7, 8):
+        assert (await async_test_client.get(f"/notes/{note_id}/revisions/{rev}/")).json()["content"] == expected[rev]